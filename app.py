@@ -2,18 +2,20 @@ import os
 import json
 import base64
 import time
-import random
 from io import BytesIO
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import requests
 import streamlit as st
+import streamlit.components.v1 as components
 
 # ==== Gemini（Google Generative AI）工具 ====
 import hashlib
 import google.generativeai as genai
 
+from exam_system.services import ai_pregen, bank_cache, bank_normalize, blob_cache, countdown, exam_nav, github_client, grading, llm_cache, load_pipeline, option_canon, paper_engine, repo_index, tag_index
+
 def _gemini_ready():
     return bool(st.secrets.get("GEMINI_API_KEY"))
 
@@ -24,12 +26,40 @@ def _gemini_client():
     genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
     return genai.GenerativeModel(_gemini_model())
 
-@st.cache_data(show_spinner=False)
-def _gemini_generate_cached(cache_key: str, system_msg: str, user_msg: str) -> str:
+@st.cache_resource(show_spinner=False)
+def _llm_cache():
+    return llm_cache.ResponseCache(
+        st.secrets.get("LLM_CACHE_PATH", ".llm_cache/responses.sqlite"),
+        int(st.secrets.get("LLM_CACHE_MAX_ENTRIES", 5000)),
+        int(float(st.secrets.get("LLM_CACHE_MAX_MB", 50)) * (1 << 20)),
+    )
+
+@st.cache_resource(show_spinner=False)
+def _pregen():
+    return ai_pregen.Sidecar(st.secrets.get("AI_PREGEN_PATH", ai_pregen.DEFAULT_PATH))
+
+def _gemini_stream_chunks(system_msg: str, user_msg: str):
     model = _gemini_client()
     prompt = f"[系統指示]\n{system_msg}\n\n[使用者需求]\n{user_msg}".strip()
-    resp = model.generate_content(prompt)
-    return (resp.text or "").strip()
+    for chunk in model.generate_content(prompt, stream=True):
+        if chunk.text:
+            yield chunk.text
+
+def _gemini_generate_stream(cache_key: str, system_msg: str, user_msg: str):
+    """
+    逐段產出 AI 回應（搭配 st.write_stream）：先查預先產生的 sidecar 與磁碟快取，命中時一次給完整內容；
+    串流結束後全文寫入快取，中途失敗時接上錯誤訊息、不寫入快取
+    """
+    cached = _pregen().get(cache_key)
+    if cached is None:
+        cached = _llm_cache().get(_gemini_model(), cache_key)
+    if cached is not None:
+        yield cached
+        return
+    try:
+        yield from _llm_cache().stream(_gemini_model(), cache_key, _gemini_stream_chunks(system_msg, user_msg))
+    except Exception as e:
+        yield f"\n\n⚠️ AI 生成中斷：{e}"
 
 def _hash(s: str) -> str:
     return hashlib.md5(s.encode("utf-8")).hexdigest()
@@ -75,6 +105,7 @@ GH_BRANCH    = st.secrets.get("REPO_BRANCH", "main")
 GH_TOKEN     = st.secrets.get("GH_TOKEN")
 BANKS_DIR    = st.secrets.get("BANKS_DIR", "bank")   # ← 已調成 bank
 POINTER_FILE = st.secrets.get("POINTER_FILE", "bank_pointer.json")
+GH_DOWNLOAD_WORKERS = int(st.secrets.get("DOWNLOAD_WORKERS", 4))  # 合併載入時同時下載的檔案數
 
 # 類型清單（符合你的資料夾）
 BANK_TYPES   = ["人身", "投資型", "外幣"]
@@ -84,12 +115,6 @@ def _type_dir(t: str) -> str:
     # bank/人身、bank/投資型、bank/外幣
     return f"{BANKS_DIR}/{t}"
 
-def _gh_headers():
-    h = {"Accept": "application/vnd.github+json"}
-    if GH_TOKEN:
-        h["Authorization"] = f"Bearer {GH_TOKEN}"
-    return h
-
 def _gh_write_ready() -> tuple[bool, str]:
     missing = []
     if not GH_OWNER:  missing.append("REPO_OWNER")
@@ -106,13 +131,18 @@ def _require_gh_write_or_warn():
         st.warning("GitHub 寫入未啟用——" + msg)
     return ok
 
+@st.cache_resource(show_spinner=False)
+def _gh_client() -> github_client.GitHubClient:
+    """整個 process 共用的 GitHub client（連線池、逾時、5xx / rate limit 退避重試）"""
+    return github_client.GitHubClient(
+        GH_OWNER, GH_REPO, GH_TOKEN or "", GH_BRANCH,
+        timeout=float(st.secrets.get("GH_TIMEOUT", 30)),
+        max_retries=int(st.secrets.get("GH_MAX_RETRIES", 4)),
+        pool_size=max(8, 2 * GH_DOWNLOAD_WORKERS),
+    )
+
 def _gh_api(path, method="GET", **kwargs):
-    url = f"https://api.github.com/repos/{GH_OWNER}/{GH_REPO}/{path}"
-    r = requests.request(method, url, headers=_gh_headers(), **kwargs)
-    if r.status_code >= 400:
-        snippet = r.text[:300].replace("\n"," ")
-        raise RuntimeError(f"GitHub API {method} {path} -> {r.status_code}: {snippet}")
-    return r.json()
+    return _gh_client().api(path, method, **kwargs)
 
 def _gh_get_sha(path):
     """取得檔案 SHA（PUT 更新時需要），不存在回 None"""
@@ -129,16 +159,30 @@ def _gh_put_file(path, content_bytes, message):
     sha = _gh_get_sha(path)
     if sha:
         payload["sha"] = sha
-    return _gh_api(f"contents/{path}", method="PUT", json=payload)
+    result = _gh_api(f"contents/{path}", method="PUT", json=payload)
+    repo_index.invalidate()  # 題庫清單下次重跑就會看到新檔
+    return result
 
 @st.cache_data(ttl=300)
+def _gh_download(path, sha=None, size=None):
+    """
+    下載檔案內容並快取 5 分鐘。有 sha（索引中的 blob SHA）時以 SHA 定址：磁碟已有就不連線，
+    否則以 Git Blobs API 下載並驗證；sha 是快取 key 的一部分，檔案更新後不會拿到舊內容。
+    沒有 sha 的檔案（指標檔）以 ETag 條件式請求確認，未變更（304）時讀磁碟 blob 快取。
+    """
+    data, _ = blob_cache.fetch(_gh_client(), path, GH_BRANCH, sha, size)
+    return data
+
+def _index_sha_size(path):
+    """題庫檔查索引取得目前的 (SHA, 大小)（索引本身會定期以 ETag 重新驗證）；其他檔案回 (None, None)"""
+    if path.startswith(f"{BANKS_DIR}/"):
+        idx = _bank_index()
+        return idx.sha(path), idx.size(path)
+    return None, None
+
 def _gh_download_bytes(path):
-    """下載檔案內容（用 contents API 的 base64；備援 raw）"""
-    j = _gh_api(f"contents/{path}", params={"ref": GH_BRANCH})
-    if j.get("encoding") == "base64":
-        return base64.b64decode(j["content"])
-    raw_url = f"https://raw.githubusercontent.com/{GH_OWNER}/{GH_REPO}/{GH_BRANCH}/{path}"
-    return requests.get(raw_url, headers=_gh_headers()).content
+    """題庫檔帶著索引中的 SHA 交給 _gh_download，檔案更新後不會拿到舊內容"""
+    return _gh_download(path, *_index_sha_size(path))
 
 # ---- 指標檔（新版相容舊版） ----
 def _read_pointer():
@@ -156,7 +200,7 @@ def _write_pointer(obj: dict):
         json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"),
         "update bank pointers"
     )
-    _gh_download_bytes.clear()
+    _gh_download.clear()
 
 def get_current_bank_path(bank_type: str | None = None):
     """
@@ -217,16 +261,18 @@ def _migrate_pointer_prefix_if_needed():
 # 啟動時先嘗試遷移
 _migrate_pointer_prefix_if_needed()
 
+def _bank_index() -> repo_index.RepoIndex:
+    return repo_index.get(_gh_client(), GH_BRANCH, BANKS_DIR, float(st.secrets.get("REPO_INDEX_TTL", 300)))
+
 def list_bank_files(bank_type: str | None = None):
-    """列出 bank/ 或 bank/<type>/ 下的 .xlsx 題庫清單"""
+    """列出 bank/ 或 bank/<type>/ 下的 .xlsx / .xls 題庫清單（查 Git Trees 索引，不逐資料夾呼叫 contents API）"""
+    folder = _type_dir(bank_type) if bank_type else BANKS_DIR
     try:
-        if bank_type:
-            folder = _type_dir(bank_type)
-            items = _gh_api(f"contents/{folder}", params={"ref": GH_BRANCH})
-            return [it["path"] for it in items if it["type"] == "file" and it["name"].lower().endswith(".xlsx")]
-        else:
-            items = _gh_api(f"contents/{BANKS_DIR}", params={"ref": GH_BRANCH})
-            return [it["path"] for it in items if it["type"] == "file" and it["name"].lower().endswith(".xlsx")]
+        idx = _bank_index()
+        if not idx.truncated:
+            return idx.files(folder)
+        items = _gh_api(f"contents/{folder}", params={"ref": GH_BRANCH})
+        return [it["path"] for it in items if it["type"] == "file" and it["name"].lower().endswith(repo_index.BANK_EXTS)]
     except Exception:
         return []
 
@@ -240,28 +286,33 @@ def build_hint_prompt(q: dict):
         "優先參考題庫的解答說明；不足再補充概念或排除法。"
     )
     expl = (q.get("Explanation") or "").strip()
+    # 提示詞與 key 以題庫原選項順序組成，選項打亂後的每份試卷共用同一份回應
+    choices, _, _ = option_canon.canonical(q)
+    choice_lines = chr(10).join([f"{lab}. {txt}" for lab,txt in choices])
     user = f"""
 題目: {q['Question']}
 選項:
-{chr(10).join([f"{lab}. {txt}" for lab,txt in q['Choices']])}
+{choice_lines}
 題庫解答說明（僅供參考、不可爆雷）：{expl if expl else "（無）"}
 請用 1-2 句提示重點，不要爆雷。
 """
-    ck = _hash("HINT|" + q["Question"] + "|" + expl)
+    ck = _hash("HINT|" + q["Question"] + "|" + choice_lines + "|" + expl)
     return ck, sys, user
 
 def build_explain_prompt(q: dict):
     sys = "你是解題老師，優先引用題庫解答說明，逐項說明正確與錯誤，保持精簡。"
     expl = (q.get("Explanation") or "").strip()
-    ans_letters = "".join(sorted(list(q.get("Answer", set()))))
+    # 以原選項順序與原代號組成（含字母代號的題目除外），顯示前再以 option_canon.to_display 換回本卷代號
+    choices, ans_letters, _ = option_canon.canonical(q)
+    choice_lines = chr(10).join([f"{lab}. {txt}" for lab,txt in choices])
     user = f"""
 題目: {q['Question']}
 選項:
-{chr(10).join([f"{lab}. {txt}" for lab,txt in q['Choices']])}
+{choice_lines}
 正解: {ans_letters or "（無）"}
 題庫解答說明：{expl if expl else "（無）"}
 """
-    ck = _hash("EXPL|" + q["Question"] + "|" + ans_letters)
+    ck = _hash("EXPL|" + q["Question"] + "|" + choice_lines + "|" + ans_letters)
     return ck, sys, user
 
 def build_summary_prompt(result_df):
@@ -284,18 +335,8 @@ def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_fi
     df = df.copy()
     df.columns = [str(c).strip() for c in df.columns]
 
-    col_map = {
-        "編號": "ID", "題號": "ID",
-        "題目": "Question", "題幹": "Question",
-        "解答說明": "Explanation", "解釋說明": "Explanation", "詳解": "Explanation",
-        "標籤": "Tag", "章節": "Tag", "科目": "Tag",
-        "圖片": "Image",
-        "選項一": "OptionA", "選項二": "OptionB", "選項三": "OptionC",
-        "選項四": "OptionD", "選項五": "OptionE",
-        "答案": "Answer",
-        "題型": "Type",
-    }
-    df = df.rename(columns={c: col_map.get(c, c) for c in df.columns})
+    # 欄名對應與 exam_system 共用（含 IPA 題庫的 題目編號 / 題目內容 / 答案選項N）
+    df = df.rename(columns={c: bank_normalize.COL_MAP.get(c, c) for c in df.columns})
 
     option_cols = []
     for c in df.columns:
@@ -329,26 +370,10 @@ def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_fi
         df[oc] = df[oc].fillna("").astype(str)
 
     if "Answer" not in df.columns or df["Answer"].astype(str).str.strip().eq("").all():
-        answers, types = [], []
-        for ridx, r in df.iterrows():
-            stars = []
-            for i, oc in enumerate(option_cols):
-                text = str(r[oc]).strip()
-                if text.startswith("*"):
-                    stars.append(chr(ord("A") + i))
-                    df.at[ridx, oc] = text.lstrip("* ").strip()
-            if len(stars) == 0:
-                answers.append("")
-                types.append("SC")
-            elif len(stars) == 1:
-                answers.append("".join(stars))
-                types.append("SC")
-            else:
-                answers.append("".join(stars))
-                types.append("MC")
+        answers, n_stars = bank_normalize.star_answers(df, option_cols)
         df["Answer"] = answers
         if "Type" not in df.columns:
-            df["Type"] = types
+            df["Type"] = np.where(n_stars >= 2, "MC", "SC")
 
     if "Type" not in df.columns:
         df["Type"] = "SC"
@@ -356,10 +381,7 @@ def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_fi
     df["Type"] = df["Type"].astype(str).str.upper().str.strip()
     df["Answer"] = df["Answer"].astype(str).str.upper().str.replace(" ", "", regex=False)
 
-    def has_two_options(row):
-        cnt = sum(1 for oc in option_cols if str(row.get(oc, "")).strip())
-        return cnt >= 2
-    df = df[df.apply(has_two_options, axis=1)].reset_index(drop=True)
+    df = df[bank_normalize.has_min_options(df, option_cols)].reset_index(drop=True)
 
     # 空 Tag 用 sheet 名補
     if "Tag" not in df.columns:
@@ -374,11 +396,10 @@ def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_fi
 
     return df
 
-def load_bank(file_like):
+def _parse_bank(file_like):
     """
-    讀取 Excel 題庫。如果有多個工作表，會把每個工作表當成一份題庫讀入並合併。
-    - 自動補 Tag＝工作表名稱（若原本 Tag 為空）
-    - 會加上 SourceFile / SourceSheet 欄位。
+    解析題庫；多檔載入時在 worker thread 執行，不能呼叫 st.*（沒有 ScriptRunContext，訊息會被丟掉）。
+    失敗時拋出例外，由呼叫端在主執行緒回報。
     """
     try:
         xls = pd.ExcelFile(file_like)
@@ -392,63 +413,97 @@ def load_bank(file_like):
             norm = normalize_bank_df(raw, sheet_name=sh, source_file=source_file)
             if not norm.empty:
                 dfs.append(norm)
-        if not dfs:
-            st.error("題庫載入失敗或為空（所有工作表都不符合格式）。")
-            return None
-        return pd.concat(dfs, ignore_index=True)
     except Exception as e:
         try:
             df = pd.read_excel(file_like)
-            norm = normalize_bank_df(df, sheet_name=None, source_file=getattr(file_like, "name", None) or "")
-            if not norm.empty:
-                return norm
-            st.error("題庫載入失敗或為空。")
-            return None
         except Exception:
-            st.exception(e)
-            return None
+            raise e
+        norm = normalize_bank_df(df, sheet_name=None, source_file=getattr(file_like, "name", None) or "")
+        if norm.empty:
+            raise ValueError("題庫為空或格式不符")
+        return norm
+    if not dfs:
+        raise ValueError("所有工作表都不符合格式")
+    return pd.concat(dfs, ignore_index=True)
+
+def load_bank(file_like):
+    """
+    讀取 Excel 題庫。如果有多個工作表，會把每個工作表當成一份題庫讀入並合併。
+    - 自動補 Tag＝工作表名稱（若原本 Tag 為空）
+    - 會加上 SourceFile / SourceSheet 欄位。
+    - 內容 SHA 未變時直接讀取編譯快取（Parquet），略過 Excel 解析。
+    """
+    data = file_like.getvalue()
+    source_file = getattr(file_like, "name", None) or ""
+    return bank_cache.load_or_compile(
+        data, source_file, lambda _data, _name: _parse_bank(file_like), namespace="app"
+    )
 
 def load_banks_from_github(load_bank_fn, paths: list[str]) -> pd.DataFrame | None:
-    """一次載入多個 xlsx 並合併（欄位需一致或相容）"""
-    dfs = []
-    for p in paths:
-        try:
-            data = _gh_download_bytes(p)
-            bio = BytesIO(data)
-            try:
-                bio.name = p  # 讓 load_bank 寫入 SourceFile
-            except Exception:
-                pass
-            df = load_bank_fn(bio)
-            if df is None or df.empty:
-                continue
-            dfs.append(df)
-        except Exception:
-            continue
-    if not dfs:
+    """一次載入多個 xlsx 並合併（欄位需一致或相容）；下載並行、下載完即解析，失敗即時提示"""
+    def _parse(data, p):
+        bio = BytesIO(data)
+        bio.name = p  # 讓 load_bank 寫入 SourceFile
+        return load_bank_fn(bio)
+
+    loaded, failed = {}, []
+    with st.status(f"正在載入 {len(paths)} 個題庫檔…", expanded=False) as status:
+        results = load_pipeline.fetch_and_parse(
+            paths, _gh_download_bytes, _parse, max_downloads=GH_DOWNLOAD_WORKERS
+        )
+        for done, (p, df, err) in enumerate(results, 1):
+            if err:
+                failed.append((p, err))
+                status.write(f"❌ {p}（{err}）")
+            else:
+                loaded[p] = df
+                status.write(f"✅ {p}（{len(df)} 題）")
+            status.update(label=f"正在載入題庫 {done}/{len(paths)}…")
+        # 有檔案失敗時展開並標成錯誤，不讓失敗藏在收合的狀態框裡
+        status.update(label=f"已載入 {len(loaded)}/{len(paths)} 個題庫檔",
+                      state="error" if failed else "complete", expanded=bool(failed))
+    for p, err in failed:
+        st.warning(f"題庫載入失敗：{p}（{err}）")
+    if not loaded:
         return None
-    return pd.concat(dfs, ignore_index=True)
+    return pd.concat([loaded[p] for p in paths if p in loaded], ignore_index=True)
 
 def load_bank_from_github(load_bank_fn, bank_path_or_paths):
-    """接受 str（單一檔）或 list[str]（多檔合併）"""
+    """
+    接受 str（單一檔）或 list[str]（多檔合併）。
+    側欄每次 rerun 都會呼叫；路徑與索引中的 SHA 都沒變時沿用 session 中已載入的題庫，不重跑下載與解析。
+    """
+    paths = bank_path_or_paths if isinstance(bank_path_or_paths, list) else [bank_path_or_paths]
+    key = (tuple(paths), tuple(_index_sha_size(p)[0] for p in paths))
+    df = st.session_state.get("df") if st.session_state.get("df_key") == key else None
     if isinstance(bank_path_or_paths, list):
-        df = load_banks_from_github(load_bank_fn, bank_path_or_paths)
+        if df is None:
+            df = load_banks_from_github(load_bank_fn, bank_path_or_paths)
         if df is None:
             st.error("題庫載入失敗或為空，請聯絡管理者。")
             st.stop()
         st.caption(f"使用固定題庫（GitHub 多檔合併）：{len(bank_path_or_paths)} 檔")
-        return df
     else:
         bank_path = bank_path_or_paths
-        data = _gh_download_bytes(bank_path)
-        bio = BytesIO(data)
-        try:
-            bio.name = bank_path
-        except Exception:
-            pass
-        df = load_bank_fn(bio)
+        if df is None:
+            try:
+                bio = BytesIO(_gh_download_bytes(bank_path))
+                bio.name = bank_path
+                df = load_bank_fn(bio)
+            except Exception as e:
+                st.error(f"題庫載入失敗：{bank_path}（{e}）")
         st.caption(f"使用固定題庫（GitHub）：{bank_path}")
-        return df
+    st.session_state["df_key"] = key
+    return df
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _tag_index(tags_digest: int, _tags: pd.Series) -> tag_index.TagIndex:
+    """同一份題庫（Tag 欄內容雜湊相同）只建一次標籤索引，跨 session 共用"""
+    return tag_index.TagIndex(_tags)
+
+def _tags_digest(tags: pd.Series) -> int:
+    return int(pd.util.hash_pandas_object(tags, index=False).sum())
 
 
 # -----------------------------
@@ -456,6 +511,7 @@ def load_bank_from_github(load_bank_fn, bank_path_or_paths):
 # -----------------------------
 for key, default in [
     ("df", None),
+    ("df_key", None),
     ("paper", None),
     ("start_ts", None),
     ("time_limit", 0),
@@ -520,23 +576,19 @@ with st.sidebar:
         st.stop()
 
     bank = st.session_state["df"]
-    option_cols = [c for c in bank.columns if c.lower().startswith("option") and bank[c].astype(str).str.strip().ne("").any()]
-
-    # 標籤篩選
-    all_tags = sorted({t.strip() for tags in bank["Tag"].dropna().astype(str) for t in tags.split(";") if t.strip()})
-    picked_tags = st.multiselect("選擇標籤（可多選，不選=全選）", options=all_tags)
 
-    if picked_tags:
-        mask = bank["Tag"].astype(str).apply(lambda s: any(t in [x.strip() for x in s.split(";")] for t in picked_tags))
-        filtered = bank[mask].copy()
-    else:
-        filtered = bank.copy()
+    # 標籤篩選（反向索引：標籤 -> 列索引，重複的標籤組合直接取快取）
+    tag_idx = _tag_index(_tags_digest(bank["Tag"]), bank["Tag"])
+    picked_tags = st.multiselect("選擇標籤（可多選，不選=全選）", options=tag_idx.tags)
+    filtered = bank.iloc[tag_idx.select(picked_tags)]
 
     max_q = len(filtered)
     num_q = st.number_input("抽題數量", min_value=1, max_value=max(1, max_q), value=min(10, max_q), step=1)
     shuffle_options = st.checkbox("隨機打亂選項順序", value=True)
     random_order = st.checkbox("隨機打亂題目順序", value=True)
     show_image = st.checkbox("顯示圖片（若有）", value=True)
+    mc_policy = st.selectbox("複選題計分", list(grading.POLICIES), format_func=grading.POLICIES.get)
+    page_size = st.selectbox("每頁題數", exam_nav.PAGE_SIZES, index=exam_nav.PAGE_SIZES.index(10))
 
     st.divider()
     time_limit_min = st.number_input("時間限制（分鐘，0=無限制）", min_value=0, max_value=300, value=0)
@@ -557,73 +609,36 @@ with st.sidebar:
 # 產生試卷
 # -----------------------------
 def sample_paper(df, n):
-    n = min(n, len(df))
-    if n <= 0:
-        return []
-
-    # 先抽題、再依需求打亂題目順序
-    rows = df.sample(n=n, replace=False, random_state=random.randint(0, 1_000_000))
-    if random_order:
-        rows = rows.sample(frac=1, random_state=random.randint(0, 1_000_000))
-
-    questions = []
-    for _, r in rows.iterrows():
-        # 1) 以「原始標籤」建立清單：[(A, txtA), (B, txtB), ...]，只收非空選項
-        items = []
-        for i, col in enumerate(option_cols):
-            txt = str(r.get(col, "")).strip()
-            if txt:
-                orig_lab = chr(ord('A') + i)  # 原始（未打亂）標籤
-                items.append((orig_lab, txt))
-
-        # 2) 如需就地打亂（保留 orig_lab）
-        if shuffle_options:
-            random.shuffle(items)
-
-        # 3) 產生新選項與映射：原始標籤 -> 新標籤
-        choices = []
-        orig_to_new = {}
-        for idx, (orig_lab, txt) in enumerate(items):
-            new_lab = chr(ord('A') + idx)    # 新標籤（展示用）
-            choices.append((new_lab, txt))
-            orig_to_new[orig_lab] = new_lab
-
-        # 4) 讀取正解（原始字母），同步映射成「新標籤」
-        raw_ans = str(r.get("Answer", "")).upper().strip()
-        orig_ans_letters = set(raw_ans) if raw_ans else set()
-        # 僅保留存在的原始標籤，並轉成新標籤
-        new_ans = {orig_to_new[a] for a in orig_ans_letters if a in orig_to_new}
-
-        # 5) 題目型態
-        qtype = str(r.get("Type", "SC")).upper()
-
-        # 6) 組裝題目
-        questions.append({
-            "ID": r["ID"],
-            "Question": r["Question"],
-            "Type": qtype,
-            "Choices": choices,                # [(新標籤, 文字)]
-            "Answer": new_ans,                 # {新標籤集合}
-            "Explanation": r.get("Explanation", ""),
-            "Image": r.get("Image", ""),
-            "Tag": r.get("Tag", ""),
-            # 若你有用多工作表功能，這兩行能把來源帶到結果表
-            "SourceFile": r.get("SourceFile", ""),
-            "SourceSheet": r.get("SourceSheet", ""),
-        })
-
-    return questions
+    """抽題、選項排列、答案重編由 paper_engine 以陣列一次完成（不再逐列 iterrows）"""
+    store = paper_engine.QuestionStore(df)
+    rng = np.random.default_rng()
+    # 先隨機抽題；不打亂題目順序時改回題庫原順序
+    rows, perm, answer_bits = paper_engine.draw(store, np.arange(len(store)), n, rng, True, shuffle_options)
+    if not random_order:
+        order = np.argsort(rows)
+        rows, perm, answer_bits = rows[order], perm[order], answer_bits[order]
+    return paper_engine.materialize(
+        store, rows, perm, answer_bits,
+        extra_cols=("Explanation", "Image", "Tag", "SourceFile", "SourceSheet"),
+    )
 # 啟考（建立試卷 & 狀態）
 if start_btn:
     st.session_state.paper = sample_paper(filtered, int(num_q))
     st.session_state.start_ts = time.time()
+    # 期限在開考時固定，考試中調整側欄時限不影響本次考試
+    st.session_state.deadline_ts = countdown.deadline(st.session_state.start_ts, st.session_state.time_limit)
     st.session_state.answers = {}
+    st.session_state.pop("exam_page", None)
     st.session_state.started = True
     st.session_state.show_results = False
     st.session_state.results_df = None
     st.session_state.score_tuple = None
 
 
+def _shift_exam_page(step, pages):
+    st.session_state.exam_page = min(max(0, st.session_state.get("exam_page", 0) + step), pages - 1)
+
+
 # -----------------------------
 # 考試頁 / 結果頁（雙態）
 # -----------------------------
@@ -635,24 +650,32 @@ if st.session_state.started and st.session_state.paper and not st.session_state.
     with col_left:
         st.subheader("試卷")
     with col_right:
-        if st.session_state.time_limit > 0:
-            elapsed = int(time.time() - st.session_state.start_ts)
-            remain = max(0, st.session_state.time_limit - elapsed)
-            mm, ss = divmod(remain, 60)
-            st.metric("剩餘時間", f"{mm:02d}:{ss:02d}")
-            if remain == 0:
-                st.warning("時間到！請繳卷。")
+        # 倒數在瀏覽器端跑（不定時重跑 script），歸零時自動點一次交卷；逾時以伺服器時間判定
+        remain = countdown.remaining(st.session_state.get("deadline_ts"))
+        if remain is not None:
+            components.html(countdown.countdown_html(remain, "交卷並看成績"), height=countdown.HEIGHT)
 
     answers_key = "answers"
     if answers_key not in st.session_state:
         st.session_state[answers_key] = {}
+    # 逾時後這次重跑的作答不寫入，直接以時限內的作答計分
+    timeup = remain is not None and remain <= 0
 
     # 新增：每題 AI 提示的狀態儲存
     hints_key = "hints"
     if hints_key not in st.session_state:
         st.session_state[hints_key] = {}
 
-    for idx, q in enumerate(paper, start=1):
+    # 分頁：只建立本頁題目的元件，其他頁的作答留在 answers（以題目 ID 為 key）
+    pages = exam_nav.n_pages(len(paper), page_size)
+    if st.session_state.get("exam_page", 0) >= pages:
+        st.session_state.exam_page = 0
+    nav = st.container()  # 導覽格在本頁作答後才填入
+    page = st.selectbox("頁數", range(pages), key="exam_page",
+                        format_func=lambda p: exam_nav.page_label(p, page_size, len(paper)))
+    start, stop = exam_nav.page_bounds(page, page_size, len(paper))
+
+    for idx, q in enumerate(paper[start:stop], start=start + 1):
         st.markdown(f"### Q{idx}. {q['Question']}")
         if show_image and str(q["Image"]).strip():
             try:
@@ -665,79 +688,92 @@ if st.session_state.started and st.session_state.paper and not st.session_state.
             # 按一下就寫進 session_state，之後每次重跑都會看到
             if st.button(f"💡 看不懂題目嗎?AI來提示你（Q{idx}）", key=f"ai_hint_{idx}"):
                 ck, sys, usr = build_hint_prompt(q)
-                with st.spinner("AI 產生提示中…"):
-                    hint = _gemini_generate_cached(ck, sys, usr)
+                # 逐段顯示，顯示完的全文存起來，之後重跑直接顯示
+                hint = st.write_stream(option_canon.stream_to_display(_gemini_generate_stream(ck, sys, usr), q))
                 st.session_state[hints_key][q["ID"]] = hint
 
-            # 若已有提示，顯示在題目下、選項上
-            if q["ID"] in st.session_state[hints_key]:
+            # 若已有提示（本次剛串流顯示的除外），顯示在題目下、選項上
+            elif q["ID"] in st.session_state[hints_key]:
                 st.info(st.session_state[hints_key][q["ID"]])
 
         # === 再顯示選項 ===
         display = [f"{lab}. {txt}" for lab, txt in q["Choices"]]
 
+        # 換頁回來時元件狀態已被清掉，以先前的作答還原
+        prev = st.session_state[answers_key].get(q["ID"], set())
         if q["Type"] == "MC":
-            picked = st.multiselect("（複選）選擇所有正確選項：", options=display, key=f"q_{idx}")
+            picked = st.multiselect("（複選）選擇所有正確選項：", options=display, key=f"q_{idx}",
+                                    default=[opt for opt in display if opt.split(".", 1)[0] in prev])
             picked_labels = {opt.split(".", 1)[0] for opt in picked}
         else:
-            choice = st.radio("（單選）選擇一個答案：", options=display, key=f"q_{idx}")
+            choice = st.radio("（單選）選擇一個答案：", options=display, key=f"q_{idx}",
+                              index=next((j for j, opt in enumerate(display) if opt.split(".", 1)[0] in prev), None))
             picked_labels = {choice.split(".", 1)[0]} if choice else set()
 
-        st.session_state[answers_key][q["ID"]] = picked_labels
+        if not timeup:
+            st.session_state[answers_key][q["ID"]] = picked_labels
 
         st.divider()
 
+    col_prev, col_next = st.columns(2)
+    col_prev.button("◀ 上一頁", on_click=_shift_exam_page, args=(-1, pages), disabled=page == 0, use_container_width=True)
+    col_next.button("下一頁 ▶", on_click=_shift_exam_page, args=(1, pages), disabled=page >= pages - 1, use_container_width=True)
+
+    answered = np.array([bool(st.session_state[answers_key].get(q["ID"])) for q in paper])
+    with nav.expander(f"📋 題目導覽（已答 {int(answered.sum())} / {len(paper)}）", expanded=True):
+        st.markdown(exam_nav.navigator_markdown(answered, page_size, page))
+
     # 交卷
     submitted = st.button("📥 交卷並看成績", use_container_width=True)
-    timeup = (st.session_state.time_limit > 0 and time.time() - st.session_state.start_ts >= st.session_state.time_limit)
 
     if submitted or timeup:
-        # 判卷
-        records = []
-        correct_count = 0
-        for q in paper:
-            gold = set(q["Answer"])
-            pred = st.session_state[answers_key].get(q["ID"], set())
-            is_correct = (pred == gold)
-            correct_count += int(is_correct)
-
+        # 判卷：正解 / 作答轉成位元遮罩，一次向量化比對與計分
+        ids = [q["ID"] for q in paper]
+        graded = grading.grade_questions(paper, st.session_state[answers_key], ids, mc_policy)
+        score, your_letters, gold_letters = graded.score, graded.your_letters, graded.gold_letters
+
+        def render_set(q, letters):
+            if not letters:
+                return "(未作答)"
             mapping = {lab: txt for lab, txt in q["Choices"]}
-            def render_set(ss):
-                if not ss:
-                    return "(未作答)"
-                ordered = sorted(list(ss))
-                return ", ".join([f"{lab}. {mapping.get(lab, '')}" for lab in ordered])
-
-            records.append({
-                "ID": q["ID"],
-                "Tag": q.get("Tag", ""),
-                "Question": q["Question"],
-                "Your Answer": "".join(sorted(list(pred))) or "",
-                "Your Answer (text)": render_set(pred),
-                "Correct": "".join(sorted(list(gold))),
-                "Correct (text)": render_set(gold),
-                "Result": "✅ 正確" if is_correct else "❌ 錯誤",
-                "Explanation": q.get("Explanation", ""),
-                "SourceFile": q.get("SourceFile","") if isinstance(q.get("SourceFile",""), str) else "",
-                "SourceSheet": q.get("SourceSheet","") if isinstance(q.get("SourceSheet",""), str) else "",
-            })
-
-        score_pct = round(100 * correct_count / len(paper), 2)
-        st.session_state.results_df = pd.DataFrame.from_records(records)
-        st.session_state.score_tuple = (correct_count, len(paper), score_pct)
+            return ", ".join([f"{lab}. {mapping.get(lab, '')}" for lab in letters])
+
+        def _text_col(col):
+            return [q.get(col, "") if isinstance(q.get(col, ""), str) else "" for q in paper]
+
+        results_df = pd.DataFrame({
+            "Q": np.arange(len(paper)),
+            "ID": ids,
+            "Tag": [q.get("Tag", "") for q in paper],
+            "Question": [q["Question"] for q in paper],
+            "Your Answer": your_letters,
+            "Your Answer (text)": [render_set(q, l) for q, l in zip(paper, your_letters)],
+            "Correct": gold_letters,
+            "Correct (text)": [render_set(q, l) for q, l in zip(paper, gold_letters)],
+            "Result": np.where(score >= 1, "✅ 正確", np.where(score > 0, "🔶 部分給分", "❌ 錯誤")),
+            "Score": np.round(score, 3),
+            "Explanation": [q.get("Explanation", "") for q in paper],
+            "SourceFile": _text_col("SourceFile"),
+            "SourceSheet": _text_col("SourceSheet"),
+        })
+
+        total_score = round(graded.total, 2)
+        score_pct = round(100 * total_score / len(paper), 2)
+        st.session_state.results_df = results_df
+        st.session_state.score_tuple = (total_score, len(paper), score_pct)
         st.session_state.show_results = True
         st.rerun()
 
 elif st.session_state.started and st.session_state.paper and st.session_state.show_results:
     # ===== 結果頁 =====
     correct_count, total_q, score_pct = st.session_state.score_tuple
-    st.success(f"你的分數：{correct_count} / {total_q}（{score_pct}%）")
+    st.success(f"你的分數：{correct_count:g} / {total_q}（{score_pct}%）")
 
     result_df = st.session_state.results_df
-    st.dataframe(result_df, use_container_width=True)
+    st.dataframe(result_df.drop(columns=["Q"]), use_container_width=True)
 
     # 下載 CSV
-    csv_bytes = result_df.to_csv(index=False).encode("utf-8-sig")
+    csv_bytes = result_df.drop(columns=["Q"]).to_csv(index=False).encode("utf-8-sig")
     st.download_button("⬇️ 下載作答明細（CSV）", data=csv_bytes, file_name="exam_results.csv", mime="text/csv")
 
     # === 題目詳解（依作答結果上色 + 展開詳解） ===
@@ -751,11 +787,12 @@ elif st.session_state.started and st.session_state.paper and st.session_state.sh
     for i, q in enumerate(st.session_state.paper, start=1):
         gold = set(q["Answer"])
         pred = st.session_state.get(answers_key, {}).get(q["ID"], set())
-        is_correct = (pred == gold)
+        result = result_df["Result"].iat[i - 1]  # 判卷結果依題目位置對應
+        is_correct = result.startswith("✅")
 
-        border = "#34a853" if is_correct else "#d93025"
+        border = "#34a853" if is_correct else ("#f9ab00" if result.startswith("🔶") else "#d93025")
         glow   = "0 0 12px"
-        title  = f"Q{i}｜{'✅ 正確' if is_correct else '❌ 錯誤'}｜你的答案：{_fmt_letters(pred)}"
+        title  = f"Q{i}｜{result}｜你的答案：{_fmt_letters(pred)}"
 
         st.markdown(
             f"""
@@ -797,18 +834,14 @@ elif st.session_state.started and st.session_state.paper and st.session_state.sh
             if use_ai:
                 if st.button(f"🤖 產生 AI 詳解（Q{i}）", key=f"ai_explain_colored_{i}"):
                     ck, sys, usr = build_explain_prompt(q)
-                    with st.spinner("AI 產生詳解中…"):
-                        expl = _gemini_generate_cached(ck, sys, usr)
-                    st.success(expl)
+                    st.write_stream(option_canon.stream_to_display(_gemini_generate_stream(ck, sys, usr), q))
 
     # === 📊 AI 考後總結（僅結果頁顯示） ===
     if use_ai:
         st.subheader("📊 AI 考後總結")
         if st.button("產出弱項分析與建議", key="ai_summary_btn"):
             ck, sys, usr = build_summary_prompt(result_df)
-            with st.spinner("AI 分析中…"):
-                summ = _gemini_generate_cached(ck, sys, usr)
-            st.write(summ)
+            st.write_stream(_gemini_generate_stream(ck, sys, usr))
 
     # 再考一次（重置旗標）
     if st.button("🔁 再考一次", type="secondary"):
@@ -840,18 +873,20 @@ with st.sidebar.expander("🛠 題庫管理（管理者）", expanded=False):
     if st.session_state.admin_ok:
         st.write("### 上傳新題庫")
         up_type = st.selectbox("上傳到哪個類型？", options=BANK_TYPES, index=0)
-        up = st.file_uploader("選擇 Excel 題庫（.xlsx）", type=["xlsx"])
+        up = st.file_uploader("選擇 Excel 題庫（.xlsx / .xls）", type=[e.lstrip(".") for e in repo_index.BANK_EXTS])
         name = st.text_input("儲存檔名（僅檔名，不含資料夾）", value="bank.xlsx")
         set_now = st.checkbox("上傳後設為該類型目前題庫", value=True)
 
         if st.button("上傳"):
             if up and name:
+                # 副檔名跟著上傳的檔案（.xls 存成 .xlsx 會被當成另一種格式）
+                name = str(Path(name).with_suffix(Path(up.name).suffix.lower()))
                 dest = f"{_type_dir(up_type)}/{name}"
                 try:
                     _gh_put_file(dest, up.getvalue(), f"upload bank {name} -> {up_type}")
                     if set_now:
                         set_current_bank_path(up_type, dest)
-                    _gh_download_bytes.clear()
+                    _gh_download.clear()
                     st.success(f"已上傳：{dest}" + ("，並已切換" if set_now else ""))
                 except Exception as e:
                     st.error(f"上傳失敗：{e}")
@@ -865,7 +900,19 @@ with st.sidebar.expander("🛠 題庫管理（管理者）", expanded=False):
             pick = st.selectbox("選擇題庫", options=opts, index=idx, key="pick_bank_switch")
             if st.button("套用選擇的題庫"):
                 set_current_bank_path(sel_type, pick)
-                _gh_download_bytes.clear()
+                _gh_download.clear()
                 st.success(f"已切換 {sel_type} 類型為：{pick}")
         else:
-            st.info(f"{sel_type} 目前沒有 .xlsx。")
+            st.info(f"{sel_type} 目前沒有題庫檔。")
+
+        st.write("### GitHub API 延遲統計")
+        gh_stats = _gh_client().metrics.summary()
+        if gh_stats:
+            st.dataframe(gh_stats, use_container_width=True, hide_index=True)
+        else:
+            st.caption("尚無呼叫紀錄")
+
+        st.write("### AI 回應快取")
+        llm_stats = _llm_cache().stats()
+        st.caption(f"命中 {llm_stats['hits']}／未命中 {llm_stats['misses']}（命中率 {llm_stats['hit_rate']:.0%}），"
+                   f"{llm_stats['entries']} 筆、{llm_stats['bytes'] / (1 << 20):.1f} MB")
@@ -0,0 +1 @@
+# 讓 tests/ 可直接 import exam_system（pytest 會把此檔所在的專案根目錄加入 sys.path）
@@ -6,18 +6,53 @@ GH_OWNER = st.secrets.get("REPO_OWNER")
 GH_REPO = st.secrets.get("REPO_NAME")
 GH_BRANCH = st.secrets.get("REPO_BRANCH", "main")
 GH_TOKEN = st.secrets.get("GH_TOKEN")
+# GitHub API 逾時（秒）與 5xx / rate limit 重試次數
+GH_TIMEOUT = float(st.secrets.get("GH_TIMEOUT", 30))
+GH_MAX_RETRIES = int(st.secrets.get("GH_MAX_RETRIES", 4))
+# 題庫資料夾索引（Git Trees）多久向 GitHub 重新驗證一次（秒）；管理者寫入後會立即失效
+REPO_INDEX_TTL = float(st.secrets.get("REPO_INDEX_TTL", 300))
+
+# 題庫儲存後端："github"（預設，走 GitHub API）或 "local"（直接讀寫 LOCAL_BANK_ROOT 目錄）
+STORAGE_BACKEND = st.secrets.get("STORAGE_BACKEND", "github")
+LOCAL_BANK_ROOT = st.secrets.get("LOCAL_BANK_ROOT", ".")  # 其下應有 BANKS_DIR 與 POINTER_FILE
 
 # Paths
 BANKS_DIR = st.secrets.get("BANKS_DIR", "bank")
 POINTER_FILE = st.secrets.get("POINTER_FILE", "bank_pointer.json")
 
+# 編譯後題庫快取（Parquet，依 git blob SHA 命名）
+BANK_CACHE_DIR = st.secrets.get("BANK_CACHE_DIR", ".bank_cache")
+
+# 工作表數超過 PARALLEL_SHEETS_MIN 且工作表 XML（解壓後）合計達 PARALLEL_MIN_BYTES 時才改用 process pool 平行解析；
+# 一般題庫（數 MB 以內）序列解析較快。PARSE_WORKERS=0 表示依 CPU 數
+PARALLEL_SHEETS_MIN = int(st.secrets.get("PARALLEL_SHEETS_MIN", 8))
+PARALLEL_MIN_BYTES = int(st.secrets.get("PARALLEL_MIN_BYTES", 16 << 20))
+PARSE_WORKERS = int(st.secrets.get("PARSE_WORKERS", 0))
+# 合併載入時同時下載的檔案數上限
+DOWNLOAD_WORKERS = int(st.secrets.get("DOWNLOAD_WORKERS", 4))
+# process 內最多同時保留幾份已載入的題庫（所有 session 共用）
+BANK_REGISTRY_MAX = int(st.secrets.get("BANK_REGISTRY_MAX", 8))
+EXAM_PAGE_SIZE = int(st.secrets.get("EXAM_PAGE_SIZE", 10))  # 模擬考每頁題數（預設值）
+MC_SCORING = st.secrets.get("MC_SCORING", "all_or_nothing")  # 複選題計分：all_or_nothing / partial / negative
+
 # Constants
 BANK_TYPES = ["人身", "投資型", "外幣"]
 ADMIN_PASSWORD = st.secrets.get("ADMIN_PASSWORD", "")
 
+# 考試藍圖：{類型: {標籤: 題數 或 "百分比%"}}，格式見 services/blueprint.py
+BLUEPRINTS = {t: dict(spec) for t, spec in st.secrets.get("BLUEPRINTS", {}).items()}
+
 # Gemini Config
 GEMINI_API_KEY = st.secrets.get("GEMINI_API_KEY")
 GEMINI_MODEL = st.secrets.get("GEMINI_MODEL", "gemini-1.5-flash")
+# AI 回應磁碟快取（SQLite，多個 worker 共用）；超過筆數或大小上限時淘汰最久未用的
+LLM_CACHE_PATH = st.secrets.get("LLM_CACHE_PATH", ".llm_cache/responses.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(st.secrets.get("LLM_CACHE_MAX_ENTRIES", 5000))
+LLM_CACHE_MAX_MB = float(st.secrets.get("LLM_CACHE_MAX_MB", 50))
+# 離線預先產生的 AI 詳解 / 提示（python -m exam_system.services.ai_pregen 產出），頁面優先查這裡
+AI_PREGEN_PATH = st.secrets.get("AI_PREGEN_PATH", ".llm_cache/pregen.jsonl")
+# 交卷後背景預先產生錯題 AI 詳解時，整個 process 同時呼叫模型的上限
+AI_PREFETCH_WORKERS = int(st.secrets.get("AI_PREFETCH_WORKERS", 4))
 
 def get_type_dir(t: str) -> str:
     return f"{BANKS_DIR}/{t}"
@@ -10,10 +10,13 @@ config = layout.render_sidebar_settings()
 
 if config["start"]:
     st.session_state.paper = exam_render.sample_paper(
-        config["df"], 
+        config["bank"],
+        config["rows"],
         config["num_q"], 
         config["random_q"], 
-        config["shuffle_opt"]
+        config["shuffle_opt"],
+        blueprint_spec=config["blueprint"],
+        weak_focus=config["weak_focus"],
     )
     # Reset practice state
     st.session_state.practice_idx = 0
@@ -21,7 +24,8 @@ if config["start"]:
     st.session_state.mode = "practice"
     st.rerun()
 
-if st.session_state.get("mode") == "practice" and st.session_state.get("paper"):
+if (st.session_state.get("mode") == "practice" and st.session_state.get("paper")
+        and exam_render.paper_available(st.session_state.paper)):
     exam_render.render_practice_mode(
         st.session_state.paper, 
         show_image=config["show_img"]
@@ -1,6 +1,7 @@
 # exam_system/pages/2_模擬考模式.py
 import streamlit as st
 import time
+from exam_system.services import countdown
 from exam_system.ui import layout, exam_render
 
 layout.setup_page("模擬考模式")
@@ -9,35 +10,52 @@ config = layout.render_sidebar_settings()
 
 # Start
 if config["start"]:
+    exam_render.cancel_prefetch()
     st.session_state.paper = exam_render.sample_paper(
-        config["df"], config["num_q"], config["random_q"], config["shuffle_opt"]
+        config["bank"], config["rows"], config["num_q"], config["random_q"], config["shuffle_opt"],
+        blueprint_spec=config["blueprint"],
+        weak_focus=config["weak_focus"],
     )
     st.session_state.start_ts = time.time()
+    st.session_state.deadline_ts = countdown.deadline(st.session_state.start_ts, config["time_limit"])
+    st.session_state.timed_out = False
     st.session_state.answers = {}
+    st.session_state.pop("exam_page", None)
     st.session_state.mode = "mock"
     st.session_state.submitted = False
+    st.session_state.results_recorded = False
     st.rerun()
 
 # Render
-if st.session_state.get("mode") == "mock" and st.session_state.get("paper"):
+if (st.session_state.get("mode") == "mock" and st.session_state.get("paper")
+        and exam_render.paper_available(st.session_state.paper)):
     if not st.session_state.get("submitted", False):
         exam_render.render_mock_exam_questions(
             st.session_state.paper, 
-            show_image=config["show_img"]
+            show_image=config["show_img"],
+            page_size=config["page_size"],
         )
         
-        if st.button("📥 交卷", type="primary", use_container_width=True):
+        if st.button(exam_render.SUBMIT_LABEL, type="primary", use_container_width=True):
             st.session_state.submitted = True
             st.rerun()
     else:
         # Results
-        df_res, correct = exam_render.calculate_results(
+        if st.session_state.get("timed_out"):
+            st.info("⏰ 時間到，已自動交卷（以時限內的作答計分）。")
+        df_res, score = exam_render.calculate_results(
             st.session_state.paper, 
-            st.session_state.answers
+            st.session_state.answers,
+            policy=config["mc_policy"],
         )
-        exam_render.render_result_page(df_res, correct, len(st.session_state.paper))
+        if not st.session_state.get("results_recorded"):
+            exam_render.record_results(st.session_state.paper, df_res)
+            exam_render.start_prefetch(st.session_state.paper, df_res)
+            st.session_state.results_recorded = True
+        exam_render.render_result_page(df_res, score, len(st.session_state.paper), st.session_state.paper)
         
         if st.button("再來一次"):
+            exam_render.cancel_prefetch()
             st.session_state.mode = None
             st.rerun()
 else:
@@ -0,0 +1,83 @@
+# exam_system/services/ai_prefetch.py
+"""
+交卷後的 AI 詳解背景預先產生：
+錯題的詳解請求一交卷就送進 process 共用的 thread pool（所有 session 合計同時最多 workers 個模型呼叫），
+結果寫入回應快取；學生打開錯題時通常已經產生好，直接顯示。
+每個 session 一個 PrefetchJob（存在 session_state）：可查進度、可取消（排隊中的請求直接撤銷），
+session 結束、job 被回收時也會撤銷尚未開始的請求。
+不依賴 streamlit。
+"""
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-prefetch")
+        return _pool
+
+
+def _cancel_all(futures):
+    for f in futures:
+        f.cancel()
+
+
+class PrefetchJob:
+    def __init__(self, futures: dict):
+        self.futures: dict[str, Future] = futures  # cache_key -> Future
+        self.cancelled = False
+        weakref.finalize(self, _cancel_all, list(futures.values()))
+
+    def __len__(self):
+        return len(self.futures)
+
+    def progress(self) -> tuple[int, int]:
+        """(已結束數, 總數)；取消與失敗也算結束"""
+        return sum(f.done() for f in self.futures.values()), len(self.futures)
+
+    @property
+    def finished(self) -> bool:
+        return all(f.done() for f in self.futures.values())
+
+    @property
+    def active(self) -> bool:
+        """仍需顯示進度（未取消且還有請求沒結束）"""
+        return not self.cancelled and not self.finished
+
+    def ready(self, key: str) -> bool:
+        f = self.futures.get(key)
+        return f is not None and f.done() and not f.cancelled() and f.exception() is None
+
+    def claim(self, key: str) -> str | None:
+        """
+        學生要看這題時呼叫：已完成回傳結果；還在排隊就撤銷並回傳 None（由頁面直接串流，不必等 pool）；
+        正在產生就等它完成。沒有這題、已取消或失敗時回傳 None。
+        """
+        f = self.futures.get(key)
+        if f is None or f.cancel():
+            return None
+        try:
+            return f.result()
+        except Exception:
+            return None
+
+    def cancel(self):
+        """撤銷尚未開始的請求；正在進行的會跑完（結果仍寫入快取，已完成的照常顯示）"""
+        self.cancelled = True
+        _cancel_all(self.futures.values())
+
+
+def start(tasks, fn, workers: int = 4) -> PrefetchJob:
+    """tasks 為 [(cache_key, 系統指示, 使用者訊息)]，以 fn(cache_key, 系統指示, 使用者訊息) 執行；同 key 只送一次"""
+    pool = _get_pool(workers)
+    futures = {}
+    for key, system_msg, user_msg in tasks:
+        if key not in futures:
+            futures[key] = pool.submit(fn, key, system_msg, user_msg)
+    return PrefetchJob(futures)
@@ -0,0 +1,195 @@
+# exam_system/services/ai_pregen.py
+"""
+AI 詳解 / 提示的離線預先產生：
+把整份題庫逐題送進 ai_prompts 的 builder，以有限並行數呼叫模型，
+結果寫入 sidecar 檔（JSONL，每行一筆，key 為題目雜湊 = builder 的 cache_key）。
+每完成一題就 append + fsync，中斷後重跑會跳過已完成的題目（即檢查點）。
+頁面產生 AI 回應時先查 sidecar，命中就立即顯示，沒有才即時呼叫模型。
+
+命令列：
+    python -m exam_system.services.ai_pregen bank/人身/a.xlsx [更多檔案] --kinds explain,hint --workers 4
+    加上 --stub 改用本機假模型（不連網、不需 API key），用來驗證流程與檢查點
+不依賴 streamlit（--stub 以外需要 secrets 中的 GEMINI_API_KEY）。
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from exam_system.services import ai_prompts, paper_engine
+from exam_system.services.bank_normalize import parse_sheets
+
+DEFAULT_PATH = ".llm_cache/pregen.jsonl"
+BUILDERS = {
+    "explain": ai_prompts.build_explain_prompt,
+    "hint": ai_prompts.build_hint_prompt,
+}
+
+
+class Sidecar:
+    """預先產生結果（JSONL：{"key", "kind", "id", "text"}），同 key 以後寫入的為準；檔案有變動時自動重讀"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._entries = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            self._entries, self._stamp = {}, None
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        entries = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # 中斷時寫到一半的最後一行
+                if rec.get("key") and rec.get("text"):
+                    entries[rec["key"]] = rec["text"]
+        self._entries, self._stamp = entries, stamp
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            self._refresh()
+            return self._entries.get(key)
+
+    def keys(self) -> set:
+        with self._lock:
+            self._refresh()
+            return set(self._entries)
+
+    def append(self, rec: dict):
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a+b") as f:
+                # 上次中斷留下沒有換行的殘行時先補換行，新紀錄才不會黏在壞行後面
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+def bank_questions(df: pd.DataFrame) -> list[dict]:
+    """題庫全部題目（選項不打亂，即原順序）"""
+    store = paper_engine.QuestionStore(df)
+    rows = np.arange(len(store))
+    perm, answer_bits = paper_engine.arrange_options(store, rows, np.random.default_rng(0), shuffle_opts=False)
+    return paper_engine.materialize(store, rows, perm, answer_bits)
+
+
+def plan(questions, kinds=("explain", "hint"), done=()) -> list[tuple]:
+    """(key, kind, 題號, 系統指示, 使用者訊息) 的工作清單；已完成的與重複的題目略過"""
+    jobs, seen = [], set(done)
+    for q in questions:
+        for kind in kinds:
+            key, sys_msg, user_msg = BUILDERS[kind](q)
+            if key in seen:
+                continue
+            seen.add(key)
+            jobs.append((key, kind, str(q.get("ID", "")), sys_msg, user_msg))
+    return jobs
+
+
+def run(jobs, generate, sidecar: Sidecar, workers: int = 4, on_progress=None, should_stop=None) -> dict:
+    """
+    以最多 workers 個並行呼叫 generate(系統指示, 使用者訊息)，同時在途的請求不超過 workers。
+    每完成一題就寫入 sidecar；失敗的不寫（下次重跑再試）。should_stop() 為 True 時不再送出新請求。
+    """
+    stats = {"total": len(jobs), "done": 0, "failed": 0, "skipped": 0}
+    jobs = iter(jobs)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        def fill():
+            while len(pending) < max(1, workers) and not (should_stop and should_stop()):
+                job = next(jobs, None)
+                if job is None:
+                    return
+                pending[pool.submit(generate, job[3], job[4])] = job
+
+        fill()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                key, kind, qid, _, _ = pending.pop(fut)
+                try:
+                    text = (fut.result() or "").strip()
+                except Exception:
+                    text = ""
+                if text:
+                    sidecar.append({"key": key, "kind": kind, "id": qid, "text": text})
+                    stats["done"] += 1
+                else:
+                    stats["failed"] += 1
+                if on_progress:
+                    on_progress(stats["done"] + stats["failed"], stats["total"])
+            fill()
+    stats["skipped"] = stats["total"] - stats["done"] - stats["failed"]
+    return stats
+
+
+def stub_generate(system_msg: str, user_msg: str) -> str:
+    """本機假模型：依輸入回傳可重現的內容（測試流程用）"""
+    digest = hashlib.sha1(f"{system_msg}\0{user_msg}".encode("utf-8")).hexdigest()[:8]
+    first = next((ln for ln in user_msg.splitlines() if ln.strip()), "")
+    return f"[stub {digest}] {first}"
+
+
+def load_local_bank(paths) -> pd.DataFrame:
+    """讀取本機 Excel 題庫（與頁面相同的正規化）"""
+    dfs = []
+    for p in paths:
+        data = Path(p).read_bytes()
+        sheets = pd.ExcelFile(BytesIO(data)).sheet_names
+        dfs += [df for df in parse_sheets(data, str(p), sheets) if not df.empty]
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="預先產生整份題庫的 AI 詳解 / 提示")
+    ap.add_argument("files", nargs="+", help="題庫 Excel 檔")
+    ap.add_argument("--kinds", default="explain,hint", help="explain、hint，以逗號分隔")
+    ap.add_argument("--workers", type=int, default=4, help="同時呼叫模型的上限")
+    ap.add_argument("--out", default=DEFAULT_PATH, help="sidecar 檔路徑")
+    ap.add_argument("--stub", action="store_true", help="使用本機假模型")
+    args = ap.parse_args(argv)
+
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in BUILDERS]
+    if unknown:
+        ap.error(f"未知的類型：{', '.join(unknown)}")
+    if args.stub:
+        generate = stub_generate
+    else:
+        from exam_system.services import gemini_client  # 需要 streamlit secrets
+        generate = gemini_client.generate
+
+    sidecar = Sidecar(args.out)
+    jobs = plan(bank_questions(load_local_bank(args.files)), kinds, sidecar.keys())
+    print(f"待產生 {len(jobs)} 筆（已完成 {len(sidecar)} 筆）")
+    stats = run(jobs, generate, sidecar, args.workers,
+                on_progress=lambda n, total: print(f"\r{n}/{total}", end="", flush=True))
+    print(f"\n完成 {stats['done']}、失敗 {stats['failed']}，結果寫入 {args.out}")
+    return 0 if not stats["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+# exam_system/services/ai_prompts.py
+"""
+AI 提示詞建構：每個 builder 回傳 (cache_key, 系統指示, 使用者訊息)。
+cache_key 是題目內容（原選項順序）的雜湊，也是預先產生成果（ai_pregen）的 key。
+不依賴 streamlit，頁面與離線工具共用。
+"""
+import hashlib
+import pandas as pd
+from exam_system.services import option_canon
+
+def _hash(s: str) -> str:
+    return hashlib.md5(s.encode("utf-8")).hexdigest()
+
+def build_hint_prompt(q: dict):
+    sys = (
+        "你是考試助教，只能提供方向提示，嚴禁輸出答案代號或逐字答案。"
+        "優先參考題庫的解答說明；不足再補充概念或排除法。"
+    )
+    expl = (q.get("Explanation") or "").strip()
+    # 提示詞與 key 以題庫原選項順序組成，選項打亂後的每份試卷共用同一份回應
+    choices, _, _ = option_canon.canonical(q)
+    choice_lines = chr(10).join([f"{lab}. {txt}" for lab,txt in choices])
+    user = f"""
+題目: {q['Question']}
+選項:
+{choice_lines}
+題庫解答說明（僅供參考、不可爆雷）：{expl if expl else "（無）"}
+請用 1-2 句提示重點，不要爆雷。
+"""
+    ck = _hash("HINT|" + q["Question"] + "|" + choice_lines + "|" + expl)
+    return ck, sys, user
+
+def build_explain_prompt(q: dict):
+    sys = "你是解題老師，優先引用題庫解答說明，逐項說明正確與錯誤，保持精簡。"
+    expl = (q.get("Explanation") or "").strip()
+    # 以原選項順序與原代號組成（含字母代號的題目除外），顯示前再以 option_canon.to_display 換回本卷代號
+    choices, ans_letters, _ = option_canon.canonical(q)
+    choice_lines = chr(10).join([f"{lab}. {txt}" for lab,txt in choices])
+    user = f"""
+題目: {q['Question']}
+選項:
+{choice_lines}
+正解: {ans_letters or "（無）"}
+題庫解答說明：{expl if expl else "（無）"}
+"""
+    ck = _hash("EXPL|" + q["Question"] + "|" + choice_lines + "|" + ans_letters)
+    return ck, sys, user
+
+def build_weak_wrong_prompt(result_df_wrong: pd.DataFrame):
+    sys = "你是考後復盤教練，聚焦錯題的主題與知識點，指出易錯原因與改進建議。"
+    mini = result_df_wrong[["ID","Tag","Question","Your Answer","Correct"]].head(200)
+    user = f"""
+以下為本次錯題（最多 200 題）：
+{mini.to_csv(index=False)}
+請輸出：1) 錯題主題聚類 2) 容易混淆/易錯點 3) 必背觀念 4) 接下來復習建議（條列）。
+"""
+    ck = _hash("WRONG|" + mini.to_csv(index=False))
+    return ck, sys, user
+
+def build_summary_prompt(result_df: pd.DataFrame):
+    sys = "你是考後診斷教練，請分析弱點與建議。"
+    mini = result_df[["ID","Tag","Question","Your Answer","Correct","Result"]].head(200)
+    user = f"""
+以下是作答結果（最多 200 題）：
+{mini.to_csv(index=False)}
+請輸出：整體表現、弱項主題、3-5點練習建議（條列）。
+"""
+    ck = _hash("SUMM|" + mini.to_csv(index=False))
+    return ck, sys, user
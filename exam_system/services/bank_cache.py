@@ -0,0 +1,81 @@
+# exam_system/services/bank_cache.py
+"""
+編譯後題庫快取：
+以檔案內容的 git blob SHA 為 key，把正規化後的 DataFrame 存成 Parquet。
+SHA 未變時直接讀取，完全略過 Excel 解析與正規化。
+"""
+import os
+import hashlib
+from pathlib import Path
+import pandas as pd
+from exam_system.config import settings
+
+# 正規化邏輯有變動時遞增，舊快取會自動失效
+COMPILED_VERSION = 3
+
+
+def blob_sha(data: bytes) -> str:
+    """計算與 GitHub 相同的 git blob SHA-1"""
+    h = hashlib.sha1()
+    h.update(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _cache_path(sha: str, namespace: str) -> Path:
+    # namespace 區分不同的正規化實作（exam_system 與單檔版 app.py 規則略有不同）
+    return Path(settings.BANK_CACHE_DIR) / f"{namespace}-v{COMPILED_VERSION}" / f"{sha}.parquet"
+
+
+def _to_storable(df: pd.DataFrame) -> pd.DataFrame:
+    # Excel 備註欄常混雜數字與文字，Parquet 無法存混合型別，轉成可為空的字串型別：
+    # 空值仍是空值（不會變成 "None" / "nan"），從 Parquet 讀回來的型別也相同
+    df = df.copy()
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = df[c].astype("string")
+    return df
+
+
+def load_compiled(sha: str, source_file: str | None = None, namespace: str = "exam_system") -> pd.DataFrame | None:
+    """讀取已編譯題庫；不存在或讀取失敗回傳 None"""
+    p = _cache_path(sha, namespace)
+    if not p.exists():
+        return None
+    try:
+        df = pd.read_parquet(p)
+    except Exception:
+        return None
+    # 同一份檔案可能放在不同路徑，來源欄位以呼叫端為準
+    df["SourceFile"] = (source_file or "").strip()
+    return df
+
+
+def store_compiled(sha: str, df: pd.DataFrame, namespace: str = "exam_system"):
+    """寫入已編譯題庫（先寫暫存檔再 rename，避免多個 worker 讀到半個檔案）"""
+    p = _cache_path(sha, namespace)
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        _to_storable(df).to_parquet(tmp, index=False)
+        os.replace(tmp, p)
+    except Exception:
+        # 快取失敗不影響正常載入（例如未安裝 pyarrow、磁碟唯讀）
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def load_or_compile(data: bytes, filename: str, compile_fn, namespace: str = "exam_system") -> pd.DataFrame | None:
+    """命中快取就直接回傳；否則呼叫 compile_fn(data, filename) 解析並寫回快取"""
+    sha = blob_sha(data)
+    df = load_compiled(sha, filename, namespace)
+    if df is not None:
+        return df
+    df = compile_fn(data, filename)
+    if df is not None and not df.empty:
+        # 剛解析的結果也轉成快取的型別，第一次載入與之後命中快取拿到的題庫一致
+        df = _to_storable(df)
+        store_compiled(sha, df, namespace)
+    return df
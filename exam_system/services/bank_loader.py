@@ -1,102 +1,85 @@
 # exam_system/services/bank_loader.py
+import multiprocessing
+import os
+import threading
 import pandas as pd
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 import streamlit as st
-from exam_system.services import github_repo
+from exam_system.config import settings
+from exam_system.services import github_repo, bank_cache, bank_registry, load_pipeline, xlsx_split
+from exam_system.services.bank_normalize import normalize_bank_df, parse_sheets
 
-def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_file: str | None = None) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
+_pool = None
+_pool_lock = threading.Lock()
 
-    col_map = {
-        "編號": "ID", "題號": "ID",
-        "題目": "Question", "題幹": "Question",
-        "解答說明": "Explanation", "解釋說明": "Explanation", "詳解": "Explanation",
-        "標籤": "Tag", "章節": "Tag", "科目": "Tag",
-        "圖片": "Image",
-        "選項一": "OptionA", "選項二": "OptionB", "選項三": "OptionC",
-        "選項四": "OptionD", "選項五": "OptionE",
-        "答案": "Answer", "題型": "Type",
-    }
-    df = df.rename(columns={c: col_map.get(c, c) for c in df.columns})
+def _parse_workers() -> int:
+    return settings.PARSE_WORKERS or (os.cpu_count() or 1)
 
-    # 標準化選項欄位 OptionA, OptionB...
-    option_cols = []
-    for c in df.columns:
-        lc = str(c).strip()
-        if lc.lower().startswith("option"):
-            option_cols.append(c)
-        elif lc in list("ABCDE"):
-            idx = ord(lc) - ord("A")
-            std = f"Option{chr(ord('A')+idx)}"
-            df = df.rename(columns={c: std})
-            option_cols.append(std)
-        elif lc in ["Ａ","Ｂ","Ｃ","Ｄ","Ｅ"]:
-            idx = ["Ａ","Ｂ","Ｃ","Ｄ","Ｅ"].index(lc)
-            std = f"Option{chr(ord('A')+idx)}"
-            df = df.rename(columns={c: std})
-            option_cols.append(std)
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    整個 process 共用一個 pool，避免每次載入都重新啟動 worker。
+    Streamlit server 是多執行緒的，直接 fork 可能把其他 thread 持有的鎖帶進 worker 而卡死，
+    改用 forkserver（worker 只需 import bank_normalize，啟動成本低）
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_parse_workers(),
+                                        mp_context=multiprocessing.get_context("forkserver"))
+        return _pool
 
-    if len(option_cols) < 2 or "Question" not in df.columns:
-        return pd.DataFrame() # 無法識別的格式
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
 
-    # 補齊必要欄位
-    for col in ["Explanation", "Tag", "Image"]:
-        if col not in df.columns: df[col] = ""
+def _parse_sheets_parallel(book: xlsx_split.Workbook, filename: str, sheet_names: list[str]) -> list[pd.DataFrame]:
+    """
+    把工作表切成連續區段分給 worker，結果依原工作表順序串回。
+    每個 worker 只拿到自己那幾張工作表拆成的小活頁簿，不必各自重開、重解析整份活頁簿。
+    """
+    workers = min(_parse_workers(), len(sheet_names))
+    size = -(-len(sheet_names) // workers)
+    chunks = [sheet_names[i:i + size] for i in range(0, len(sheet_names), size)]
+    pool = _get_pool()
+    futures = [pool.submit(parse_sheets, book.subset(ch), filename, ch) for ch in chunks]
+    return [df for fut in futures for df in fut.result()]
 
-    # 處理答案
-    for oc in option_cols:
-        df[oc] = df[oc].fillna("").astype(str)
+def _use_parallel(data: bytes, sheets: list[str]) -> xlsx_split.Workbook | None:
+    """
+    工作表夠多、內容夠大時才值得平行（回傳拆好的活頁簿，否則 None）：
+    worker 啟動、傳送與各自開檔都是固定成本，一般大小的題庫序列解析反而比較快
+    """
+    if len(sheets) <= settings.PARALLEL_SHEETS_MIN or _parse_workers() <= 1:
+        return None
+    book = xlsx_split.open_workbook(data)
+    if book is None or book.sheet_xml_bytes() < settings.PARALLEL_MIN_BYTES:
+        return None
+    return book
 
-    if "Answer" not in df.columns or df["Answer"].astype(str).str.strip().eq("").all():
-        # 嘗試從 * 解析答案
-        answers, types = [], []
-        for ridx, r in df.iterrows():
-            stars = []
-            for i, oc in enumerate(option_cols):
-                text = str(r[oc]).strip()
-                if text.startswith("*"):
-                    stars.append(chr(ord("A") + i))
-                    df.at[ridx, oc] = text.lstrip("* ").strip()
-            if len(stars) == 1:
-                answers.append("".join(stars))
-                types.append("SC")
-            else:
-                answers.append("".join(stars))
-                types.append("MC")
-        df["Answer"] = answers
-        if "Type" not in df.columns: df["Type"] = types
-
-    if "Type" not in df.columns: df["Type"] = "SC"
-
-    df["Type"] = df["Type"].astype(str).str.upper().str.strip()
-    df["Answer"] = df["Answer"].astype(str).str.upper().str.replace(" ", "", regex=False)
-    
-    # 移除空選項行
-    def has_two_options(row):
-        cnt = sum(1 for oc in option_cols if str(row.get(oc, "")).strip())
-        return cnt >= 2
-    df = df[df.apply(has_two_options, axis=1)].reset_index(drop=True)
-
-    if sheet_name:
-        df["Tag"] = df["Tag"].astype(str)
-        df.loc[df["Tag"].str.strip().eq(""), "Tag"] = sheet_name
-
-    df["SourceFile"] = (source_file or "").strip()
-    df["SourceSheet"] = (sheet_name or "").strip()
-    return df
-
-def _load_excel_bytes(data: bytes, filename: str):
+def _parse_excel_bytes(data: bytes, filename: str):
     bio = BytesIO(data)
     bio.name = filename
     try:
         xls = pd.ExcelFile(bio)
-        dfs = []
-        for sh in xls.sheet_names:
-            raw = pd.read_excel(xls, sheet_name=sh)
-            norm = normalize_bank_df(raw, sheet_name=sh, source_file=filename)
-            if not norm.empty:
-                dfs.append(norm)
+        sheets = xls.sheet_names
+        parsed = None
+        book = _use_parallel(data, sheets)
+        if book is not None:
+            try:
+                parsed = _parse_sheets_parallel(book, filename, sheets)
+            except Exception:
+                # pool 壞掉（worker 被 OOM kill 等）就重建，這次改走序列解析
+                _reset_pool()
+        if parsed is None:
+            parsed = [
+                normalize_bank_df(pd.read_excel(xls, sheet_name=sh), sheet_name=sh, source_file=filename)
+                for sh in sheets
+            ]
+        dfs = [norm for norm in parsed if not norm.empty]
         if dfs:
             return pd.concat(dfs, ignore_index=True)
     except Exception:
@@ -110,20 +93,52 @@ def _load_excel_bytes(data: bytes, filename: str):
             pass
     return None
 
-def load_banks(paths: list[str]) -> pd.DataFrame:
-    dfs = []
-    with st.spinner(f"正在載入 {len(paths)} 個題庫檔..."):
-        for p in paths:
-            data = github_repo.download_bytes(p)
-            if data is None:
-                st.warning(f"無法下載題庫：{p}")
-                continue
-            df = _load_excel_bytes(data, p)
-            if df is not None and not df.empty:
-                dfs.append(df)
-    
+def _load_excel_bytes(data: bytes, filename: str):
+    """先查編譯快取（依 git blob SHA），未命中才解析 Excel"""
+    return bank_cache.load_or_compile(data, filename, _parse_excel_bytes)
+
+def _load_banks(paths: list[str], index_shas=None) -> tuple[pd.DataFrame, dict]:
+    """
+    下載與解析並行（管線），側欄逐檔回報進度；回傳 (合併結果, {path: blob SHA})。
+    index_shas 為索引中的 SHA（可省略），檔案更新後下載快取才不會回舊內容。
+    """
+    known = dict(zip(paths, index_shas or []))
+    loaded, shas, failed = {}, {}, []
+    total = len(paths)
+
+    def _parse(data: bytes, p: str):
+        shas[p] = bank_cache.blob_sha(data)
+        return _load_excel_bytes(data, p)
+
+    with st.status(f"正在載入 {total} 個題庫檔...", expanded=False) as status:
+        results = load_pipeline.fetch_and_parse(
+            paths, lambda p: github_repo.download_bytes(p, known.get(p)), _parse,
+            max_downloads=settings.DOWNLOAD_WORKERS,
+        )
+        for done, (p, df, err) in enumerate(results, 1):
+            if err:
+                failed.append((p, err))
+                status.write(f"❌ {p}（{err}）")
+            else:
+                loaded[p] = df
+                status.write(f"✅ {p}（{len(df)} 題）")
+            status.update(label=f"正在載入題庫 {done}/{total}...")
+        # 有檔案失敗時展開並標成錯誤，不讓失敗藏在收合的狀態框裡
+        status.update(label=f"已載入 {len(loaded)}/{total} 個題庫檔",
+                      state="error" if failed else "complete", expanded=bool(failed))
+    for p, err in failed:
+        st.warning(f"無法載入題庫：{p}（{err}）")
+
+    dfs = [loaded[p] for p in paths if p in loaded]
     if not dfs:
         st.error("所有題庫載入失敗或內容為空。")
         st.stop()
         
-    return pd.concat(dfs, ignore_index=True)
+    return pd.concat(dfs, ignore_index=True), shas
+
+def open_bank(paths: list[str], index_shas=None) -> bank_registry.Bank:
+    """載入並登錄到 process 共用 registry；相同 (paths, SHAs) 的 session 共用同一份題庫"""
+    df, shas = _load_banks(paths, index_shas)
+    # 載入失敗的檔案沒有算出 SHA，改用索引中的 SHA，key 才會與其他 session 查詢時的一致
+    known = dict(zip(paths, index_shas or []))
+    return bank_registry.register(paths, [shas.get(p) or known.get(p) or "" for p in paths], df)
@@ -0,0 +1,116 @@
+# exam_system/services/bank_normalize.py
+"""
+題庫正規化引擎（欄向量運算版）：
+不逐列 iterrows，而是一次對所有選項欄做字串向量運算，
+由 * 標記矩陣組出答案字母與 SC/MC 題型。
+只依賴 pandas / numpy，可在 process pool 的 worker 中直接使用。
+"""
+from io import BytesIO
+import numpy as np
+import pandas as pd
+
+# 題目編號 / 題目內容 / 答案選項N 是 IPA 題庫的新版表頭（IPA題庫_20250421_LIB.xls 全部工作表、
+# IPA題庫.xlsx 的 IPA03–IPA10）。加入前這些工作表會被當成無法識別而整張略過，
+# IPA題庫.xlsx 只載入 IPA01–IPA02 的 277 題；加入後為 1004 題，抽題範圍跟著變大。
+COL_MAP = {
+    "編號": "ID", "題號": "ID", "題目編號": "ID",
+    "題目": "Question", "題幹": "Question", "題目內容": "Question",
+    "解答說明": "Explanation", "解釋說明": "Explanation", "詳解": "Explanation",
+    "標籤": "Tag", "章節": "Tag", "科目": "Tag",
+    "圖片": "Image",
+    "選項一": "OptionA", "選項二": "OptionB", "選項三": "OptionC",
+    "選項四": "OptionD", "選項五": "OptionE",
+    "答案選項1": "OptionA", "答案選項2": "OptionB", "答案選項3": "OptionC",
+    "答案選項4": "OptionD", "答案選項5": "OptionE",
+    "答案": "Answer", "題型": "Type",
+}
+FULLWIDTH_LETTERS = ["Ａ", "Ｂ", "Ｃ", "Ｄ", "Ｅ"]
+
+
+def star_answers(df: pd.DataFrame, option_cols: list[str]):
+    """
+    解析選項前的 * 標記（選項欄需已是字串）。
+    - 有 * 的選項會被就地清掉 * 與空白，其餘選項維持原文
+    - 回傳 (答案字母 Series, 每題 * 數量 ndarray)
+    """
+    opts = df[option_cols]
+    stripped = opts.apply(lambda s: s.str.strip())
+    mask = stripped.apply(lambda s: s.str.startswith("*")).to_numpy(dtype=bool)
+    cleaned = stripped.apply(lambda s: s.str.lstrip("* ").str.strip())
+    df[option_cols] = opts.where(~mask, cleaned)
+
+    answers = pd.Series("", index=df.index, dtype=object)
+    for i in range(len(option_cols)):
+        answers = answers + np.where(mask[:, i], chr(ord("A") + i), "")
+    return answers, mask.sum(axis=1)
+
+
+def has_min_options(df: pd.DataFrame, option_cols: list[str], n: int = 2) -> pd.Series:
+    """每題非空選項數是否 >= n（布林遮罩）"""
+    filled = df[option_cols].apply(lambda s: s.astype(str).str.strip().ne(""))
+    return filled.sum(axis=1) >= n
+
+
+def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_file: str | None = None) -> pd.DataFrame:
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    df = df.rename(columns={c: COL_MAP.get(c, c) for c in df.columns})
+
+    # 標準化選項欄位 OptionA, OptionB...
+    option_cols = []
+    for c in df.columns:
+        lc = str(c).strip()
+        if lc.lower().startswith("option"):
+            option_cols.append(c)
+        elif lc in list("ABCDE"):
+            std = f"Option{lc}"
+            df = df.rename(columns={c: std})
+            option_cols.append(std)
+        elif lc in FULLWIDTH_LETTERS:
+            std = f"Option{chr(ord('A') + FULLWIDTH_LETTERS.index(lc))}"
+            df = df.rename(columns={c: std})
+            option_cols.append(std)
+
+    if len(option_cols) < 2 or "Question" not in df.columns:
+        return pd.DataFrame() # 無法識別的格式
+
+    # 補齊必要欄位
+    for col in ["Explanation", "Tag", "Image"]:
+        if col not in df.columns: df[col] = ""
+
+    # 處理答案
+    for oc in option_cols:
+        df[oc] = df[oc].fillna("").astype(str)
+
+    if "Answer" not in df.columns or df["Answer"].astype(str).str.strip().eq("").all():
+        # 嘗試從 * 解析答案
+        answers, n_stars = star_answers(df, option_cols)
+        df["Answer"] = answers
+        if "Type" not in df.columns: df["Type"] = np.where(n_stars == 1, "SC", "MC")
+
+    if "Type" not in df.columns: df["Type"] = "SC"
+
+    df["Type"] = df["Type"].astype(str).str.upper().str.strip()
+    df["Answer"] = df["Answer"].astype(str).str.upper().str.replace(" ", "", regex=False)
+
+    # 移除空選項行
+    df = df[has_min_options(df, option_cols)].reset_index(drop=True)
+
+    if sheet_name:
+        df["Tag"] = df["Tag"].astype(str)
+        df.loc[df["Tag"].str.strip().eq(""), "Tag"] = sheet_name
+
+    df["SourceFile"] = (source_file or "").strip()
+    df["SourceSheet"] = (sheet_name or "").strip()
+    return df
+
+
+def parse_sheets(data: bytes, filename: str, sheet_names: list[str]) -> list[pd.DataFrame]:
+    """讀取並正規化指定的工作表（process pool worker 用；同一批只開一次活頁簿）"""
+    bio = BytesIO(data)
+    bio.name = filename
+    xls = pd.ExcelFile(bio)
+    return [
+        normalize_bank_df(pd.read_excel(xls, sheet_name=sh), sheet_name=sh, source_file=filename)
+        for sh in sheet_names
+    ]
@@ -0,0 +1,80 @@
+# exam_system/services/bank_registry.py
+"""
+Process 共用的唯讀題庫 registry：
+同一組 (paths, SHAs) 的題庫在整個 server process 只保留一份 DataFrame，
+各 session 只存 key 與篩選後的列索引（numpy array），記憶體不隨使用者數成長。
+"""
+import threading
+from collections import OrderedDict
+import pandas as pd
+from exam_system.config import settings
+from exam_system.services.tag_index import TagIndex
+from exam_system.services.paper_engine import QuestionStore
+
+
+class Bank:
+    """已載入的題庫（唯讀，所有 session 共用，呼叫端不可修改 df）"""
+
+    def __init__(self, key: tuple, df: pd.DataFrame):
+        self.key = key
+        self.df = df
+        self._tag_index = None
+        self._question_store = None
+
+    @property
+    def paths(self) -> tuple:
+        return self.key[0]
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def tag_index(self) -> TagIndex:
+        """標籤反向索引（第一次使用時建立，之後所有 session 共用）"""
+        if self._tag_index is None:
+            self._tag_index = TagIndex(self.df["Tag"])
+        return self._tag_index
+
+    @property
+    def question_store(self) -> QuestionStore:
+        """出題用的陣列版題庫（第一次出題時建立，之後所有 session 共用）"""
+        if self._question_store is None:
+            self._question_store = QuestionStore(self.df)
+        return self._question_store
+
+    def subset(self, rows) -> pd.DataFrame:
+        """依列索引取出子集（新的 DataFrame，不影響共用資料）"""
+        return self.df.iloc[rows]
+
+
+_banks: "OrderedDict[tuple, Bank]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def make_key(paths, shas) -> tuple:
+    return (tuple(paths), tuple(shas))
+
+
+def get(key) -> Bank | None:
+    if key is None:
+        return None
+    with _lock:
+        bank = _banks.get(key)
+        if bank is not None:
+            _banks.move_to_end(key)
+        return bank
+
+
+def register(paths, shas, df: pd.DataFrame) -> Bank:
+    """登錄題庫；相同 key 已存在時沿用既有那份（新傳入的 df 直接丟棄）"""
+    key = make_key(paths, shas)
+    with _lock:
+        bank = _banks.get(key)
+        if bank is None:
+            bank = Bank(key, df)
+            _banks[key] = bank
+            # 超過上限時淘汰最久沒用的題庫；仍持有舊 key 的 session 下次重跑會重新載入
+            while len(_banks) > settings.BANK_REGISTRY_MAX:
+                _banks.popitem(last=False)
+        _banks.move_to_end(key)
+        return bank
@@ -0,0 +1,160 @@
+# exam_system/services/blob_cache.py
+"""
+GitHub 檔案的磁碟快取（條件式請求）：
+- blobs/<git blob sha>.bin：解碼後的檔案內容（同內容不同路徑共用一份）
+- etags/<key hash>.json：(repo, ref, path) -> 上次回應的 ETag 與 blob SHA
+再次下載時帶 If-None-Match，檔案沒變時 GitHub 回 304（不計入 rate limit），
+直接讀磁碟上的 bytes，不需重新傳輸與 base64 解碼。
+
+已從題庫索引得知 SHA 時，磁碟有該 blob 就完全不連線；沒有時直接以 Git Blobs API
+（raw 格式，不經 base64、不受 contents API 1 MB 限制）分段寫入暫存檔，邊下載邊驗證 blob SHA，
+驗證通過才放進快取。呼叫端（st.cache_data、解析 worker）都需要完整的 bytes，
+因此最後仍會把整個檔案讀進記憶體一次；分段寫入省的是 base64 JSON 與解碼的額外複本，不是記憶體上限。
+"""
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from exam_system.config import settings
+from exam_system.services.bank_cache import blob_sha
+
+
+def _root() -> Path:
+    return Path(settings.BANK_CACHE_DIR)
+
+
+def _blob_path(sha: str) -> Path:
+    return _root() / "blobs" / f"{sha}.bin"
+
+
+def _etag_path(client, path: str, ref: str) -> Path:
+    key = f"{client.owner}/{client.repo}@{ref}:{path}"
+    return _root() / "etags" / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+
+def _write_atomic(p: Path, data: bytes):
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(data)
+        os.replace(tmp, p)
+    except OSError:
+        # 快取寫不進去（唯讀磁碟等）不影響下載結果
+        tmp.unlink(missing_ok=True)
+
+
+def read_blob(sha: str) -> bytes | None:
+    try:
+        return _blob_path(sha).read_bytes()
+    except OSError:
+        return None
+
+
+def store_blob(data: bytes, sha: str | None = None) -> str:
+    sha = sha or blob_sha(data)
+    p = _blob_path(sha)
+    if not p.exists():
+        _write_atomic(p, data)
+    return sha
+
+
+CHUNK = 1 << 16
+SPOOL_MAX = 8 << 20  # 無法寫入快取目錄時，記憶體暫存上限（超過轉存暫存檔）
+
+
+class BlobMismatch(ValueError):
+    """下載內容的 blob SHA 與預期不符"""
+
+
+def _open_spool(sha: str):
+    """優先直接寫到快取目錄的暫存檔（驗證後 rename 即完成快取），不行才用 SpooledTemporaryFile"""
+    p = _blob_path(sha)
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        return open(tmp, "w+b"), tmp
+    except OSError:
+        return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX), None
+
+
+def _verify(out, n: int, h, sha: str):
+    if h is None:
+        # 事先不知道長度（或傳輸有壓縮）時，寫完再從暫存檔重算一次
+        out.seek(0)
+        h = hashlib.sha1(b"blob %d\0" % n)
+        for chunk in iter(lambda: out.read(CHUNK), b""):
+            h.update(chunk)
+    if h.hexdigest() != sha:
+        raise BlobMismatch(f"blob SHA 不符：預期 {sha}，實得 {h.hexdigest()}")
+
+
+def download_blob(client, sha: str, size: int | None = None) -> bytes:
+    """以 Git Blobs API（raw）分段下載單一 blob，驗證 SHA 後寫入快取，再整份讀出回傳"""
+    r = client.api_response(f"git/blobs/{sha}", headers={"Accept": "application/vnd.github.raw"}, stream=True)
+    out, tmp = _open_spool(sha)
+    try:
+        with r, out:
+            h = hashlib.sha1(b"blob %d\0" % size) if size is not None else None
+            n = 0
+            for chunk in r.iter_content(CHUNK):
+                out.write(chunk)
+                n += len(chunk)
+                if h is not None:
+                    h.update(chunk)
+            _verify(out, n, h if n == size else None, sha)
+            out.seek(0)
+            data = out.read()
+        if tmp is not None:
+            os.replace(tmp, _blob_path(sha))
+            tmp = None
+        return data
+    finally:
+        if tmp is not None:
+            Path(tmp).unlink(missing_ok=True)
+
+
+def _read_entry(p: Path) -> dict:
+    try:
+        return json.loads(p.read_text("utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def fetch(client, path: str, ref: str, sha: str | None = None, size: int | None = None) -> tuple[bytes, str]:
+    """
+    取得檔案，回傳 (bytes, blob sha)。
+    - 已知 sha（來自題庫索引）：磁碟命中直接回傳，否則以 Git Blobs API 串流下載一次
+    - 未知 sha：走 contents API，有快取時以 If-None-Match 重新驗證；304 或 SHA 相同時直接讀磁碟
+    """
+    if sha:
+        data = read_blob(sha)
+        return (data if data is not None else download_blob(client, sha, size)), sha
+
+    etag_file = _etag_path(client, path, ref)
+    entry = _read_entry(etag_file)
+    cached = read_blob(entry["sha"]) if entry.get("sha") else None
+
+    headers = {"If-None-Match": entry["etag"]} if cached is not None and entry.get("etag") else {}
+    r = client.api_response(f"contents/{path}", params={"ref": ref}, headers=headers)
+    if r.status_code == 304:
+        return cached, entry["sha"]
+
+    j = r.json()
+    sha = j.get("sha")
+    data = read_blob(sha) if sha else None  # 內容沒變、只是 ETag 換了（或其他路徑已下載過同一份）
+    if data is None:
+        if j.get("encoding") == "base64" and j.get("content"):
+            data = base64.b64decode(j["content"])
+            sha = store_blob(data, sha)
+        elif sha:
+            # 超過 1 MB 的檔案 contents API 不附內容，改以 Git Blobs API 串流下載
+            data = download_blob(client, sha, j.get("size"))
+        else:
+            data = client.raw(path, ref)
+            sha = store_blob(data)
+    if r.headers.get("ETag"):
+        _write_atomic(etag_file, json.dumps({"etag": r.headers["ETag"], "sha": sha}).encode("utf-8"))
+    return data, sha
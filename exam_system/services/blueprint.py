@@ -0,0 +1,65 @@
+# exam_system/services/blueprint.py
+"""
+考試藍圖（依章節 / Tag 配題）：
+在 secrets 的 BLUEPRINTS 依題庫類型設定，值為固定題數或佔總題數的百分比，例如
+
+    [BLUEPRINTS.人身]
+    PA11 = 10
+    PA12 = "20%"
+
+每個標籤是一個分層，各層不放回抽滿配額；一題有多個標籤時歸入藍圖中最先列出的那層。
+分層與抽樣都建立在標籤反向索引上，一次向量化完成。
+"""
+import numpy as np
+
+
+def allocate(spec: dict, n: int) -> dict[str, int]:
+    """藍圖 -> 各標籤題數（百分比以最大餘數法分配，避免四捨五入後總數對不上）"""
+    counts, shares = {}, {}
+    for tag, v in spec.items():
+        if isinstance(v, str) and v.strip().endswith("%"):
+            shares[tag] = float(v.strip()[:-1]) / 100 * n
+        else:
+            counts[tag] = int(v)
+    if shares:
+        base = {t: int(np.floor(x)) for t, x in shares.items()}
+        left = int(round(sum(shares.values()))) - sum(base.values())
+        for t in sorted(shares, key=lambda t: shares[t] - base[t], reverse=True)[:left]:
+            base[t] += 1
+        counts.update(base)
+    return {t: counts[t] for t in spec}
+
+
+def stratify(tag_index, candidates: np.ndarray, tags: list[str]) -> np.ndarray:
+    """每個候選列所屬的分層編號（tags 中的位置）；不屬於任何藍圖標籤者為 -1"""
+    owner = np.full(tag_index.n_rows, -1, dtype=np.int32)
+    # 由後往前寫入，同一列有多個標籤時保留最先列出的分層
+    for s in range(len(tags) - 1, -1, -1):
+        rows = tag_index.rows.get(tags[s])
+        if rows is not None:
+            owner[rows] = s
+    return owner[np.asarray(candidates)]
+
+
+def plan(tag_index, candidates: np.ndarray, spec: dict, n: int):
+    """
+    回傳 (strata, quotas, shortages)：
+    - quotas 已依各層可用題數截斷
+    - shortages: {tag: (需要題數, 可用題數)}，供側欄提示
+    """
+    tags = list(spec)
+    quotas = np.array(list(allocate(spec, n).values()), dtype=np.int64)
+    strata = stratify(tag_index, candidates, tags)
+    capacity = np.bincount(strata[strata >= 0], minlength=len(tags))
+    shortages = {tags[i]: (int(quotas[i]), int(capacity[i])) for i in np.flatnonzero(capacity < quotas)}
+    return strata, np.minimum(quotas, capacity), shortages
+
+
+def sample(candidates: np.ndarray, strata: np.ndarray, quotas: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """分層抽樣：依 (分層, 亂數鍵) 排序一次，每層取前 quota 題；結果依藍圖分層順序排列"""
+    order = np.lexsort((rng.random(len(strata)), strata))
+    s_sorted = strata[order]
+    rank = np.arange(len(order)) - np.searchsorted(s_sorted, s_sorted, side="left")
+    valid = s_sorted >= 0
+    take = valid & (rank < quotas[np.where(valid, s_sorted, 0)])
+    return np.asarray(candidates)[order[take]]
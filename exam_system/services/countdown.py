@@ -0,0 +1,60 @@
+# exam_system/services/countdown.py
+"""
+瀏覽器端倒數計時：
+時間顯示完全在前端以 JS 更新，不需要定時重跑整個 Streamlit script；
+倒數到 0 時在頁面上找到交卷按鈕點一次，觸發唯一一次的自動交卷。
+伺服器端仍以 start_ts + 時限判定是否逾時（見 deadline / remaining），前端只負責顯示與觸發。
+"""
+import json
+import time
+
+HEIGHT = 48  # components.html iframe 高度
+
+
+def deadline(start_ts: float, time_limit: int) -> float | None:
+    """交卷期限（epoch 秒）；不限時回傳 None"""
+    return start_ts + time_limit if time_limit and time_limit > 0 else None
+
+
+def remaining(deadline_ts: float | None, now: float | None = None) -> float | None:
+    if deadline_ts is None:
+        return None
+    return deadline_ts - (time.time() if now is None else now)
+
+
+def countdown_html(remain_sec: float, submit_label: str) -> str:
+    """
+    remain_sec 以伺服器時間算好再傳入，前端用自己的時鐘往下數，不受兩端時鐘誤差影響。
+    submit_label 為交卷按鈕文字的一部分，用來在父頁面找到按鈕。
+    """
+    remain_ms = max(0, int(remain_sec * 1000))
+    return f"""
+<div id="countdown" style="font-family: sans-serif; font-size: 1.5rem; font-weight: 600;">⏱ --:--</div>
+<script>
+(function () {{
+  const end = Date.now() + {remain_ms};
+  const label = {json.dumps(submit_label)};
+  const el = document.getElementById("countdown");
+  let fired = false;
+  function submit() {{
+    const buttons = window.parent.document.querySelectorAll("button");
+    const btn = Array.from(buttons).find((b) => b.innerText.includes(label));
+    if (btn) btn.click();
+  }}
+  function tick() {{
+    const left = Math.max(0, Math.ceil((end - Date.now()) / 1000));
+    const mm = String(Math.floor(left / 60)).padStart(2, "0");
+    const ss = String(left % 60).padStart(2, "0");
+    el.textContent = "⏱ 剩餘時間 " + mm + ":" + ss;
+    if (left <= 60) el.style.color = "#d33";
+    if (left === 0) {{
+      el.textContent = "⏱ 時間到，自動交卷中…";
+      if (!fired) {{ fired = true; submit(); }}
+      return;
+    }}
+    setTimeout(tick, ((end - Date.now()) % 1000) || 1000);
+  }}
+  tick();
+}})();
+</script>
+"""
@@ -0,0 +1,45 @@
+# exam_system/services/exam_nav.py
+"""
+模擬考分頁與題目導覽：
+每次只建立目前這一頁的作答元件，其他頁的作答保留在 answers 中；
+導覽格以一段 markdown 顯示全部題目的作答狀態（已答 / 未答），不為每題建立元件。
+"""
+import numpy as np
+
+PAGE_SIZES = (5, 10, 20, 50)
+NAV_COLUMNS = 10  # 導覽格每列題數
+
+
+def n_pages(total: int, page_size: int) -> int:
+    return max(1, -(-int(total) // int(page_size)))
+
+
+def page_bounds(page: int, page_size: int, total: int) -> tuple[int, int]:
+    """第 page 頁（0 起算）的題目範圍 [start, stop)"""
+    start = int(page) * int(page_size)
+    return start, min(int(total), start + int(page_size))
+
+
+def answered_mask(total: int, answered) -> np.ndarray:
+    """answered 為已作答題目的位置（0 起算）"""
+    mask = np.zeros(int(total), dtype=bool)
+    idx = np.fromiter(answered, dtype=np.intp)
+    mask[idx[(idx >= 0) & (idx < total)]] = True
+    return mask
+
+
+def navigator_markdown(answered: np.ndarray, page_size: int, page: int) -> str:
+    """導覽格：已答綠底、未答灰底，目前這一頁的題號加粗"""
+    start, stop = page_bounds(page, page_size, len(answered))
+    cells = []
+    for i, done in enumerate(answered):
+        num = f"**{i + 1}**" if start <= i < stop else str(i + 1)
+        cells.append(f":{'green' if done else 'gray'}-background[{num}]")
+    rows = [" ".join(cells[r:r + NAV_COLUMNS]) for r in range(0, len(cells), NAV_COLUMNS)]
+    return "  \n".join(rows)
+
+
+def page_label(page: int, page_size: int, total: int) -> str:
+    """換頁選單的文字（固定內容；作答進度由導覽格顯示，選單不會因作答而變動）"""
+    start, stop = page_bounds(page, page_size, total)
+    return f"第 {page + 1} 頁（Q{start + 1}–Q{stop}）"
@@ -1,9 +1,12 @@
 # exam_system/services/gemini_client.py
-import hashlib
 import streamlit as st
 import google.generativeai as genai
-import pandas as pd
 from exam_system.config import settings
+from exam_system.services import ai_pregen, llm_cache
+# 提示詞建構移到 ai_prompts（不依賴 streamlit，離線預先產生工具共用），沿用原本的匯入路徑
+from exam_system.services.ai_prompts import (  # noqa: F401
+    build_explain_prompt, build_hint_prompt, build_summary_prompt, build_weak_wrong_prompt,
+)
 
 def is_ready():
     return bool(settings.GEMINI_API_KEY)
@@ -12,72 +15,65 @@ def _get_client():
     genai.configure(api_key=settings.GEMINI_API_KEY)
     return genai.GenerativeModel(settings.GEMINI_MODEL)
 
-def _hash(s: str) -> str:
-    return hashlib.md5(s.encode("utf-8")).hexdigest()
+@st.cache_resource(show_spinner=False)
+def get_cache() -> llm_cache.ResponseCache:
+    return llm_cache.ResponseCache(
+        settings.LLM_CACHE_PATH, settings.LLM_CACHE_MAX_ENTRIES, int(settings.LLM_CACHE_MAX_MB * (1 << 20)))
 
-@st.cache_data(show_spinner=False)
-def generate_cached(cache_key: str, system_msg: str, user_msg: str) -> str:
-    """快取 AI 回應，避免重複計費/耗時"""
-    if not is_ready():
-        return "Gemini API Key 未設定。"
-    try:
-        model = _get_client()
-        prompt = f"[系統指示]\n{system_msg}\n\n[使用者需求]\n{user_msg}".strip()
-        resp = model.generate_content(prompt)
-        return (resp.text or "").strip()
-    except Exception as e:
-        return f"AI 生成失敗: {str(e)}"
+@st.cache_resource(show_spinner=False)
+def get_pregen() -> ai_pregen.Sidecar:
+    return ai_pregen.Sidecar(settings.AI_PREGEN_PATH)
+
+def generate(system_msg: str, user_msg: str) -> str:
+    """直接呼叫模型（不查快取；失敗時拋出例外）"""
+    model = _get_client()
+    prompt = f"[系統指示]\n{system_msg}\n\n[使用者需求]\n{user_msg}".strip()
+    resp = model.generate_content(prompt)
+    return (resp.text or "").strip()
 
-# --- Prompt Builders ---
+def cached_generator():
+    """
+    給背景 thread 用的產生函式（依序查 sidecar、磁碟快取，都沒有才呼叫模型）：
+    sidecar 與快取物件先在目前的 script thread 取得，
+    回傳的函式不需要 streamlit context；失敗時拋出例外（不回傳錯誤訊息，也不寫入快取）
+    """
+    pregen, cache = get_pregen(), get_cache()
 
-def build_hint_prompt(q: dict):
-    sys = (
-        "你是考試助教，只能提供方向提示，嚴禁輸出答案代號或逐字答案。"
-        "優先參考題庫的解答說明；不足再補充概念或排除法。"
-    )
-    expl = (q.get("Explanation") or "").strip()
-    user = f"""
-題目: {q['Question']}
-選項:
-{chr(10).join([f"{lab}. {txt}" for lab,txt in q['Choices']])}
-題庫解答說明（僅供參考、不可爆雷）：{expl if expl else "（無）"}
-請用 1-2 句提示重點，不要爆雷。
-"""
-    ck = _hash("HINT|" + q["Question"] + "|" + expl)
-    return ck, sys, user
+    def run(cache_key: str, system_msg: str, user_msg: str) -> str:
+        text = pregen.get(cache_key) or cache.get(settings.GEMINI_MODEL, cache_key)
+        if text is None:
+            text = generate(system_msg, user_msg)
+            if text:
+                cache.put(settings.GEMINI_MODEL, cache_key, text)
+        return text
 
-def build_explain_prompt(q: dict):
-    sys = "你是解題老師，優先引用題庫解答說明，逐項說明正確與錯誤，保持精簡。"
-    expl = (q.get("Explanation") or "").strip()
-    ans_letters = "".join(sorted(list(q.get("Answer", set()))))
-    user = f"""
-題目: {q['Question']}
-選項:
-{chr(10).join([f"{lab}. {txt}" for lab,txt in q['Choices']])}
-正解: {ans_letters or "（無）"}
-題庫解答說明：{expl if expl else "（無）"}
-"""
-    ck = _hash("EXPL|" + q["Question"] + "|" + ans_letters)
-    return ck, sys, user
+    return run
 
-def build_weak_wrong_prompt(result_df_wrong: pd.DataFrame):
-    sys = "你是考後復盤教練，聚焦錯題的主題與知識點，指出易錯原因與改進建議。"
-    mini = result_df_wrong[["ID","Tag","Question","Your Answer","Correct"]].head(200)
-    user = f"""
-以下為本次錯題（最多 200 題）：
-{mini.to_csv(index=False)}
-請輸出：1) 錯題主題聚類 2) 容易混淆/易錯點 3) 必背觀念 4) 接下來復習建議（條列）。
-"""
-    ck = _hash("WRONG|" + mini.to_csv(index=False))
-    return ck, sys, user
+def _stream_chunks(system_msg: str, user_msg: str):
+    model = _get_client()
+    prompt = f"[系統指示]\n{system_msg}\n\n[使用者需求]\n{user_msg}".strip()
+    for chunk in model.generate_content(prompt, stream=True):
+        if chunk.text:
+            yield chunk.text
 
-def build_summary_prompt(result_df: pd.DataFrame):
-    sys = "你是考後診斷教練，請分析弱點與建議。"
-    mini = result_df[["ID","Tag","Question","Your Answer","Correct","Result"]].head(200)
-    user = f"""
-以下是作答結果（最多 200 題）：
-{mini.to_csv(index=False)}
-請輸出：整體表現、弱項主題、3-5點練習建議（條列）。
-"""
-    ck = _hash("SUMM|" + mini.to_csv(index=False))
-    return ck, sys, user
+def generate_stream(cache_key: str, system_msg: str, user_msg: str):
+    """
+    逐段產出 AI 回應（搭配 st.write_stream，第一段到達就開始顯示）；sidecar / 快取命中時一次給完整內容。
+    串流結束後全文寫入磁碟快取；中途失敗時接上錯誤訊息，不寫入快取
+    """
+    pre = get_pregen().get(cache_key)
+    if pre is not None:
+        yield pre
+        return
+    if not is_ready():
+        yield "Gemini API Key 未設定。"
+        return
+    cache = get_cache()
+    hit = cache.get(settings.GEMINI_MODEL, cache_key)
+    if hit is not None:
+        yield hit
+        return
+    try:
+        yield from cache.stream(settings.GEMINI_MODEL, cache_key, _stream_chunks(system_msg, user_msg))
+    except Exception as e:
+        yield f"\n\n⚠️ AI 生成中斷：{e}"
@@ -0,0 +1,149 @@
+# exam_system/services/github_client.py
+"""
+GitHub REST client：
+- 共用 requests.Session（連線池），不必每次呼叫都重新 TLS 握手
+- 每次請求都有逾時，慢回應不會卡住 script thread
+- 5xx / 429 / secondary rate limit 以指數退避 + 隨機抖動重試（有 Retry-After 時照辦）
+- 每次呼叫記錄延遲，供管理介面檢視
+不依賴 streamlit，exam_system 與 app.py 共用；實例由呼叫端（st.cache_resource）保存。
+"""
+import random
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+
+API_ROOT = "https://api.github.com"
+RAW_ROOT = "https://raw.githubusercontent.com"
+RETRY_STATUS = {500, 502, 503, 504}
+IDEMPOTENT = {"GET", "HEAD", "OPTIONS"}
+
+
+class GitHubError(RuntimeError):
+    """GitHub API 回傳 4xx/5xx（沿用 RuntimeError，既有的 except 不需修改）"""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class CallMetrics:
+    """最近呼叫的延遲紀錄與依端點彙總（thread-safe）"""
+
+    def __init__(self, keep: int = 200):
+        self.recent = deque(maxlen=keep)
+        self._summary = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, endpoint: str, status, elapsed_ms: float, attempts: int):
+        with self._lock:
+            self.recent.append({
+                "method": method, "endpoint": endpoint, "status": status,
+                "ms": round(elapsed_ms, 1), "attempts": attempts, "at": time.time(),
+            })
+            s = self._summary.setdefault((method, endpoint), {"calls": 0, "retries": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["calls"] += 1
+            s["retries"] += attempts - 1
+            s["errors"] += int(status is None or status >= 400)
+            s["total_ms"] += elapsed_ms
+            s["max_ms"] = max(s["max_ms"], elapsed_ms)
+
+    def summary(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"method": m, "endpoint": e, "calls": s["calls"], "retries": s["retries"], "errors": s["errors"],
+                 "avg_ms": round(s["total_ms"] / s["calls"], 1), "max_ms": round(s["max_ms"], 1)}
+                for (m, e), s in sorted(self._summary.items(), key=lambda kv: -kv[1]["total_ms"])
+            ]
+
+
+def _endpoint(path: str) -> str:
+    """彙總用的端點名稱：contents/bank/人身/a.xlsx -> contents、git/trees/main -> git/trees"""
+    parts = path.split("?", 1)[0].split("/")
+    return "/".join(parts[:2]) if parts[0] == "git" else parts[0]
+
+
+class GitHubClient:
+    def __init__(self, owner: str, repo: str, token: str = "", branch: str = "main",
+                 timeout: float = 30.0, max_retries: int = 4, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, pool_size: int = 16):
+        self.owner, self.repo, self.branch = owner, repo, branch
+        self.timeout = (min(10.0, timeout), timeout)  # (connect, read)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = CallMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/vnd.github+json"})
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    # ---- 低階 ----
+    def _should_retry(self, method: str, r: requests.Response | None, attempt: int) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if r is None:
+            return method in IDEMPOTENT  # 連線錯誤 / 逾時：只重試不改變狀態的請求
+        if r.status_code == 429:
+            return True
+        if r.status_code == 403 and ("rate limit" in r.text.lower() or r.headers.get("X-RateLimit-Remaining") == "0"):
+            return True
+        return r.status_code in RETRY_STATUS and method in IDEMPOTENT
+
+    def _backoff(self, r: requests.Response | None, attempt: int) -> float:
+        if r is not None:
+            retry_after = r.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+            reset = r.headers.get("X-RateLimit-Reset")
+            if r.headers.get("X-RateLimit-Remaining") == "0" and reset and reset.isdigit():
+                return min(max(0.0, float(reset) - time.time()), self.backoff_max)
+        # full jitter：0 ~ base * 2^attempt
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def request(self, method: str, url: str, endpoint: str, **kwargs) -> requests.Response:
+        """送出請求（含重試）；回傳最後一次的 Response，連線失敗則拋出例外"""
+        method = method.upper()
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            r, err = None, None
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                err = e
+            if not self._should_retry(method, r, attempt):
+                break
+            time.sleep(self._backoff(r, attempt))
+            attempt += 1
+        self.metrics.record(method, endpoint, None if r is None else r.status_code,
+                            (time.perf_counter() - start) * 1000, attempt + 1)
+        if r is None:
+            raise err
+        return r
+
+    # ---- 高階 ----
+    def api_response(self, path: str, method: str = "GET", **kwargs) -> requests.Response:
+        url = f"{API_ROOT}/repos/{self.owner}/{self.repo}/{path}"
+        r = self.request(method, url, _endpoint(path), **kwargs)
+        if r.status_code >= 400:
+            snippet = r.text[:300].replace("\n", " ")
+            raise GitHubError(f"GitHub API {method} {path} -> {r.status_code}: {snippet}", r.status_code)
+        return r
+
+    def api(self, path: str, method: str = "GET", **kwargs):
+        """repos/{owner}/{repo}/{path} 的 JSON 回應"""
+        return self.api_response(path, method, **kwargs).json()
+
+    def raw(self, path: str, ref: str | None = None) -> bytes:
+        """raw.githubusercontent.com 下載（contents API 不回傳內容時的備援）"""
+        url = f"{RAW_ROOT}/{self.owner}/{self.repo}/{ref or self.branch}/{path}"
+        r = self.request("GET", url, "raw")
+        if r.status_code >= 400:
+            raise GitHubError(f"GitHub raw GET {path} -> {r.status_code}", r.status_code)
+        return r.content
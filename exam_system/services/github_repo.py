@@ -1,24 +1,23 @@
 # exam_system/services/github_repo.py
 import json
 import base64
-import requests
 import streamlit as st
 from exam_system.config import settings
+from exam_system.services import blob_cache, repo_index, storage
+from exam_system.services.github_client import GitHubClient, GitHubError
 
-def _gh_headers():
-    h = {"Accept": "application/vnd.github+json"}
-    if settings.GH_TOKEN:
-        h["Authorization"] = f"Bearer {settings.GH_TOKEN}"
-    return h
+@st.cache_resource(show_spinner=False)
+def get_client() -> GitHubClient:
+    """整個 server process 共用一個 GitHub client（連線池、逾時、重試、延遲統計）"""
+    return GitHubClient(
+        settings.GH_OWNER, settings.GH_REPO, settings.GH_TOKEN or "", settings.GH_BRANCH,
+        timeout=settings.GH_TIMEOUT, max_retries=settings.GH_MAX_RETRIES,
+        pool_size=max(8, 2 * settings.DOWNLOAD_WORKERS),
+    )
 
 def _gh_api(path, method="GET", **kwargs):
-    url = f"https://api.github.com/repos/{settings.GH_OWNER}/{settings.GH_REPO}/{path}"
     try:
-        r = requests.request(method, url, headers=_gh_headers(), **kwargs)
-        if r.status_code >= 400:
-            snippet = r.text[:300].replace("\n", " ")
-            raise RuntimeError(f"GitHub API {method} {path} -> {r.status_code}: {snippet}")
-        return r.json()
+        return get_client().api(path, method, **kwargs)
     except Exception as e:
         st.error(f"GitHub 連線錯誤: {e}")
         st.stop()
@@ -30,54 +29,165 @@ def get_sha(path):
     except Exception:
         return None
 
-def put_file(path, content_bytes, message):
+def _gh_put_file(path, content_bytes, message):
     b64 = base64.b64encode(content_bytes).decode("ascii")
     payload = {"message": message, "content": b64, "branch": settings.GH_BRANCH}
     sha = get_sha(path)
     if sha:
         payload["sha"] = sha
-    return _gh_api(f"contents/{path}", method="PUT", json=payload)
+    result = _gh_api(f"contents/{path}", method="PUT", json=payload)
+    repo_index.invalidate()
+    return result
 
 @st.cache_data(ttl=300, show_spinner=False)
-def download_bytes(path):
-    """從 GitHub 下載檔案 Bytes，並快取 5 分鐘"""
+def _gh_download(path, sha=None):
+    """
+    從 GitHub 下載檔案 Bytes，並快取 5 分鐘。
+    過期後以 ETag 條件式請求確認，檔案未變時 GitHub 回 304，直接讀磁碟上的 blob 快取。
+    有 sha（索引中的 blob SHA）時以 SHA 定址：磁碟已有就不連線，否則以 Git Blobs API 串流下載並驗證；
+    sha 也是快取 key 的一部分，檔案更新後不會拿到舊內容。
+    """
     try:
-        j = _gh_api(f"contents/{path}", params={"ref": settings.GH_BRANCH})
-        if j.get("encoding") == "base64":
-            return base64.b64decode(j["content"])
-        # Fallback for large files if GH returns download_url
-        raw_url = f"https://raw.githubusercontent.com/{settings.GH_OWNER}/{settings.GH_REPO}/{settings.GH_BRANCH}/{path}"
-        return requests.get(raw_url, headers=_gh_headers()).content
+        size = get_index().size(path) if sha else None
+        data, _ = blob_cache.fetch(get_client(), path, settings.GH_BRANCH, sha, size)
+        return data
     except Exception as e:
         # 若下載失敗回傳 None，讓呼叫端決定是否報錯
         return None
 
+PUBLISH_RETRIES = 3  # 建 commit 期間分支被別人推進時，重新以最新 HEAD 組 tree 的次數
+
+def _gh_publish(files: dict, message: str, pointer_update=None):
+    """
+    以 Git Data API 一次 commit 多個檔案（含指標檔），最後才移動分支 ref：
+    blobs -> tree（以 HEAD 的 tree 為 base）-> commit -> PATCH ref（非 fast-forward 時重來）。
+    """
+    client = get_client()
+    # blob 與 HEAD 無關，重試時不必重傳
+    blobs = {
+        path: client.api("git/blobs", "POST", json={
+            "content": base64.b64encode(data).decode("ascii"), "encoding": "base64"})["sha"]
+        for path, data in files.items()
+    }
+    ref = f"heads/{settings.GH_BRANCH}"
+    for attempt in range(PUBLISH_RETRIES):
+        head = client.api(f"git/ref/{ref}")["object"]["sha"]
+        base_tree = client.api(f"git/commits/{head}")["tree"]["sha"]
+        tree = [{"path": p, "mode": "100644", "type": "blob", "sha": sha} for p, sha in blobs.items()]
+        if pointer_update is not None:
+            try:
+                raw, _ = blob_cache.fetch(client, settings.POINTER_FILE, head)
+                conf = json.loads(raw.decode("utf-8")) if raw else {}
+            except GitHubError as e:
+                if e.status != 404:
+                    raise
+                conf = {}
+            tree.append({"path": settings.POINTER_FILE, "mode": "100644", "type": "blob",
+                         "content": json.dumps(pointer_update(conf), ensure_ascii=False, indent=2)})
+        new_tree = client.api("git/trees", "POST", json={"base_tree": base_tree, "tree": tree})["sha"]
+        commit = client.api("git/commits", "POST", json={"message": message, "tree": new_tree, "parents": [head]})["sha"]
+        try:
+            client.api(f"git/refs/{ref}", "PATCH", json={"sha": commit, "force": False})
+            return commit
+        except GitHubError as e:
+            # 422：分支已前進（不是 fast-forward），以新 HEAD 重組
+            if e.status != 422 or attempt == PUBLISH_RETRIES - 1:
+                raise
+    return None
+
+def get_index() -> repo_index.RepoIndex:
+    """BANKS_DIR 底下所有檔案的 SHA / 大小（一次 Git Trees 呼叫，process 共用）"""
+    return repo_index.get(get_client(), settings.GH_BRANCH, settings.BANKS_DIR, settings.REPO_INDEX_TTL)
+
+
+class GitHubBackend(storage.StorageBackend):
+    """以 GitHub repo 為儲存（索引 / blob 快取 / 條件式請求）"""
+    name = "github"
+
+    def list_files(self, folder):
+        idx = get_index()
+        if not idx.truncated:
+            return idx.files(folder)
+        # 樹太大被截斷時才逐資料夾查 contents API
+        items = _gh_api(f"contents/{folder}", params={"ref": settings.GH_BRANCH})
+        return [it["path"] for it in items if it["type"] == "file" and it["name"].lower().endswith(repo_index.BANK_EXTS)]
+
+    def file_shas(self, paths):
+        return get_index().shas(paths)
+
+    def read(self, path, sha=None):
+        return _gh_download(path, sha)
+
+    def write(self, path, data, message):
+        return _gh_put_file(path, data, message)
+
+    def read_pointer(self):
+        data = _gh_download(settings.POINTER_FILE)
+        return json.loads(data.decode("utf-8")) if data else {}
+
+    def write_pointer(self, obj):
+        if not settings.GH_TOKEN:
+            st.warning("GH_TOKEN 未設定，無法寫入指標檔。")
+            return
+        _gh_put_file(
+            settings.POINTER_FILE,
+            json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"),
+            "update bank pointers"
+        )
+        _gh_download.clear() # 清除快取
+
+    def publish(self, files, message, pointer_update=None):
+        try:
+            return _gh_publish(files, message, pointer_update)
+        finally:
+            repo_index.invalidate()
+            _gh_download.clear()
+
+    def check_write_permission(self):
+        missing = []
+        if not settings.GH_OWNER: missing.append("REPO_OWNER")
+        if not settings.GH_REPO: missing.append("REPO_NAME")
+        if not settings.GH_TOKEN: missing.append("GH_TOKEN")
+        if missing:
+            return False, "缺少 Secrets: " + ", ".join(missing)
+        return True, ""
+
+
+@st.cache_resource(show_spinner=False)
+def get_backend() -> storage.StorageBackend:
+    """依 settings.STORAGE_BACKEND 選擇儲存後端（process 共用）"""
+    if settings.STORAGE_BACKEND == "local":
+        return storage.LocalBackend(settings.LOCAL_BANK_ROOT, settings.POINTER_FILE)
+    return GitHubBackend()
+
+def put_file(path, content_bytes, message):
+    return get_backend().write(path, content_bytes, message)
+
+def download_bytes(path, sha=None):
+    """讀取檔案 Bytes（失敗回傳 None）；sha 為 file_shas 取得的 blob SHA，可省略"""
+    return get_backend().read(path, sha)
+
 def list_files(folder_path):
     try:
-        items = _gh_api(f"contents/{folder_path}", params={"ref": settings.GH_BRANCH})
-        return [it["path"] for it in items if it["type"] == "file" and it["name"].lower().endswith(".xlsx")]
+        return get_backend().list_files(folder_path)
     except Exception:
         return []
 
+def file_shas(paths) -> list:
+    """各檔的 blob SHA（不存在為 None）；用來判斷題庫是否有更新，不需下載"""
+    try:
+        return get_backend().file_shas(paths)
+    except Exception:
+        return [None] * len(paths)
+
 def read_pointer():
     try:
-        data = download_bytes(settings.POINTER_FILE)
-        if data:
-            return json.loads(data.decode("utf-8"))
-        return {}
+        return get_backend().read_pointer()
     except Exception:
         return {}
 
 def write_pointer(obj: dict):
-    if not settings.GH_TOKEN:
-        st.warning("GH_TOKEN 未設定，無法寫入指標檔。")
-        return
-    put_file(
-        settings.POINTER_FILE,
-        json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"),
-        "update bank pointers"
-    )
-    download_bytes.clear() # 清除快取
+    get_backend().write_pointer(obj)
 
 def get_current_bank_path(bank_type: str | None = None):
     conf = read_pointer()
@@ -106,11 +216,15 @@ def set_current_bank_path(bank_type: str, path: str):
     except Exception as e:
         st.warning(f"更新 {settings.POINTER_FILE} 失敗：{e}")
 
+def publish_bank(bank_type: str, path: str, content_bytes: bytes, message: str, set_current: bool = True):
+    """上傳題庫檔並（選擇性）切換為預設，兩者在同一個 commit 內完成"""
+    def point_to_new(conf):
+        if not isinstance(conf.get("current"), dict):
+            conf["current"] = {}
+        conf["current"][bank_type] = path
+        return conf
+
+    get_backend().publish({path: content_bytes}, message, point_to_new if set_current else None)
+
 def check_write_permission():
-    missing = []
-    if not settings.GH_OWNER: missing.append("REPO_OWNER")
-    if not settings.GH_REPO: missing.append("REPO_NAME")
-    if not settings.GH_TOKEN: missing.append("GH_TOKEN")
-    if missing:
-        return False, "缺少 Secrets: " + ", ".join(missing)
-    return True, ""
+    return get_backend().check_write_permission()
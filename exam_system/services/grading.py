@@ -0,0 +1,108 @@
+# exam_system/services/grading.py
+"""
+向量化判卷：
+正解與作答都以 uint8 位元遮罩存成 NumPy 陣列（bit i = 第 i 個顯示選項），
+整份試卷一次比對、一次計分，不再逐題比較 Python set。
+
+複選題（MC）計分方式：
+- all_or_nothing：完全相同才得分
+- partial：每個選項各自判斷（該選 / 不該選），依判斷正確的選項比例給分
+- negative：每選中一個正解 +1/正解數，每選錯一個 -1/正解數，最低 -1（倒扣）
+單選題一律完全相同才得分；未作答一律 0 分。
+"""
+from dataclasses import dataclass
+import numpy as np
+from exam_system.services.paper_engine import MASK_LETTERS
+
+POLICIES = {
+    "all_or_nothing": "全對才給分",
+    "partial": "依選項部分給分",
+    "negative": "答錯倒扣",
+}
+DEFAULT_POLICY = "all_or_nothing"
+
+POPCOUNT = np.array([bin(m).count("1") for m in range(256)], dtype=np.int8)
+
+RESULT_CORRECT = "✅"
+RESULT_PARTIAL = "🔶"
+RESULT_WRONG = "❌"
+
+
+def labels_to_bits(labels) -> int:
+    """{"A", "C"} -> 0b101"""
+    bits = 0
+    for lab in labels or ():
+        i = ord(str(lab).strip().upper()[:1] or "?") - ord("A")
+        if 0 <= i < 8:
+            bits |= 1 << i
+    return bits
+
+
+def picked_bits(answers: dict, keys) -> np.ndarray:
+    """依 keys 的順序把 answers（key -> 選項字母集合）轉成位元遮罩陣列；缺的視為未作答"""
+    return np.fromiter((labels_to_bits(answers.get(k)) for k in keys), dtype=np.uint8)
+
+
+def bits_to_letters(bits: np.ndarray) -> np.ndarray:
+    return MASK_LETTERS[np.asarray(bits, dtype=np.uint8)]
+
+
+def grade(gold: np.ndarray, picked: np.ndarray, n_options: np.ndarray, is_mc: np.ndarray,
+          policy: str = DEFAULT_POLICY) -> np.ndarray:
+    """回傳每題得分（滿分 1）；gold / picked 為 uint8 位元遮罩"""
+    gold = np.asarray(gold, dtype=np.uint8)
+    picked = np.asarray(picked, dtype=np.uint8)
+    exact = (gold == picked).astype(float)
+    if policy == "all_or_nothing":
+        return exact
+
+    n_options = np.maximum(np.asarray(n_options), 1)
+    if policy == "partial":
+        mc_score = 1 - POPCOUNT[gold ^ picked] / n_options
+    elif policy == "negative":
+        hits = POPCOUNT[gold & picked]
+        misses = POPCOUNT[picked & ~gold]
+        mc_score = np.clip((hits - misses) / np.maximum(POPCOUNT[gold], 1), -1, 1)
+    else:
+        raise ValueError(f"未知的計分方式：{policy}")
+
+    score = np.where(np.asarray(is_mc, dtype=bool), mc_score, exact)
+    return np.where((picked == 0) & (gold != 0), 0.0, score)
+
+
+def result_marks(score: np.ndarray) -> np.ndarray:
+    return np.where(score >= 1, RESULT_CORRECT, np.where(score > 0, RESULT_PARTIAL, RESULT_WRONG))
+
+
+@dataclass
+class GradedPaper:
+    """整份試卷的判卷結果（各欄與試卷題目順序相同）"""
+    picked: np.ndarray          # 作答位元遮罩
+    score: np.ndarray           # 每題得分
+    your_letters: np.ndarray    # 作答字母，例如 "AC"
+    gold_letters: np.ndarray    # 正解字母
+    marks: np.ndarray           # RESULT_CORRECT / RESULT_PARTIAL / RESULT_WRONG
+
+    @property
+    def total(self) -> float:
+        return float(self.score.sum())
+
+
+def grade_paper(gold: np.ndarray, answers: dict, keys, n_options: np.ndarray, is_mc: np.ndarray,
+                policy: str = DEFAULT_POLICY) -> GradedPaper:
+    """
+    整份試卷判卷（不依賴 streamlit）：answers 為 key -> 選項字母集合，keys 為各題在 answers 中的 key
+    （exam_system 用題目位置，單檔版用題目 ID）；gold 為正解位元遮罩。
+    """
+    gold = np.asarray(gold, dtype=np.uint8)
+    picked = picked_bits(answers, keys)
+    score = grade(gold, picked, n_options, is_mc, policy)
+    return GradedPaper(picked, score, bits_to_letters(picked), bits_to_letters(gold), result_marks(score))
+
+
+def grade_questions(questions: list[dict], answers: dict, keys, policy: str = DEFAULT_POLICY) -> GradedPaper:
+    """以題目 dict（Choices / Answer / Type）組成的試卷判卷"""
+    gold = np.array([labels_to_bits(q["Answer"]) for q in questions], dtype=np.uint8)
+    n_options = np.array([len(q["Choices"]) for q in questions])
+    is_mc = np.array([q["Type"] == "MC" for q in questions])
+    return grade_paper(gold, answers, keys, n_options, is_mc, policy)
@@ -0,0 +1,117 @@
+# exam_system/services/llm_cache.py
+"""
+AI 回應的磁碟快取（SQLite）：
+- 以 (模型名稱, prompt 雜湊) 為 key，重新部署 / 重啟後仍有效，不必再付一次 Gemini 的費用
+- WAL 模式 + busy_timeout，多個 server worker（不同 process）可同時讀寫同一個檔案
+- 超過筆數或總大小上限時，依最後使用時間淘汰最舊的（LRU）
+- 命中 / 未命中次數記在資料庫內（跨 process 累計），供管理介面檢視
+不依賴 streamlit；失敗的回應不應寫入（由呼叫端判斷）。
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    model     TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    text      TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (model, key)
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+class ResponseCache:
+    def __init__(self, path: str, max_entries: int = 5000, max_bytes: int = 50 << 20, timeout: float = 5.0):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()  # sqlite3 連線不可跨 thread 共用，每個 thread 各開一條
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=self.timeout)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = c
+        return c
+
+    def _count(self, c, name: str):
+        c.execute("INSERT INTO counters(name, value) VALUES (?, 1) "
+                  "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, model: str, key: str) -> str | None:
+        c = self._conn()
+        row = c.execute("SELECT text FROM responses WHERE model = ? AND key = ?", (model, key)).fetchone()
+        with c:
+            if row is None:
+                self._count(c, "misses")
+                return None
+            c.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE model = ? AND key = ?",
+                      (time.time(), model, key))
+            self._count(c, "hits")
+        return row[0]
+
+    def put(self, model: str, key: str, text: str):
+        now = time.time()
+        c = self._conn()
+        with c:
+            c.execute("INSERT INTO responses(model, key, text, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?) "
+                      "ON CONFLICT(model, key) DO UPDATE SET text = excluded.text, size = excluded.size, last_used = excluded.last_used",
+                      (model, key, text, len(text.encode("utf-8")), now, now))
+            self._evict(c)
+
+    def stream(self, model: str, key: str, chunks):
+        """轉送串流片段，完整結束後才把全文寫入快取；中途例外直接往外拋，不完整的內容不寫入"""
+        parts = []
+        for part in chunks:
+            parts.append(part)
+            yield part
+        text = "".join(parts).strip()
+        if text:
+            self.put(model, key, text)
+
+    def _evict(self, c):
+        n, total = c.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if n <= self.max_entries and total <= self.max_bytes:
+            return
+        # 由最舊往新累計，刪到兩個上限都滿足為止
+        drop, freed = 0, 0
+        for (size,) in c.execute("SELECT size FROM responses ORDER BY last_used"):
+            if n - drop <= self.max_entries and total - freed <= self.max_bytes:
+                break
+            drop += 1
+            freed += size
+        c.execute("DELETE FROM responses WHERE rowid IN "
+                  "(SELECT rowid FROM responses ORDER BY last_used LIMIT ?)", (drop,))
+        c.execute("INSERT INTO counters(name, value) VALUES ('evictions', ?) "
+                  "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (drop,))
+
+    def stats(self) -> dict:
+        c = self._conn()
+        counters = dict(c.execute("SELECT name, value FROM counters").fetchall())
+        n, total = c.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "entries": n, "bytes": total, "hits": hits, "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+    def clear(self):
+        with self._conn() as c:
+            c.execute("DELETE FROM responses")
+            c.execute("DELETE FROM counters")
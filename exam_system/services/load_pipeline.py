@@ -0,0 +1,38 @@
+# exam_system/services/load_pipeline.py
+"""
+題庫「下載 → 解析」管線：
+下載在有上限的 thread pool 中並行，每個檔案一拿到 bytes 就交給解析 worker，
+不必等所有下載完成；結果依完成順序逐一回報，失敗的檔案也會即時回報。
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def fetch_and_parse(paths: list[str], fetch, parse, max_downloads: int = 4, max_parsers: int = 1):
+    """
+    - fetch(path) -> bytes | None
+    - parse(data, path) -> DataFrame | None
+    依完成順序 yield (path, df, error)；成功時 error 為 None，失敗時 df 為 None。
+    """
+    if not paths:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_downloads, len(paths))), thread_name_prefix="bank-fetch") as fetcher, \
+         ThreadPoolExecutor(max_workers=max(1, max_parsers), thread_name_prefix="bank-parse") as parser:
+        pending = {fetcher.submit(fetch, p): ("fetch", p) for p in paths}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, p = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    yield p, None, f"{'下載' if stage == 'fetch' else '解析'}失敗：{e}"
+                    continue
+                if stage == "fetch":
+                    if result is None:
+                        yield p, None, "下載失敗"
+                    else:
+                        pending[parser.submit(parse, result, p)] = ("parse", p)
+                elif result is None or result.empty:
+                    yield p, None, "內容為空或格式不符"
+                else:
+                    yield p, result, None
@@ -0,0 +1,109 @@
+# exam_system/services/option_canon.py
+"""
+選項的「原始順序」表示法：
+試卷會打亂選項並重新編號，同一題在每份試卷上的代號都不同。
+AI 提示詞與快取 key 一律以題庫原順序（非空選項依欄位順序重新編為 A、B、C…）組成，
+同一題不論怎麼打亂都共用同一份生成結果；顯示時再把回應中的代號換回本卷的代號。
+題幹、選項或解說本身含英文字母代號（組合選項「AC」、題幹內的「A.…B.…」敘述、「A型保單」等）時，
+這些字母不是選項代號、換了會改錯內容，因此不做原順序轉換，直接以本卷的選項與代號組成（key 隨本卷而異）。
+不依賴 streamlit，exam_system 與 app.py 共用。
+"""
+import re
+
+LETTERS = "ABCDEFGH"
+# 單獨出現的選項代號或代號串（A、(B)、AC），前後不接英文字母
+_LETTER_RUN = re.compile(r"(?<![A-Za-z])([A-H]{1,8})(?![A-Za-z])")
+# 回應中只有「引用選項」的寫法才換代號，CD 定存、A股、B型 之類的字母不動：
+# 前面是括號、選項 / 答案 / 正解（為）/ 選、不是，或是「A 與」「A、」這類並列；
+# 後面是 . 、 ： ) 等選項標記、皆 / 正確 / 錯誤 / 選項，或並列另一個代號
+_REF_BEFORE = re.compile(
+    r"(?:[(（\[［「『]|(?:選項|答案|正解|正確答案|正確選項|選|答)\s{0,2}(?:應為|應選|是|為)?\s{0,2}[：:]?"
+    r"|不是|而非|並非|(?<![A-Za-z])[A-H]{1,8}\s{0,2}[與和或及跟、,，/])\s{0,2}$"
+)
+_REF_AFTER = re.compile(
+    r"\s{0,2}(?:[)）\]］」』.．、:：]|皆|都|均|正確|錯誤|有誤|對|錯|選項|項"
+    r"|[與和或及跟,，/]\s{0,2}[A-H]{1,8}(?![A-Za-z]))"
+)
+# 判斷是否為引用時看的前後文長度；串流時至少保留這麼多字才輸出
+_REF_CONTEXT = 16
+
+
+def has_lettered_items(q: dict) -> bool:
+    """題幹、選項文字或解說是否含單獨的英文字母代號（與選項代號無法區分）"""
+    texts = [q.get("Question"), q.get("Explanation"), *(txt for _, txt in q["Choices"])]
+    return any(_LETTER_RUN.search(t) for t in texts if isinstance(t, str))
+
+
+def canonical(q: dict) -> tuple[list, str, dict]:
+    """
+    回傳 (原順序選項 [(代號, 文字)], 原順序正解代號字串, 原代號 -> 本卷代號)。
+    q["OptionOrder"] 為每個顯示位置對應的原始選項欄（paper_engine.materialize 提供）；
+    沒有時視為未打亂。含字母代號的題目（has_lettered_items）直接回傳本卷的選項，對應為恆等。
+    """
+    choices = q["Choices"]
+    if has_lettered_items(q):
+        answer = "".join(sorted(a for a in q.get("Answer", ()) if a in {lab for lab, _ in choices}))
+        return list(choices), answer, {lab: lab for lab, _ in choices}
+    order = q.get("OptionOrder") or list(range(len(choices)))
+    ranked = sorted(range(len(choices)), key=lambda p: order[p])
+    canon = [(LETTERS[r], choices[p][1]) for r, p in enumerate(ranked)]
+    to_display = {LETTERS[r]: choices[p][0] for r, p in enumerate(ranked)}
+    to_canon = {v: k for k, v in to_display.items()}
+    answer = "".join(sorted(to_canon[a] for a in q.get("Answer", ()) if a in to_canon))
+    return canon, answer, to_display
+
+
+def _is_reference(text: str, start: int, end: int) -> bool:
+    return bool(_REF_BEFORE.search(text[max(0, start - _REF_CONTEXT):start])
+                or _REF_AFTER.match(text, end, end + _REF_CONTEXT))
+
+
+def _swap_letters(text: str, mapping: dict, before: str = "", after: str = "") -> str:
+    """只換 text 中引用選項的代號；before / after 為前後文（串流時已輸出與尚未輸出的部分），只用來判斷"""
+    full = before + text + after
+    lo, hi = len(before), len(before) + len(text)
+
+    def swap(m):
+        run = m.group(1)
+        if m.start() < lo or m.end() > hi or not _is_reference(full, m.start(), m.end()):
+            return run
+        if len(set(run)) != len(run) or any(c not in mapping for c in run):
+            return run  # 不是選項代號（例如重複字母或超出本題選項數）
+        return "".join(sorted(mapping[c] for c in run))
+
+    # 代號串換完長度不變，可直接依位置切回 text 的部分
+    return _LETTER_RUN.sub(swap, full)[lo:hi]
+
+
+def _is_identity(mapping: dict) -> bool:
+    return all(k == v for k, v in mapping.items())
+
+
+def to_display(text: str, q: dict) -> str:
+    """把以原順序代號寫成的回應改成本卷的代號（代號串如 AC 會換完後重新排序）"""
+    _, _, mapping = canonical(q)
+    return text if _is_identity(mapping) else _swap_letters(text, mapping)
+
+
+def stream_to_display(chunks, q: dict):
+    """
+    串流版 to_display：結尾保留 _REF_CONTEXT 個字（不切開英文字母串），等後文到了才判斷是否為代號；
+    已輸出的結尾也留著當前文，結果與整段呼叫 to_display 相同
+    """
+    _, _, mapping = canonical(q)
+    if _is_identity(mapping):
+        yield from chunks
+        return
+    buf, emitted = "", ""
+    for chunk in chunks:
+        buf += chunk
+        cut = len(buf) - _REF_CONTEXT
+        while cut > 0 and buf[cut - 1].isascii() and buf[cut - 1].isalpha() \
+                and buf[cut].isascii() and buf[cut].isalpha():
+            cut -= 1
+        if cut > 0:
+            yield _swap_letters(buf[:cut], mapping, emitted, buf[cut:])
+            emitted = (emitted + buf[:cut])[-_REF_CONTEXT:]
+            buf = buf[cut:]
+    if buf:
+        yield _swap_letters(buf, mapping, emitted)
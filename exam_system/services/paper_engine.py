@@ -0,0 +1,185 @@
+# exam_system/services/paper_engine.py
+"""
+出題引擎（NumPy 版）：
+題庫先轉成陣列（選項文字矩陣、非空遮罩、答案位元遮罩），之後每次出題：
+- 一次 RNG 呼叫抽出所有題目列
+- 一次批次排列產生所有題目的選項順序
+- 用查表把原答案位元遮罩換成新選項字母
+不再 df.sample + iterrows，500 題模擬考也只需數毫秒。
+"""
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from exam_system.services import blueprint
+
+MAX_OPTIONS = 8
+LETTERS = np.array([chr(ord("A") + i) for i in range(MAX_OPTIONS)])
+# 位元遮罩 -> 答案字母字串，例如 0b101 -> "AC"
+MASK_LETTERS = np.array(["".join(LETTERS[[b for b in range(MAX_OPTIONS) if m >> b & 1]]) for m in range(1 << MAX_OPTIONS)], dtype=object)
+
+
+class QuestionStore:
+    """題庫的陣列版本（每份題庫只建一次，唯讀共用）"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        option_cols = [c for c in df.columns if str(c).startswith("Option")][:MAX_OPTIONS]
+        opts = df[option_cols].fillna("").astype(str).apply(lambda s: s.str.strip())
+        self.options = opts.to_numpy(dtype=object)            # (n, k) 原始選項文字
+        self.has_option = self.options != ""                   # (n, k) 非空選項
+        n, k = self.options.shape
+        self.n_options = k
+
+        answers = df["Answer"].fillna("").astype(str).str.upper() if "Answer" in df.columns else pd.Series("", index=df.index)
+        bits = np.zeros(n, dtype=np.uint8)
+        for i in range(k):
+            bits |= answers.str.contains(LETTERS[i], regex=False).to_numpy(dtype=np.uint8) << i
+        # 指向空選項的答案字母不算數（與舊版 orig_to_new 過濾一致）
+        self.answer_bits = bits & self.option_bits(np.arange(n))
+
+        types = df["Type"] if "Type" in df.columns else pd.Series("SC", index=df.index)
+        self.types = types.astype(str).str.upper().to_numpy(dtype=object)
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.options)
+
+    def option_bits(self, rows: np.ndarray) -> np.ndarray:
+        return (self.has_option[rows] << np.arange(self.n_options)).sum(axis=1).astype(np.uint8)
+
+    def column(self, name: str, rows: np.ndarray, default="") -> np.ndarray:
+        if name not in self.df.columns:
+            return np.full(len(rows), default, dtype=object)
+        if name not in self._columns:
+            self._columns[name] = self.df[name].to_numpy(dtype=object)
+        return self._columns[name][rows]
+
+
+def draw(store: QuestionStore, candidates: np.ndarray, n: int, rng: np.random.Generator,
+         random_order: bool = True, shuffle_opts: bool = True):
+    """
+    抽題並產生選項排列。
+    回傳 (rows, perm, answer_bits)：
+    - rows: 題目在題庫中的列索引
+    - perm[j, p]: 第 j 題顯示在第 p 個位置的原始選項欄（非空選項排前面）
+    - answer_bits: 依新選項位置重新編碼的正解位元遮罩
+    """
+    candidates = np.asarray(candidates)
+    n = min(int(n), len(candidates))
+    if n <= 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, np.empty((0, store.n_options), dtype=np.int8), np.empty(0, dtype=np.uint8)
+    rows = rng.choice(candidates, size=n, replace=False) if random_order else candidates[:n]
+    return (rows, *arrange_options(store, rows, rng, shuffle_opts))
+
+
+def arrange_options(store: QuestionStore, rows: np.ndarray, rng: np.random.Generator, shuffle_opts: bool = True):
+    """一次產生所有題目的選項排列，並把正解位元遮罩換到新位置；回傳 (perm, answer_bits)"""
+    n, k = len(rows), store.n_options
+    has = store.has_option[rows]
+    # 空選項的排序鍵設成 k 以上，永遠排在最後；不打亂時依原順序
+    keys = rng.random((n, k)) if shuffle_opts else np.broadcast_to(np.arange(k, dtype=float), (n, k))
+    keys = np.where(has, keys, keys + k)
+    perm = np.argsort(keys, axis=1, kind="stable").astype(np.int8)
+
+    gold = (store.answer_bits[rows, None] >> np.arange(k)) & 1
+    new_gold = np.take_along_axis(gold, perm.astype(np.intp), axis=1)
+    answer_bits = (new_gold << np.arange(k)).sum(axis=1).astype(np.uint8)
+    return perm, answer_bits
+
+
+def materialize(store: QuestionStore, rows: np.ndarray, perm: np.ndarray, answer_bits: np.ndarray,
+                extra_cols=("Explanation", "Image", "Tag")) -> list[dict]:
+    """把陣列結果組成頁面使用的題目 dict（Choices 為 [(新標籤, 文字)]、Answer 為新標籤集合、OptionOrder 為原選項欄）"""
+    rows = np.asarray(rows, dtype=np.intp)
+    texts = np.take_along_axis(store.options[rows], perm.astype(np.intp), axis=1)
+    n_opts = store.has_option[rows].sum(axis=1)
+    ids = store.column("ID", rows)
+    questions = store.column("Question", rows)
+    extras = {c: store.column(c, rows) for c in extra_cols}
+    answers = MASK_LETTERS[answer_bits]
+
+    paper = []
+    for j in range(len(rows)):
+        m = n_opts[j]
+        q = {
+            "ID": ids[j],
+            "Question": questions[j],
+            "Type": store.types[rows[j]],
+            "Choices": list(zip(LETTERS[:m].tolist(), texts[j, :m].tolist())),
+            "Answer": set(answers[j]),
+            "OptionOrder": perm[j, :m].tolist(),  # 各顯示位置的原始選項欄（AI 提示詞以原順序組成）
+        }
+        for c in extra_cols:
+            q[c] = extras[c][j]
+        paper.append(q)
+    return paper
+
+
+@dataclass
+class Paper:
+    """
+    精簡試卷：session 只存題庫 key、題目列索引、每題選項排列（int8）、正解位元與 RNG seed，
+    題目 dict 在渲染時才從共用題庫組出來。
+    行為與 list[dict] 相同（len / 索引 / 迭代），既有頁面程式不需改寫。
+    """
+    bank_key: tuple
+    rows: np.ndarray
+    perm: np.ndarray
+    answer_bits: np.ndarray
+    seed: int
+
+    def __len__(self):
+        return len(self.rows)
+
+    def store(self) -> QuestionStore:
+        from exam_system.services import bank_registry  # 避免循環 import
+        bank = bank_registry.get(self.bank_key)
+        if bank is None:
+            raise LookupError("題庫已更新或已自記憶體釋放，請重新開始。")
+        return bank.question_store
+
+    def questions(self, start: int = 0, stop: int | None = None) -> list[dict]:
+        sl = slice(start, stop)
+        return materialize(self.store(), self.rows[sl], self.perm[sl], self.answer_bits[sl])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.questions(i.start or 0, i.stop)
+        i = range(len(self))[i]
+        return self.questions(i, i + 1)[0]
+
+    def __iter__(self):
+        return iter(self.questions())
+
+
+def new_paper(bank_key: tuple, store: QuestionStore, candidates: np.ndarray, n: int,
+              random_order: bool = True, shuffle_opts: bool = True, seed: int | None = None) -> Paper:
+    """抽一份精簡試卷；同樣的 seed 與候選列會得到同一份考卷"""
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy)
+    rows, perm, answer_bits = draw(store, candidates, n, np.random.default_rng(seed), random_order, shuffle_opts)
+    return Paper(bank_key, rows.astype(np.int32), perm, answer_bits, seed)
+
+
+def paper_from_rows(bank_key: tuple, store: QuestionStore, pick, random_order: bool = True,
+                    shuffle_opts: bool = True, seed: int | None = None) -> Paper:
+    """以自訂抽題函式 pick(rng) -> rows 產生試卷（藍圖配題、弱點加權等共用）"""
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy)
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(pick(rng))
+    if random_order:
+        rows = rng.permutation(rows)
+    perm, answer_bits = arrange_options(store, rows, rng, shuffle_opts)
+    return Paper(bank_key, rows.astype(np.int32), perm, answer_bits, seed)
+
+
+def new_blueprint_paper(bank_key: tuple, store: QuestionStore, candidates: np.ndarray, strata: np.ndarray,
+                        quotas: np.ndarray, random_order: bool = True, shuffle_opts: bool = True,
+                        seed: int | None = None) -> Paper:
+    """依考試藍圖分層抽題（strata / quotas 由 blueprint.plan 產生）；不打亂題目時依藍圖章節順序排列"""
+    return paper_from_rows(
+        bank_key, store, lambda rng: blueprint.sample(candidates, strata, quotas, rng),
+        random_order, shuffle_opts, seed,
+    )
@@ -0,0 +1,80 @@
+# exam_system/services/repo_index.py
+"""
+題庫資料夾索引：
+以一次 recursive Git Trees API 呼叫取得 BANKS_DIR 底下所有檔案的 blob SHA 與大小，
+process 內共用並快取（到期後以 ETag 重新驗證，沒變時 304），管理者寫入後明確 invalidate。
+列檔、副檔名過濾、變更偵測（SHA 比對）都直接查索引，不再逐類型呼叫 contents API。
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+BANK_EXTS = (".xlsx", ".xls")  # .xls 需要 xlrd
+
+
+@dataclass
+class RepoIndex:
+    tree_sha: str = ""
+    entries: dict = field(default_factory=dict)   # path -> (blob sha, size)
+    truncated: bool = False                        # 樹太大被 GitHub 截斷時，呼叫端應改用 contents API
+    etag: str = ""
+    fetched_at: float = 0.0
+
+    def files(self, folder: str, exts=BANK_EXTS) -> list[str]:
+        """folder 底下（不含子資料夾）符合副檔名的檔案，依路徑排序"""
+        prefix = folder.rstrip("/") + "/"
+        return sorted(
+            p for p in self.entries
+            if p.startswith(prefix) and "/" not in p[len(prefix):] and p.lower().endswith(tuple(exts))
+        )
+
+    def sha(self, path: str) -> str | None:
+        e = self.entries.get(path)
+        return e[0] if e else None
+
+    def size(self, path: str) -> int | None:
+        e = self.entries.get(path)
+        return e[1] if e else None
+
+    def shas(self, paths) -> list:
+        return [self.sha(p) for p in paths]
+
+
+_indexes: dict[tuple, RepoIndex] = {}
+_lock = threading.Lock()
+
+
+def _fetch(client, ref: str, prefix: str, old: RepoIndex | None) -> RepoIndex:
+    headers = {"If-None-Match": old.etag} if old is not None and old.etag else {}
+    r = client.api_response(f"git/trees/{ref}", params={"recursive": "1"}, headers=headers)
+    if r.status_code == 304:
+        old.fetched_at = time.time()
+        return old
+    j = r.json()
+    root = prefix.rstrip("/") + "/"
+    entries = {
+        it["path"]: (it["sha"], int(it.get("size") or 0))
+        for it in j.get("tree", [])
+        if it.get("type") == "blob" and it["path"].startswith(root)
+    }
+    return RepoIndex(j.get("sha", ""), entries, bool(j.get("truncated")), r.headers.get("ETag", ""), time.time())
+
+
+def get(client, ref: str, prefix: str, ttl: float = 300) -> RepoIndex:
+    """取得索引；超過 ttl 秒才向 GitHub 重新驗證"""
+    key = (client.owner, client.repo, ref, prefix)
+    with _lock:
+        idx = _indexes.get(key)
+        if idx is not None and time.time() - idx.fetched_at < ttl:
+            return idx
+        # 在鎖內抓取：同時多個 session 到期時只打一次 API
+        idx = _fetch(client, ref, prefix, idx)
+        _indexes[key] = idx
+        return idx
+
+
+def invalidate():
+    """管理者上傳 / 切換後呼叫；下次 get 會重新抓取（仍會帶 ETag，沒變就是 304）"""
+    with _lock:
+        for idx in _indexes.values():
+            idx.fetched_at = 0.0
@@ -0,0 +1,143 @@
+# exam_system/services/storage.py
+"""
+題庫儲存後端：
+github_repo 對外的列檔 / 讀檔 / 寫檔 / 指標檔操作都轉給這裡的後端實作，
+以 settings.STORAGE_BACKEND 選擇：
+- "github"（預設）：GitHubBackend（github_repo 內，走 GitHub API）
+- "local"：LocalBackend，直接讀寫本機目錄（自架部署零網路延遲，離線測試也可用）
+路徑一律是相對於儲存根目錄的 POSIX 路徑（例如 bank/人身/a.xlsx），兩種後端可互換。
+"""
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from exam_system.services.bank_cache import blob_sha
+from exam_system.services.repo_index import BANK_EXTS
+
+
+class StorageBackend:
+    """後端介面；name 用於顯示"""
+    name = ""
+
+    def list_files(self, folder: str) -> list[str]:
+        raise NotImplementedError
+
+    def file_shas(self, paths) -> list:
+        """各檔的 git blob SHA（不存在為 None），用於變更偵測"""
+        raise NotImplementedError
+
+    def read(self, path: str, sha: str | None = None) -> bytes | None:
+        raise NotImplementedError
+
+    def write(self, path: str, data: bytes, message: str):
+        raise NotImplementedError
+
+    def read_pointer(self) -> dict:
+        raise NotImplementedError
+
+    def write_pointer(self, obj: dict):
+        raise NotImplementedError
+
+    def publish(self, files: dict, message: str, pointer_update=None):
+        """
+        一次發布多個檔案並（選擇性）更新指標檔：pointer_update(目前指標 dict) -> 新指標 dict。
+        讀者不會看到「檔案已在、指標還沒切換」或反過來的中間狀態。
+        """
+        raise NotImplementedError
+
+    def check_write_permission(self) -> tuple[bool, str]:
+        return True, ""
+
+
+class LocalBackend(StorageBackend):
+    """
+    本機目錄後端：SHA 以 mmap 直接雜湊（不複製成 bytes），並依 (mtime, size) 記憶，檔案沒動就不重算。
+    read() 的呼叫端（Excel 解析、送進解析 process、JSON）都需要 bytes，直接讀檔即可。
+    """
+    name = "local"
+
+    def __init__(self, root: str, pointer_file: str):
+        self.root = Path(root).resolve()
+        self.pointer_file = pointer_file
+        self._shas = {}
+        self._lock = threading.Lock()
+
+    def _abs(self, path: str) -> Path:
+        p = (self.root / path).resolve()
+        if self.root not in p.parents and p != self.root:
+            raise ValueError(f"路徑超出儲存根目錄：{path}")
+        return p
+
+    def list_files(self, folder: str) -> list[str]:
+        try:
+            entries = list(os.scandir(self._abs(folder)))
+        except OSError:
+            return []
+        prefix = folder.rstrip("/")
+        return sorted(
+            f"{prefix}/{e.name}" for e in entries
+            if e.is_file() and e.name.lower().endswith(BANK_EXTS)
+        )
+
+    def _file_sha(self, p: Path) -> str:
+        with open(p, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return blob_sha(b"")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return blob_sha(mm)
+
+    def file_shas(self, paths) -> list:
+        out = []
+        for path in paths:
+            try:
+                p = self._abs(path)
+                st = p.stat()
+            except (OSError, ValueError):
+                out.append(None)
+                continue
+            stamp = (st.st_mtime_ns, st.st_size)
+            with self._lock:
+                hit = self._shas.get(path)
+            if hit is None or hit[0] != stamp:
+                hit = (stamp, self._file_sha(p))
+                with self._lock:
+                    self._shas[path] = hit
+            out.append(hit[1])
+        return out
+
+    def read(self, path: str, sha: str | None = None) -> bytes | None:
+        try:
+            return self._abs(path).read_bytes()
+        except (OSError, ValueError):
+            return None
+
+    def write(self, path: str, data: bytes, message: str = ""):
+        p = self._abs(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, p)
+
+    def read_pointer(self) -> dict:
+        data = self.read(self.pointer_file)
+        try:
+            return json.loads(data.decode("utf-8")) if data else {}
+        except ValueError:
+            return {}
+
+    def write_pointer(self, obj: dict):
+        self.write(self.pointer_file, json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def publish(self, files: dict, message: str, pointer_update=None):
+        # 各檔以 os.replace 原子寫入，指標檔最後才換：指標永遠指向已存在的檔案
+        with self._lock:
+            for path, data in files.items():
+                self.write(path, data, message)
+            if pointer_update is not None:
+                self.write_pointer(pointer_update(self.read_pointer()))
+
+    def check_write_permission(self) -> tuple[bool, str]:
+        if not os.access(self.root, os.W_OK):
+            return False, f"本機題庫目錄不可寫入：{self.root}"
+        return True, ""
@@ -0,0 +1,49 @@
+# exam_system/services/tag_index.py
+"""
+標籤反向索引：每份題庫只建一次，標籤 -> 已排序的列索引（numpy array）。
+側欄的標籤清單與任意標籤組合的篩選結果都由集合聯集取得，不必每次重跑都掃整欄。
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# 記住最近幾組標籤組合的篩選結果
+SELECT_CACHE_SIZE = 64
+
+
+class TagIndex:
+    def __init__(self, tags: pd.Series):
+        self.n_rows = len(tags)
+        s = tags.reset_index(drop=True).dropna().astype(str)
+        exploded = s.str.split(";").explode().str.strip()
+        exploded = exploded[exploded.ne("")]
+        pos = exploded.index.to_numpy()
+        # 同一列重複寫同一個標籤時以 np.unique 去重（也順便排序）
+        self.rows = {
+            tag: np.unique(pos[ix])
+            for tag, ix in exploded.groupby(exploded.to_numpy(), sort=False).indices.items()
+        }
+        self.tags = sorted(self.rows)
+        self._memo: "OrderedDict[frozenset, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def select(self, picked) -> np.ndarray:
+        """回傳含任一選定標籤的列索引（已排序）；未選任何標籤時回傳全部列"""
+        key = frozenset(picked or ())
+        with self._lock:
+            hit = self._memo.get(key)
+            if hit is not None:
+                self._memo.move_to_end(key)
+                return hit
+        if not key:
+            out = np.arange(self.n_rows)
+        else:
+            parts = [self.rows[t] for t in key if t in self.rows]
+            out = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+        out.flags.writeable = False  # 結果在 session 間共用，禁止就地修改
+        with self._lock:
+            self._memo[key] = out
+            while len(self._memo) > SELECT_CACHE_SIZE:
+                self._memo.popitem(last=False)
+        return out
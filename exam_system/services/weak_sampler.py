@@ -0,0 +1,143 @@
+# exam_system/services/weak_sampler.py
+"""
+弱點加強抽題：
+依學員過去的作答結果，提高答錯題目與答錯標籤被抽中的機率。
+
+每題權重 = 1（基本）+ 題目加權 + 所屬標籤加權 / 標籤題數，抽題時以三個成分組合：
+- 基本：在候選題中均勻抽
+- 題目：在答錯過的題目中依題目加權抽
+- 標籤：依標籤加權選標籤，再在該標籤的題目中均勻抽
+題目與標籤加權都存在 DynamicSampler（只記錄有作答紀錄的項目），
+每次交卷只更新相關項目的權重，不重建整張表。
+"""
+import math
+import numpy as np
+
+WRONG_BOOST = 3.0       # 答錯一次，題目加權增加量
+TAG_BOOST = 1.0         # 答錯一次，所屬標籤加權增加量
+RIGHT_DECAY = 0.5       # 答對時題目加權乘上的係數
+TAG_RIGHT_DECAY = 0.8   # 答對時標籤加權乘上的係數
+MIN_WEIGHT = 0.05       # 低於此值直接移除
+
+
+class DynamicSampler:
+    """
+    可動態更新權重的離散抽樣（composition-rejection）：
+    依權重所在的 2 的次方區間分桶，先依桶總權重選桶，再於桶內均勻挑一項，
+    以 w / 2^level 的機率接受（必定 >= 1/2）。抽一次期望 O(1)，更新一項權重 O(1)。
+    """
+
+    def __init__(self):
+        self.weights = {}       # key -> 權重
+        self._level = {}        # key -> 所在桶
+        self._pos = {}          # key -> 在桶內 list 的位置
+        self._buckets = {}      # level -> [key, ...]
+        self._bucket_sum = {}   # level -> 桶內權重總和
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.weights)
+
+    def get(self, key, default=0.0) -> float:
+        return self.weights.get(key, default)
+
+    def update(self, key, weight: float):
+        """設定權重；<= MIN_WEIGHT 視為移除"""
+        if key in self.weights:
+            self._remove(key)
+        if weight > MIN_WEIGHT:
+            self._add(key, weight)
+
+    def _add(self, key, weight: float):
+        level = math.frexp(weight)[1]   # weight 落在 [2^(level-1), 2^level)
+        bucket = self._buckets.setdefault(level, [])
+        self._pos[key] = len(bucket)
+        bucket.append(key)
+        self._level[key] = level
+        self.weights[key] = weight
+        self._bucket_sum[level] = self._bucket_sum.get(level, 0.0) + weight
+        self.total += weight
+
+    def _remove(self, key):
+        level, pos = self._level.pop(key), self._pos.pop(key)
+        weight = self.weights.pop(key)
+        bucket = self._buckets[level]
+        last = bucket.pop()
+        if last != key:
+            bucket[pos] = last
+            self._pos[last] = pos
+        if bucket:
+            self._bucket_sum[level] -= weight
+        else:
+            del self._buckets[level], self._bucket_sum[level]
+        # 全部移除時歸零，避免浮點誤差累積
+        self.total = self.total - weight if self.weights else 0.0
+
+    def sample(self, rng: np.random.Generator):
+        if not self.weights:
+            raise LookupError("沒有可抽的項目")
+        x = rng.random() * sum(self._bucket_sum.values())
+        for level, s in self._bucket_sum.items():
+            x -= s
+            if x < 0:
+                break
+        # 拒絕時只在同一桶內重抽，桶的選中機率才會等於桶內權重總和的比例
+        bucket, cap = self._buckets[level], math.ldexp(1.0, level)
+        while True:
+            key = bucket[int(rng.random() * len(bucket))]
+            if rng.random() * cap < self.weights[key]:
+                return key
+
+
+class WeakAreaSampler:
+    """單一學員、單一題庫的弱點權重（只記錄作答過的題目與標籤）"""
+
+    def __init__(self):
+        self.questions = DynamicSampler()   # 列索引 -> 題目加權
+        self.tags = DynamicSampler()        # 標籤 -> 標籤加權
+
+    def record(self, rows, correct, tags):
+        """
+        交卷後增量更新：rows 為題目列索引，correct 為是否答對，
+        tags 為各題的 Tag 字串（以 ; 分隔）。
+        """
+        for r, ok, tag_str in zip(rows, correct, tags):
+            r = int(r)
+            q_w = self.questions.get(r)
+            self.questions.update(r, q_w * RIGHT_DECAY if ok else q_w + WRONG_BOOST)
+            for t in {x.strip() for x in str(tag_str or "").split(";") if x.strip()}:
+                t_w = self.tags.get(t)
+                self.tags.update(t, t_w * TAG_RIGHT_DECAY if ok else t_w + TAG_BOOST)
+
+    def has_history(self) -> bool:
+        return bool(len(self.questions) or len(self.tags))
+
+    def draw(self, tag_index, candidates: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+        """從候選列不重複抽 n 題（依弱點加權）"""
+        candidates = np.asarray(candidates)
+        n = min(int(n), len(candidates))
+        allowed = np.zeros(tag_index.n_rows, dtype=bool)
+        allowed[candidates] = True
+        base = float(len(candidates))
+        picked = {}
+        attempts = 0
+        while len(picked) < n and attempts < 20 * n:
+            attempts += 1
+            x = rng.random() * (base + self.questions.total + self.tags.total)
+            if x < base:
+                r = candidates[int(rng.random() * len(candidates))]
+            elif x < base + self.questions.total:
+                r = self.questions.sample(rng)
+            else:
+                tag_rows = tag_index.rows.get(self.tags.sample(rng))
+                if tag_rows is None:
+                    continue
+                r = tag_rows[int(rng.random() * len(tag_rows))]
+            if allowed[r] and r not in picked:
+                picked[int(r)] = None
+        rows = np.fromiter(picked, dtype=np.intp, count=len(picked))
+        if len(rows) < n:
+            # 加權項目大多不在候選範圍時，剩下的名額均勻補滿
+            rest = np.setdiff1d(candidates, rows)
+            rows = np.concatenate([rows, rng.choice(rest, size=n - len(rows), replace=False)])
+        return rows
@@ -0,0 +1,112 @@
+# exam_system/services/xlsx_split.py
+"""
+把 .xlsx 拆成只含部分工作表的小活頁簿，給平行解析的 worker 使用。
+openpyxl 開檔時一定會解析整個共用字串表（題庫的題目、選項文字幾乎都在裡面，
+往往比所有工作表加起來還大），每個 worker 都拿整份活頁簿就等於每個都重解析一次；
+拆出來的活頁簿只留該批工作表，共用字串表也只留它們用到的字串並重新編號。
+只處理標準的 xlsx 結構（zip + workbook.xml）；.xls 或看不懂的結構 open_workbook 回 None，由呼叫端改走序列解析。
+"""
+import html
+import io
+import posixpath
+import re
+import zipfile
+
+_SHEET_TAG = re.compile(r"<(?:\w+:)?sheet\b[^>]*?/>")
+_REL_TAG = re.compile(r"<(?:\w+:)?Relationship\b[^>]*?/>")
+_ATTR = re.compile(r'([\w:]+)="([^"]*)"')
+_DEFINED_NAMES = re.compile(r"<(?:\w+:)?definedNames\b.*?</(?:\w+:)?definedNames>", re.S)
+_SST_ITEM = re.compile(r"<(?:\w+:)?si\b[^>]*?/>|<(?:\w+:)?si\b.*?</(?:\w+:)?si>", re.S)
+_SST_COUNTS = re.compile(r'\s(?:count|uniqueCount)="\d+"')
+# 共用字串儲存格：<c ... t="s"><v>索引</v>
+_S_CELL = re.compile(r'(<(?:\w+:)?c\b[^>]*?\bt="s"[^>]*?(?<!/)>\s*<(?:\w+:)?v>)(\d+)(<)')
+_S_ATTR = re.compile(r'<(?:\w+:)?c\b[^>]*?\bt="s"')
+
+WORKBOOK = "xl/workbook.xml"
+WORKBOOK_RELS = "xl/_rels/workbook.xml.rels"
+SHARED_STRINGS = "xl/sharedStrings.xml"
+
+
+def _attrs(tag: str) -> dict:
+    return {k: html.unescape(v) for k, v in _ATTR.findall(tag)}
+
+
+class Workbook:
+    """已開啟的 xlsx：工作表名稱 -> worksheet XML 路徑，共用字串表先切好，拆多批時共用"""
+
+    def __init__(self, data: bytes):
+        self.zf = zipfile.ZipFile(io.BytesIO(data))
+        targets = {}
+        for tag in _REL_TAG.findall(self.zf.read(WORKBOOK_RELS).decode("utf-8")):
+            a = _attrs(tag)
+            targets[a["Id"]] = a["Target"]
+        self.workbook_xml = self.zf.read(WORKBOOK).decode("utf-8")
+        self.parts = {}
+        for tag in _SHEET_TAG.findall(self.workbook_xml):
+            a = _attrs(tag)
+            target = targets[next(v for k, v in a.items() if k.endswith(":id"))]
+            self.parts[a["name"]] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"xl/{target}")
+        self.sst_head, self.sst_items, self.sst_tail = "", [], ""
+        if SHARED_STRINGS in self.zf.namelist():
+            sst = self.zf.read(SHARED_STRINGS).decode("utf-8")
+            self.sst_items = _SST_ITEM.findall(sst)
+            if self.sst_items:
+                start = sst.index(self.sst_items[0])
+                end = sst.rindex(self.sst_items[-1]) + len(self.sst_items[-1])
+                self.sst_head, self.sst_tail = _SST_COUNTS.sub("", sst[:start]), sst[end:]
+
+    def sheet_xml_bytes(self) -> int:
+        """所有工作表 XML 解壓後的總大小（由 zip 目錄讀出，不必解壓）"""
+        return sum(self.zf.getinfo(p).file_size for p in self.parts.values())
+
+    def subset(self, sheet_names) -> bytes:
+        """只含 sheet_names 這些工作表的活頁簿；解析結果與從原活頁簿讀同名工作表相同"""
+        keep = set(sheet_names)
+        drop = {p for name, p in self.parts.items() if name not in keep}
+        drop |= {f"{posixpath.dirname(p)}/_rels/{posixpath.basename(p)}.rels" for p in drop}
+        drop.add("xl/calcChain.xml")  # 以工作表序號記錄公式，拿掉工作表後就對不上
+
+        remap = {}
+
+        def _renumber(m):
+            new = remap.setdefault(int(m.group(2)), len(remap))
+            return f"{m.group(1)}{new}{m.group(3)}"
+
+        sheets = {}
+        for name, p in self.parts.items():
+            if name in keep:
+                xml = self.zf.read(p).decode("utf-8")
+                xml, n = _S_CELL.subn(_renumber, xml)
+                # 有共用字串儲存格沒被改到編號會對到別的字串，寧可不拆
+                if n != len(_S_ATTR.findall(xml)):
+                    raise ValueError(f"無法辨識工作表 {name} 的共用字串儲存格")
+                sheets[p] = xml
+        used = sorted(remap, key=remap.get)
+        sst = self.sst_head + "".join(self.sst_items[i] for i in used) + self.sst_tail
+        wb = _SHEET_TAG.sub(lambda m: m.group(0) if _attrs(m.group(0))["name"] in keep else "", self.workbook_xml)
+        wb = _DEFINED_NAMES.sub("", wb)  # 名稱定義以工作表序號對應，拿掉工作表後會指錯
+
+        out = io.BytesIO()
+        # 只在 process 間傳遞，不壓縮（解壓反而佔 worker 時間）
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as z:
+            for info in self.zf.infolist():
+                name = info.filename
+                if name in drop:
+                    continue
+                if name == WORKBOOK:
+                    z.writestr(name, wb)
+                elif name == SHARED_STRINGS and self.sst_items:
+                    z.writestr(name, sst)
+                elif name in sheets:
+                    z.writestr(name, sheets[name])
+                else:
+                    z.writestr(name, self.zf.read(name))
+        return out.getvalue()
+
+
+def open_workbook(data: bytes) -> Workbook | None:
+    """不是標準 xlsx（例如 .xls）時回 None"""
+    try:
+        return Workbook(data)
+    except (zipfile.BadZipFile, KeyError, StopIteration, UnicodeDecodeError):
+        return None
@@ -5,10 +5,12 @@ setup(
     version="2.0.0",
     packages=find_packages(),
     install_requires=[
-        "streamlit>=1.28.0",
+        "streamlit>=1.37.0",
         "pandas>=2.0.0",
         "requests>=2.31.0",
         "google-generativeai>=0.3.0",
         "openpyxl>=3.1.0",
+        "xlrd>=2.0.1",
+        "pyarrow>=14.0.0",
     ],
 )
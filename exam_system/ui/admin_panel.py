@@ -1,7 +1,9 @@
 # exam_system/ui/admin_panel.py
+from pathlib import Path
 import streamlit as st
 from exam_system.config import settings
-from exam_system.services import github_repo
+from exam_system.services import ai_pregen, bank_registry, gemini_client, github_repo
+from exam_system.services.repo_index import BANK_EXTS
 
 def render_admin_panel():
     with st.expander("🛠 題庫管理（管理者）", expanded=False):
@@ -23,17 +25,17 @@ def render_admin_panel():
                 st.warning(msg)
             else:
                 up_type = st.selectbox("類型", options=settings.BANK_TYPES)
-                up = st.file_uploader("選擇 Excel", type=["xlsx"])
+                up = st.file_uploader("選擇 Excel", type=[e.lstrip(".") for e in BANK_EXTS])
                 name = st.text_input("檔名 (例如 bank_v2.xlsx)", value="new_bank.xlsx")
                 set_now = st.checkbox("上傳後立即設為預設", value=True)
 
                 if st.button("上傳"):
                     if up and name:
+                        # 副檔名跟著上傳的檔案（.xls 存成 .xlsx 會被當成另一種格式）
+                        name = str(Path(name).with_suffix(Path(up.name).suffix.lower()))
                         dest = f"{settings.get_type_dir(up_type)}/{name}"
                         try:
-                            github_repo.put_file(dest, up.getvalue(), f"Admin upload {name}")
-                            if set_now:
-                                github_repo.set_current_bank_path(up_type, dest)
+                            github_repo.publish_bank(up_type, dest, up.getvalue(), f"Admin upload {name}", set_current=set_now)
                             st.success(f"成功上傳：{dest}")
                         except Exception as e:
                             st.error(f"失敗：{e}")
@@ -50,3 +52,43 @@ def render_admin_panel():
                     st.success(f"已更新預設：{pick}")
             else:
                 st.info("無檔案")
+
+            if github_repo.get_backend().name == "github":
+                st.write("### GitHub API 延遲統計")
+                stats = github_repo.get_client().metrics.summary()
+                if stats:
+                    st.dataframe(stats, use_container_width=True, hide_index=True)
+                else:
+                    st.caption("尚無呼叫紀錄")
+
+            st.write("### AI 回應快取")
+            cs = gemini_client.get_cache().stats()
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("命中", cs["hits"])
+            c2.metric("未命中", cs["misses"])
+            c3.metric("命中率", f"{cs['hit_rate']:.0%}")
+            c4.metric("筆數 / 大小", f"{cs['entries']} / {cs['bytes'] / (1 << 20):.1f} MB")
+
+            st.write("### 預先產生 AI 詳解 / 提示")
+            bank = bank_registry.get(st.session_state.get("bank_key"))
+            if bank is None:
+                st.caption("請先於側欄載入題庫")
+            elif not gemini_client.is_ready():
+                st.caption("Gemini API Key 未設定")
+            else:
+                kinds = st.multiselect("類型", list(ai_pregen.BUILDERS), default=list(ai_pregen.BUILDERS), key="adm_pregen_kinds")
+                workers = st.number_input("同時呼叫上限", 1, 16, 4, key="adm_pregen_workers")
+                sidecar = gemini_client.get_pregen()
+                st.caption(f"已完成 {len(sidecar)} 筆（按下開始後只產生尚未完成的）")
+                if st.button("開始產生"):
+                    # 工作清單要為整份題庫建 prompt，只在按下按鈕時計算，不在每次 rerun 重算
+                    jobs = ai_pregen.plan(ai_pregen.bank_questions(bank.df), kinds, sidecar.keys())
+                    if not jobs:
+                        st.info("目前題庫已全部產生")
+                    else:
+                        bar = st.progress(0.0)
+                        stats = ai_pregen.run(
+                            jobs, gemini_client.generate, sidecar, int(workers),
+                            on_progress=lambda n, total: bar.progress(n / total, text=f"{n}/{total}"),
+                        )
+                        st.success(f"完成 {stats['done']} 筆，失敗 {stats['failed']} 筆（重新執行會補上失敗的）")
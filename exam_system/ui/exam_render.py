@@ -1,52 +1,55 @@
 # exam_system/ui/exam_render.py
-import time
-import random
+import numpy as np
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
-from exam_system.services import gemini_client
+from exam_system.config import settings
+from exam_system.services import ai_prefetch, blueprint, countdown, exam_nav, gemini_client, grading, option_canon, paper_engine
+from exam_system.services.weak_sampler import WeakAreaSampler
 
-def sample_paper(df, n, random_order=True, shuffle_opts=True):
-    n = min(int(n), len(df))
-    rows = df.sample(n=n) if random_order else df.head(n)
-    if random_order:
-        rows = rows.sample(frac=1)
-    
-    questions = []
-    option_cols = [c for c in df.columns if c.startswith("Option") and df[c].astype(str).str.strip().ne("").any()]
-    
-    for _, r in rows.iterrows():
-        items = []
-        for i, col in enumerate(option_cols):
-            txt = str(r.get(col, "")).strip()
-            if txt:
-                orig_lab = chr(ord('A') + i)
-                items.append((orig_lab, txt))
-        
-        if shuffle_opts:
-            random.shuffle(items)
-        
-        choices = []
-        orig_to_new = {}
-        for idx, (orig_lab, txt) in enumerate(items):
-            new_lab = chr(ord('A') + idx)
-            choices.append((new_lab, txt))
-            orig_to_new[orig_lab] = new_lab
-            
-        raw_ans = str(r.get("Answer", "")).upper().strip()
-        orig_ans_set = set(raw_ans)
-        new_ans_set = {orig_to_new[a] for a in orig_ans_set if a in orig_to_new}
-        
-        questions.append({
-            "ID": r["ID"],
-            "Question": r["Question"],
-            "Type": str(r.get("Type", "SC")).upper(),
-            "Choices": choices,
-            "Answer": new_ans_set,
-            "Explanation": r.get("Explanation", ""),
-            "Image": r.get("Image", ""),
-            "Tag": r.get("Tag", ""),
-        })
-    return questions
+SUBMIT_LABEL = "📥 交卷"
+
+def sample_paper(bank, rows, n, random_order=True, shuffle_opts=True, blueprint_spec=None, weak_focus=False):
+    """
+    從篩選後的列（rows）抽題，回傳精簡試卷（題目內容渲染時才從共用題庫取出）。
+    - 有 blueprint_spec 時依考試藍圖分層配題
+    - weak_focus 時依本 session 過去的錯題 / 錯誤標籤加權抽題
+    """
+    if blueprint_spec:
+        strata, quotas, _ = blueprint.plan(bank.tag_index, rows, blueprint_spec, n)
+        return paper_engine.new_blueprint_paper(
+            bank.key, bank.question_store, rows, strata, quotas, random_order, shuffle_opts
+        )
+    weak = weak_sampler_for(bank.key)
+    if weak_focus and weak.has_history():
+        def pick(rng):
+            drawn = weak.draw(bank.tag_index, rows, n, rng)
+            return drawn if random_order else np.sort(drawn)
+        return paper_engine.paper_from_rows(bank.key, bank.question_store, pick, False, shuffle_opts)
+    return paper_engine.new_paper(bank.key, bank.question_store, rows, n, random_order, shuffle_opts)
+
+def weak_sampler_for(bank_key) -> WeakAreaSampler:
+    """本 session 在此題庫的弱點權重（只記錄作答過的題目與標籤）"""
+    samplers = st.session_state.setdefault("weak_samplers", {})
+    if bank_key not in samplers:
+        samplers[bank_key] = WeakAreaSampler()
+    return samplers[bank_key]
+
+def record_results(paper, df_res):
+    """把 calculate_results 的結果增量寫入弱點權重"""
+    correct = df_res["Result"].eq(grading.RESULT_CORRECT).to_numpy()
+    weak_sampler_for(paper.bank_key).record(paper.rows, correct, df_res["Tag"])
+
+def paper_available(paper) -> bool:
+    """試卷對應的題庫是否仍在記憶體中；不在時提示並結束本次考試"""
+    try:
+        paper.store()
+        return True
+    except LookupError as e:
+        st.warning(str(e))
+        st.session_state.mode = None
+        st.session_state.paper = None
+        return False
 
 def render_practice_mode(paper, show_image=True):
     if "practice_idx" not in st.session_state:
@@ -75,8 +78,9 @@ def render_practice_mode(paper, show_image=True):
     if gemini_client.is_ready():
         if st.button("💡 AI 提示", key=f"hint_{i}"):
             ck, sys, usr = gemini_client.build_hint_prompt(q)
-            with st.spinner("思考中..."):
-                st.info(gemini_client.generate_cached(ck, sys, usr))
+            # 逐段顯示，第一段到達就出現（快取命中時一次顯示完整內容）
+            with st.container(border=True):
+                st.write_stream(option_canon.stream_to_display(gemini_client.generate_stream(ck, sys, usr), q))
 
     # Options
     opts = [f"{lab}. {txt}" for lab, txt in q["Choices"]]
@@ -91,6 +95,7 @@ def render_practice_mode(paper, show_image=True):
         
     if st.button("提交"):
         gold = q["Answer"]
+        weak_sampler_for(paper.bank_key).record([paper.rows[i]], [user_pick == gold], [q["Tag"]])
         if user_pick == gold:
             st.success("✅ 答對！")
             st.session_state.practice_correct += 1
@@ -103,84 +108,175 @@ def render_practice_mode(paper, show_image=True):
             if gemini_client.is_ready():
                 ck, sys, usr = gemini_client.build_explain_prompt(q)
                 with st.expander("🤖 看 AI 詳解"):
-                     st.write(gemini_client.generate_cached(ck, sys, usr))
+                     st.write_stream(option_canon.stream_to_display(gemini_client.generate_stream(ck, sys, usr), q))
         
         if st.button("下一題"):
             st.session_state.practice_idx += 1
             st.rerun()
 
-def render_mock_exam_questions(paper, show_image=True):
-    # Timer
-    if st.session_state.time_limit > 0:
-        elapsed = int(time.time() - st.session_state.start_ts)
-        remain = max(0, st.session_state.time_limit - elapsed)
-        st.metric("剩餘時間", f"{remain//60:02d}:{remain%60:02d}")
-        if remain == 0:
-            st.warning("時間到！")
-            
-    answers = st.session_state.setdefault("answers", {})
-    
-    for idx, q in enumerate(paper, 1):
-        st.markdown(f"**Q{idx}. {q['Question']}**")
-        if show_image and q.get("Image"):
-            st.image(q["Image"])
-            
-        opts = [f"{lab}. {txt}" for lab, txt in q["Choices"]]
-        if q["Type"] == "MC":
-            sel = st.multiselect(f"Q{idx} 選項", opts, key=f"m_q_{idx}", label_visibility="collapsed")
-            answers[q["ID"]] = {s.split(".")[0] for s in sel}
-        else:
-            sel = st.radio(f"Q{idx} 選項", opts, key=f"m_q_{idx}", label_visibility="collapsed")
-            answers[q["ID"]] = {sel.split(".")[0]} if sel else set()
-        st.divider()
-
-def calculate_results(paper, answers):
-    records = []
-    correct = 0
-    for q in paper:
-        gold = q["Answer"]
-        pred = answers.get(q["ID"], set())
-        is_correct = (gold == pred)
-        correct += int(is_correct)
-        
-        records.append({
-            "ID": q["ID"],
-            "Question": q["Question"],
-            "Tag": q["Tag"],
-            "Your Answer": "".join(sorted(pred)),
-            "Correct": "".join(sorted(gold)),
-            "Result": "✅" if is_correct else "❌",
-            "Explanation": q["Explanation"],
-            "RawQuestion": q # for AI usage
-        })
-    return pd.DataFrame(records), correct
-
-def render_result_page(df_res, correct_count, total):
-    st.balloons()
-    score = round(100*correct_count/total, 1)
-    st.success(f"成績：{correct_count} / {total} ({score}%)")
+def render_mock_exam_questions(paper, show_image=True, page_size=settings.EXAM_PAGE_SIZE):
+    # 倒數計時在瀏覽器端跑，不定時重跑 script；逾時與否一律以伺服器時間判定
+    remain = countdown.remaining(st.session_state.get("deadline_ts"))
+    if remain is not None:
+        if remain <= 0:
+            _submit_on_timeout()
+        components.html(countdown.countdown_html(remain, SUBMIT_LABEL), height=countdown.HEIGHT)
+
+    st.session_state.setdefault("answers", {})
+    _render_exam_page(paper, show_image, page_size)
+
+@st.fragment
+def _render_exam_page(paper, show_image=True, page_size=settings.EXAM_PAGE_SIZE):
+    """
+    目前這一頁（fragment）：作答與換頁只重跑這一段，且只建立本頁題目的元件。
+    answers 以題目在試卷中的位置（0 起算）為 key，其他頁的作答保留不動。
+    """
+    # 逾時後的作答不再寫入（前端自動交卷失效時，任何一次互動都會觸發交卷）
+    remain = countdown.remaining(st.session_state.get("deadline_ts"))
+    if remain is not None and remain <= 0:
+        _submit_on_timeout()
+
+    answers = st.session_state.answers
+    total = len(paper)
+    pages = exam_nav.n_pages(total, page_size)
+    if st.session_state.get("exam_page", 0) >= pages:
+        st.session_state.exam_page = 0
+
+    nav = st.container()  # 導覽格放最上方，但在本頁作答之後才填入，狀態才會是最新的
+    page = st.selectbox(
+        "頁數", range(pages), key="exam_page",
+        format_func=lambda p: exam_nav.page_label(p, page_size, total),
+    )
+    start, stop = exam_nav.page_bounds(page, page_size, total)
+    for i, q in enumerate(paper.questions(start, stop), start):
+        _render_mock_question(paper.seed, i, q, answers, show_image)
+
+    col_prev, col_next = st.columns(2)
+    col_prev.button("◀ 上一頁", on_click=_shift_page, args=(-1, pages), disabled=page == 0, use_container_width=True)
+    col_next.button("下一頁 ▶", on_click=_shift_page, args=(1, pages), disabled=page >= pages - 1, use_container_width=True)
+
+    answered = exam_nav.answered_mask(total, (i for i, v in answers.items() if v))
+    with nav.expander(f"📋 題目導覽（已答 {int(answered.sum())} / {total}）", expanded=True):
+        st.markdown(exam_nav.navigator_markdown(answered, page_size, page))
+
+def _submit_on_timeout():
+    st.session_state.submitted = True
+    st.session_state.timed_out = True
+    st.rerun()
+
+def _shift_page(step, pages):
+    st.session_state.exam_page = min(max(0, st.session_state.get("exam_page", 0) + step), pages - 1)
+
+def _render_mock_question(seed, i, q, answers, show_image=True):
+    """單題作答區；元件離開畫面後狀態會被清掉，回到這頁時以 answers 還原預設值"""
+    st.markdown(f"**Q{i + 1}. {q['Question']}**")
+    if show_image and q.get("Image"):
+        st.image(q["Image"])
+
+    picked = answers.get(i, set())
+    opts = [f"{lab}. {txt}" for lab, txt in q["Choices"]]
+    key = f"m_q_{seed}_{i}"
+    if q["Type"] == "MC":
+        default = [o for o in opts if o.split(".")[0] in picked]
+        sel = st.multiselect(f"Q{i + 1} 選項", opts, default=default, key=key, label_visibility="collapsed")
+        answers[i] = {s.split(".")[0] for s in sel}
+    else:
+        index = next((j for j, o in enumerate(opts) if o.split(".")[0] in picked), None)
+        sel = st.radio(f"Q{i + 1} 選項", opts, index=index, key=key, label_visibility="collapsed")
+        answers[i] = {sel.split(".")[0]} if sel else set()
+    st.divider()
+
+def calculate_results(paper, answers, policy=grading.DEFAULT_POLICY):
+    """
+    向量化判卷，回傳 (df_res, score)。
+    結果表以 Q（題目在試卷中的位置）指向題目，不夾帶題目 dict；score 為總得分（可能含部分給分）。
+    """
+    store, rows = paper.store(), paper.rows
+    g = grading.grade_paper(paper.answer_bits, answers, range(len(paper)),
+                            store.has_option[rows].sum(axis=1), store.types[rows] == "MC", policy)
+    df_res = pd.DataFrame({
+        "Q": np.arange(len(paper)),
+        "ID": store.column("ID", rows),
+        "Question": store.column("Question", rows),
+        "Tag": store.column("Tag", rows),
+        "Your Answer": g.your_letters,
+        "Correct": g.gold_letters,
+        "Result": g.marks,
+        "Score": np.round(g.score, 3),
+        "Explanation": store.column("Explanation", rows),
+    })
+    return df_res, g.total
+
+def _wrong_rows(df_res):
+    return df_res[df_res["Result"] != grading.RESULT_CORRECT]
+
+def start_prefetch(paper, df_res):
+    """交卷後把錯題的 AI 詳解送進背景 pool；job 存在 session_state，重考 / 換卷時 cancel_prefetch 撤銷"""
+    cancel_prefetch()
+    if not gemini_client.is_ready():
+        return
+    tasks = [gemini_client.build_explain_prompt(paper[int(i)]) for i in _wrong_rows(df_res)["Q"]]
+    if tasks:
+        st.session_state.ai_prefetch = ai_prefetch.start(
+            tasks, gemini_client.cached_generator(), settings.AI_PREFETCH_WORKERS)
+
+def cancel_prefetch():
+    job = st.session_state.pop("ai_prefetch", None)
+    if job is not None:
+        job.cancel()
+
+@st.fragment(run_every=1)
+def _prefetch_progress():
+    """每秒更新進度；全部結束時整頁重跑一次，錯題區就會直接顯示已產生的詳解"""
+    job = st.session_state.get("ai_prefetch")
+    if job is None or not job.active:
+        st.rerun()
+    done, total = job.progress()
+    col_bar, col_cancel = st.columns([5, 1])
+    col_bar.progress(done / total, text=f"🤖 AI 詳解預先產生中 {done}/{total}")
+    if col_cancel.button("取消", key="ai_prefetch_cancel"):
+        job.cancel()
+        st.rerun()
+
+def render_result_page(df_res, score, total, paper):
+    # 每份試卷只放一次：預先產生完成後的整頁重跑、展開錯題等互動都會重跑這裡
+    if st.session_state.get("celebrated_paper") != paper.seed:
+        st.session_state.celebrated_paper = paper.seed
+        st.balloons()
+    pct = round(100*score/total, 1)
+    st.success(f"成績：{score:g} / {total} ({pct}%)")
     
-    st.dataframe(df_res.drop(columns=["RawQuestion"]), use_container_width=True)
+    st.dataframe(df_res.drop(columns=["Q"]), use_container_width=True)
     
-    csv = df_res.drop(columns=["RawQuestion"]).to_csv(index=False).encode("utf-8-sig")
+    csv = df_res.drop(columns=["Q"]).to_csv(index=False).encode("utf-8-sig")
     st.download_button("下載 CSV", csv, "result.csv", "text/csv")
     
     # Wrong Review
-    wrongs = df_res[df_res["Result"] == "❌"]
+    wrongs = _wrong_rows(df_res)
     if not wrongs.empty:
         st.subheader("❌ 錯題檢討")
+        job = st.session_state.get("ai_prefetch")
+        if job is not None and job.active:
+            _prefetch_progress()
         for _, row in wrongs.iterrows():
-            q = row["RawQuestion"]
+            q = paper[int(row["Q"])]
             with st.expander(f"{row['Question']}"):
                 st.error(f"你的答案：{row['Your Answer']} | 正解：{row['Correct']}")
                 st.write(f"詳解：{row['Explanation']}")
                 
                 if gemini_client.is_ready():
-                    if st.button(f"🤖 AI 解析此題 ({row['ID']})"):
-                        ck, sys, usr = gemini_client.build_explain_prompt(q)
-                        st.write(gemini_client.generate_cached(ck, sys, usr))
+                    ck, sys, usr = gemini_client.build_explain_prompt(q)
+                    if job is not None and job.ready(ck):
+                        st.write(option_canon.to_display(job.claim(ck), q))
+                    elif st.button(f"🤖 AI 解析此題 ({row['ID']})"):
+                        # 背景正在產生就等它；還在排隊（或沒有預先產生）就直接串流
+                        text = job.claim(ck) if job is not None else None
+                        if text:
+                            st.write(option_canon.to_display(text, q))
+                        else:
+                            st.write_stream(option_canon.stream_to_display(gemini_client.generate_stream(ck, sys, usr), q))
         
         if gemini_client.is_ready():
             if st.button("📊 生成錯題總結報告"):
                 ck, sys, usr = gemini_client.build_weak_wrong_prompt(wrongs)
-                st.write(gemini_client.generate_cached(ck, sys, usr))
+                st.write_stream(gemini_client.generate_stream(ck, sys, usr))
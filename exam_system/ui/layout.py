@@ -3,7 +3,7 @@ import streamlit as st
 import random
 from exam_system.config import settings
 from exam_system.services import github_repo
-from exam_system.services import bank_loader
+from exam_system.services import bank_loader, bank_registry, blueprint, exam_nav, grading
 from exam_system.ui import admin_panel
 
 def setup_page(title="錠嵂AI考照"):
@@ -47,36 +47,55 @@ def render_sidebar_settings():
             if type_files:
                 selected_paths = [pick_file]
 
-        # 2. 載入題庫 (Cache Check)
-        if "df" not in st.session_state or st.session_state.get("current_paths") != selected_paths:
-             if selected_paths:
-                 st.session_state.df = bank_loader.load_banks(selected_paths)
-                 st.session_state.current_paths = selected_paths
-             else:
-                 st.session_state.df = None
+        # 2. 載入題庫（process 共用唯讀題庫，session 只存 key 與篩選列索引）
+        #    題庫索引已有各檔 SHA：檔案更新時自動重新載入；其他 session 已載入的同版本直接共用，不必下載
+        index_shas = github_repo.file_shas(selected_paths)
+        wanted = bank_registry.make_key(selected_paths, index_shas) if None not in index_shas else None
+        bank = bank_registry.get(wanted)
+        if bank is None:
+            bank = bank_registry.get(st.session_state.get("bank_key"))
+            if (bank is None or st.session_state.get("current_paths") != selected_paths
+                    or st.session_state.get("current_shas") != index_shas):
+                bank = bank_loader.open_bank(selected_paths, index_shas) if selected_paths else None
+        st.session_state.bank_key = bank.key if bank else None
+        st.session_state.current_paths = selected_paths
+        st.session_state.current_shas = index_shas
 
-        bank = st.session_state.get("df")
-        if bank is None or bank.empty:
+        if bank is None or bank.df.empty:
             st.error("無有效題庫資料")
             st.stop()
             
-        # 3. 標籤與篩選
-        all_tags = sorted({t.strip() for tags in bank["Tag"].dropna().astype(str) for t in tags.split(";") if t.strip()})
-        picked_tags = st.multiselect("標籤篩選", options=all_tags)
-        
-        if picked_tags:
-            mask = bank["Tag"].astype(str).apply(lambda s: any(t in [x.strip() for x in s.split(";")] for t in picked_tags))
-            filtered_df = bank[mask].copy()
-        else:
-            filtered_df = bank.copy()
+        # 3. 標籤與篩選（反向索引，不再逐列拆字串）
+        tag_index = bank.tag_index
+        picked_tags = st.multiselect("標籤篩選", options=tag_index.tags)
+        rows = tag_index.select(picked_tags)
+        st.session_state.bank_rows = rows
             
-        max_q = len(filtered_df)
+        max_q = len(rows)
         st.caption(f"可用題數：{max_q}")
         
         num_q = st.number_input("抽題數量", min_value=1, max_value=max(1, max_q), value=min(20, max_q))
+
+        # 考試藍圖（依章節配題），僅在該類型有設定時出現
+        blueprint_spec = settings.BLUEPRINTS.get(pick_type)
+        use_blueprint = bool(blueprint_spec) and st.checkbox("依考試藍圖（章節配題）抽題", value=False)
+        if use_blueprint:
+            _, quotas, shortages = blueprint.plan(tag_index, rows, blueprint_spec, num_q)
+            st.caption("藍圖配題：" + "、".join(f"{t} {q}" for t, q in zip(blueprint_spec, quotas)) + f"（共 {quotas.sum()} 題）")
+            for t, (need, have) in shortages.items():
+                st.warning(f"{t} 題數不足：需要 {need} 題，可用 {have} 題")
+
+        weak_focus = st.checkbox("🎯 弱點加強（依過去錯題加權抽題）", value=False, disabled=use_blueprint)
         shuffle_opt = st.checkbox("隨機選項順序", value=True)
         random_q = st.checkbox("隨機題目順序", value=True)
         show_img = st.checkbox("顯示圖片", value=True)
+        policies = list(grading.POLICIES)
+        # 設定值打錯時退回預設計分方式，不讓整個側欄因 ValueError 中斷
+        default_policy = settings.MC_SCORING if settings.MC_SCORING in grading.POLICIES else grading.DEFAULT_POLICY
+        mc_policy = st.selectbox("複選題計分", policies, index=policies.index(default_policy),
+                                 format_func=grading.POLICIES.get)
+        page_sizes = sorted(set(exam_nav.PAGE_SIZES) | {settings.EXAM_PAGE_SIZE})
+        page_size = st.selectbox("模擬考每頁題數", page_sizes, index=page_sizes.index(settings.EXAM_PAGE_SIZE))
         
         st.divider()
         time_min = st.number_input("時間限制 (分, 0=不限)", 0, 300, 0)
@@ -88,10 +107,15 @@ def render_sidebar_settings():
         
         return {
             "start": start_btn,
-            "df": filtered_df,
+            "bank": bank,
+            "rows": rows,
+            "blueprint": blueprint_spec if use_blueprint else None,
+            "weak_focus": weak_focus,
             "num_q": num_q,
             "shuffle_opt": shuffle_opt,
             "random_q": random_q,
             "show_img": show_img,
+            "page_size": page_size,
+            "mc_policy": mc_policy,
             "time_limit": int(time_min * 60)
         }
@@ -0,0 +1,43 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from exam_system.config import settings
+from exam_system.services import bank_cache, bank_loader
+
+BANK = Path(__file__).resolve().parents[1] / "bank"
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BANK_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_cold_and_warm_loads_are_equal():
+    df = pd.DataFrame({
+        "Question": ["q1", "q2", "q3", "q4"],
+        "修訂備註": [None, np.nan, 3, "改過"],  # 備註欄混雜空值、數字與文字
+        "Score": [1.0, 2.0, 3.0, 4.0],
+        "SourceFile": "a.xlsx",
+    })
+    calls = []
+
+    def compile_fn(data, name):
+        calls.append(name)
+        return df.copy()
+
+    cold = bank_cache.load_or_compile(b"bank", "a.xlsx", compile_fn)
+    warm = bank_cache.load_or_compile(b"bank", "a.xlsx", compile_fn)
+    assert calls == ["a.xlsx"]
+    pd.testing.assert_frame_equal(cold, warm)
+    assert warm["修訂備註"].isna().tolist() == [True, True, False, False]
+    assert warm["修訂備註"].iloc[2:].tolist() == ["3", "改過"]
+
+
+def test_bank_cold_and_warm_loads_are_equal():
+    path = BANK / "投資型" / "IPA題庫.xlsx"
+    cold = bank_loader._load_excel_bytes(path.read_bytes(), path.name)
+    warm = bank_loader._load_excel_bytes(path.read_bytes(), path.name)
+    assert len(cold) == 1004
+    pd.testing.assert_frame_equal(cold, warm)
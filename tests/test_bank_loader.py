@@ -0,0 +1,40 @@
+from pathlib import Path
+import pandas as pd
+from exam_system.config import settings
+from exam_system.services import bank_loader, bank_registry
+
+
+def test_open_bank_keys_failed_files_on_index_sha(monkeypatch):
+    df = pd.DataFrame({"Question": ["q"], "Tag": ["t"]})
+    # b.xls 載入失敗：沒有算出 SHA
+    monkeypatch.setattr(bank_loader, "_load_banks", lambda paths, index_shas=None: (df, {"a.xlsx": "sha-a"}))
+    bank = bank_loader.open_bank(["a.xlsx", "b.xls"], ["sha-a", "sha-b"])
+    key = bank_registry.make_key(["a.xlsx", "b.xls"], ["sha-a", "sha-b"])
+    assert bank.key == key
+    assert bank_registry.get(key) is bank
+
+
+PA = Path(__file__).resolve().parents[1] / "bank" / "人身" / "PA_分章_20250731_LIB.xlsx"
+
+
+def test_ordinary_banks_parse_serially(monkeypatch):
+    monkeypatch.setattr(settings, "PARSE_WORKERS", 4)
+    sheets = pd.ExcelFile(PA).sheet_names
+    assert len(sheets) > settings.PARALLEL_SHEETS_MIN
+    # 工作表 XML 只有幾 MB：開 worker 的固定成本比省下的時間多
+    assert bank_loader._use_parallel(PA.read_bytes(), sheets) is None
+    monkeypatch.setattr(settings, "PARALLEL_MIN_BYTES", 0)
+    assert bank_loader._use_parallel(PA.read_bytes(), sheets) is not None
+    monkeypatch.setattr(settings, "PARSE_WORKERS", 1)
+    assert bank_loader._use_parallel(PA.read_bytes(), sheets) is None
+
+
+def test_parallel_parse_matches_serial(monkeypatch):
+    data = PA.read_bytes()
+    serial = bank_loader._parse_excel_bytes(data, PA.name)
+    monkeypatch.setattr(settings, "PARSE_WORKERS", 2)
+    monkeypatch.setattr(settings, "PARALLEL_MIN_BYTES", 0)
+    try:
+        pd.testing.assert_frame_equal(bank_loader._parse_excel_bytes(data, PA.name), serial)
+    finally:
+        bank_loader._reset_pool()
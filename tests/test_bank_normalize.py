@@ -0,0 +1,45 @@
+from pathlib import Path
+import pandas as pd
+from exam_system.services.bank_normalize import normalize_bank_df, parse_sheets
+
+BANK = Path(__file__).resolve().parents[1] / "bank"
+
+
+def test_star_answers_and_type():
+    df = pd.DataFrame({
+        "題號": ["1", "2"],
+        "題目": ["單選", "複選"],
+        "選項一": ["*甲", "*甲"], "選項二": ["乙", " * 乙"], "選項三": ["丙", "丙"],
+    })
+    out = normalize_bank_df(df, sheet_name="第一章")
+    assert out["Answer"].tolist() == ["A", "AB"]
+    assert out["Type"].tolist() == ["SC", "MC"]
+    assert out["OptionB"].tolist() == ["乙", "乙"]
+    assert out["Tag"].tolist() == ["第一章", "第一章"]
+
+
+def test_ipa_xls_headers():
+    path = BANK / "投資型" / "IPA題庫_20250421_LIB.xls"
+    data = path.read_bytes()
+    sheets = pd.ExcelFile(path).sheet_names
+    dfs = [df for df in parse_sheets(data, path.name, sheets) if not df.empty]
+    df = pd.concat(dfs, ignore_index=True)
+    assert len(df) == 1004
+    assert set(df["Tag"]) == {f"IPA{i:02d}" for i in range(1, 11)}
+    first = df.iloc[0]
+    assert first["ID"] == "1-001"
+    assert first["Question"] == "有關投資型保險商品的敘述，下列何者錯誤？"
+    assert first["OptionB"] == "由公司選擇投資項目"
+    assert first["Answer"] == "B"
+    assert df["Answer"].str.len().ge(1).all()
+
+
+def test_ipa_xlsx_loads_sheets_with_new_headers():
+    # IPA03–IPA10 使用 題目編號 / 題目內容 / 答案選項N 表頭，過去整張被略過（只剩 277 題）
+    path = BANK / "投資型" / "IPA題庫.xlsx"
+    sheets = pd.ExcelFile(path).sheet_names
+    dfs = [df for df in parse_sheets(path.read_bytes(), path.name, sheets) if not df.empty]
+    counts = {df["SourceSheet"].iloc[0]: len(df) for df in dfs}
+    assert counts["IPA01"] + counts["IPA02"] == 277
+    assert set(counts) == {f"IPA{i:02d}" for i in range(1, 11)}
+    assert sum(counts.values()) == 1004
@@ -0,0 +1,88 @@
+import base64
+import pytest
+from exam_system.config import settings
+from exam_system.services import blob_cache
+from exam_system.services.bank_cache import blob_sha
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, data=b"", headers=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self._data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self._body
+
+    def iter_content(self, size):
+        for i in range(0, len(self._data), size):
+            yield self._data[i:i + size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeClient:
+    """只實作 blob_cache 用到的部分；files 為 path -> bytes"""
+    owner, repo = "o", "r"
+
+    def __init__(self, files):
+        self.files = files
+        self.calls = []
+
+    def api_response(self, url, params=None, headers=None, stream=False):
+        headers = headers or {}
+        self.calls.append((url, dict(headers)))
+        if url.startswith("git/blobs/"):
+            sha = url.rsplit("/", 1)[1]
+            data = next((d for d in self.files.values() if blob_sha(d) == sha), b"corrupt")
+            return FakeResponse(data=data)
+        path = url[len("contents/"):]
+        data = self.files[path]
+        etag = f'"{blob_sha(data)}"'
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(304)
+        return FakeResponse(body={"sha": blob_sha(data), "encoding": "base64",
+                                  "content": base64.b64encode(data).decode()},
+                            headers={"ETag": etag})
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BANK_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_known_sha_downloads_once_then_hits_disk():
+    data = b"x" * (3 * blob_cache.CHUNK + 5)
+    client = FakeClient({"bank/a.xlsx": data})
+    sha = blob_sha(data)
+    assert blob_cache.fetch(client, "bank/a.xlsx", "main", sha, len(data)) == (data, sha)
+    assert blob_cache.fetch(client, "bank/a.xlsx", "main", sha, len(data)) == (data, sha)
+    assert [u for u, _ in client.calls] == [f"git/blobs/{sha}"]
+
+
+def test_blob_sha_mismatch_is_rejected_and_not_cached():
+    client = FakeClient({})
+    sha = blob_sha(b"expected")
+    with pytest.raises(blob_cache.BlobMismatch):
+        blob_cache.download_blob(client, sha, len(b"expected"))
+    with pytest.raises(blob_cache.BlobMismatch):
+        blob_cache.download_blob(client, sha)  # 不知道長度時寫完再驗證
+    assert blob_cache.read_blob(sha) is None
+    assert not list(blob_cache._root().rglob("*.tmp"))
+
+
+def test_unknown_sha_revalidates_with_etag():
+    client = FakeClient({"bank/a.xlsx": b"v1"})
+    assert blob_cache.fetch(client, "bank/a.xlsx", "main") == (b"v1", blob_sha(b"v1"))
+    assert blob_cache.fetch(client, "bank/a.xlsx", "main") == (b"v1", blob_sha(b"v1"))
+    assert client.calls[1][1] == {"If-None-Match": f'"{blob_sha(b"v1")}"'}
+
+    client.files["bank/a.xlsx"] = b"v2"
+    assert blob_cache.fetch(client, "bank/a.xlsx", "main") == (b"v2", blob_sha(b"v2"))
+    assert blob_cache.read_blob(blob_sha(b"v1")) == b"v1"
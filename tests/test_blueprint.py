@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from exam_system.services import blueprint
+from exam_system.services.tag_index import TagIndex
+
+
+def test_allocate_counts_and_percentages():
+    assert blueprint.allocate({"A": 5, "B": "50%", "C": "50%"}, 9) == {"A": 5, "B": 5, "C": 4}
+    out = blueprint.allocate({"A": "33%", "B": "33%", "C": "34%"}, 10)
+    assert sum(out.values()) == 10 and list(out) == ["A", "B", "C"]
+
+
+def _index():
+    tags = ["PA11"] * 6 + ["PA12"] * 4 + ["PA11;PA12"] * 2 + ["PA13"] * 3
+    return TagIndex(pd.Series(tags))
+
+
+def test_plan_owner_and_shortage():
+    idx = _index()
+    candidates = np.arange(idx.n_rows)
+    strata, quotas, shortages = blueprint.plan(idx, candidates, {"PA12": 3, "PA11": 10, "PA99": 1}, 14)
+    # 同時有 PA11、PA12 的題目歸入先列出的 PA12
+    assert strata[10:12].tolist() == [0, 0]
+    assert strata[12:].tolist() == [-1, -1, -1]
+    assert quotas.tolist() == [3, 6, 0]
+    assert shortages == {"PA11": (10, 6), "PA99": (1, 0)}
+
+
+def test_sample_fills_each_stratum_without_repeats():
+    idx = _index()
+    candidates = np.arange(2, idx.n_rows)
+    strata, quotas, _ = blueprint.plan(idx, candidates, {"PA11": 3, "PA12": 2}, 5)
+    for seed in range(50):
+        rows = blueprint.sample(candidates, strata, quotas, np.random.default_rng(seed))
+        assert len(rows) == len(set(rows.tolist())) == 5
+        assert set(rows.tolist()) <= set(candidates.tolist())
+        owner = strata[np.searchsorted(candidates, rows)]
+        assert owner.tolist() == [0, 0, 0, 1, 1]  # 依藍圖分層順序排列
+
+
+def test_sample_is_roughly_uniform_within_stratum():
+    idx = _index()
+    candidates = np.arange(idx.n_rows)
+    strata, quotas, _ = blueprint.plan(idx, candidates, {"PA11": 1}, 1)
+    counts = np.zeros(idx.n_rows)
+    for seed in range(3000):
+        counts[blueprint.sample(candidates, strata, quotas, np.random.default_rng(seed))] += 1
+    members = [0, 1, 2, 3, 4, 5, 10, 11]   # 含 PA11 標籤的列（包括同時有 PA12 者）
+    assert counts.sum() == counts[members].sum()
+    np.testing.assert_allclose(counts[members] / 3000, 1 / 8, atol=0.03)
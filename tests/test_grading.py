@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+from exam_system.services import bank_registry, grading, paper_engine
+
+LETTERS = "ABCDEFGH"
+
+
+def _ref_score(gold: set, pred: set, n_options: int, is_mc: bool, policy: str) -> float:
+    """逐題判卷（舊版以 set 比對的寫法，加上各計分方式的定義）"""
+    if gold == pred:
+        return 1.0
+    if policy == "all_or_nothing" or not is_mc or not pred:
+        return 0.0
+    if policy == "partial":
+        return 1 - len(gold ^ pred) / n_options
+    hits, misses = len(gold & pred), len(pred - gold)
+    return max(-1.0, min(1.0, (hits - misses) / max(len(gold), 1)))
+
+
+def _random_case(rng, n=2000):
+    n_options = rng.integers(2, 6, size=n)
+    gold, pred = [], []
+    for k in n_options:
+        labels = np.array(list(LETTERS[:k]))
+        gold.append(set(rng.choice(labels, size=rng.integers(1, k + 1), replace=False)))
+        pred.append(set(rng.choice(labels, size=rng.integers(0, k + 1), replace=False)))
+    is_mc = np.array([len(g) > 1 or rng.random() < 0.3 for g in gold])
+    return gold, pred, n_options, is_mc
+
+
+@pytest.mark.parametrize("policy", list(grading.POLICIES))
+def test_bitmask_grade_matches_per_question_reference(policy):
+    gold, pred, n_options, is_mc = _random_case(np.random.default_rng(0))
+    g = np.array([grading.labels_to_bits(s) for s in gold], dtype=np.uint8)
+    p = np.array([grading.labels_to_bits(s) for s in pred], dtype=np.uint8)
+    got = grading.grade(g, p, n_options, is_mc, policy)
+    want = [_ref_score(*args, policy) for args in zip(gold, pred, n_options, is_mc)]
+    np.testing.assert_allclose(got, want)
+
+
+def test_partial_and_negative_examples():
+    gold = np.array([0b0011, 0b0011, 0b0011, 0b0011, 0b0001], dtype=np.uint8)  # AB AB AB AB A
+    pick = np.array([0b0001, 0b0111, 0b1100, 0b0000, 0b0010], dtype=np.uint8)  # A ABC CD - B
+    n_opt = np.array([4, 4, 4, 4, 4])
+    is_mc = np.array([True, True, True, True, False])
+    np.testing.assert_allclose(grading.grade(gold, pick, n_opt, is_mc, "partial"), [0.75, 0.75, 0, 0, 0])
+    np.testing.assert_allclose(grading.grade(gold, pick, n_opt, is_mc, "negative"), [0.5, 0.5, -1, 0, 0])
+    assert grading.result_marks(np.array([1.0, 0.5, 0.0, -1.0])).tolist() == [
+        grading.RESULT_CORRECT, grading.RESULT_PARTIAL, grading.RESULT_WRONG, grading.RESULT_WRONG]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        grading.grade(np.array([1]), np.array([2]), np.array([4]), np.array([True]), "bogus")
+
+
+def test_picked_bits_and_letters():
+    bits = grading.picked_bits({0: {"A", "C"}, 2: {"d"}}, range(3))
+    assert bits.tolist() == [0b101, 0, 0b1000]
+    assert grading.bits_to_letters(bits).tolist() == ["AC", "", "D"]
+
+
+def _old_grade(paper, answers):
+    """改版前交卷判分的做法：逐題以 set 比對"""
+    results, correct = [], 0
+    for i, q in enumerate(paper):
+        gold, pred = q["Answer"], answers.get(i, set())
+        ok = gold == pred
+        correct += int(ok)
+        results.append(("".join(sorted(pred)), "".join(sorted(gold)), "✅" if ok else "❌"))
+    return results, correct
+
+
+def test_paper_grading_matches_old_grader():
+    rng = np.random.default_rng(1)
+    n = 300
+    answers_col = []
+    for _ in range(n):
+        k = rng.integers(1, 3)
+        answers_col.append("".join(sorted(rng.choice(list("ABCD"), size=k, replace=False))))
+    df = pd.DataFrame({
+        "ID": [str(i) for i in range(n)],
+        "Question": [f"Q{i}" for i in range(n)],
+        "OptionA": "a", "OptionB": "b", "OptionC": "c",
+        "OptionD": ["d" if i % 5 else "" for i in range(n)],  # 部分題目只有三個選項
+        "Answer": answers_col,
+        "Type": ["MC" if len(a) > 1 else "SC" for a in answers_col],
+        "Tag": "t", "Explanation": "",
+    })
+    bank = bank_registry.register(["test_grading.xlsx"], ["sha-grading"], df)
+    paper = paper_engine.new_paper(bank.key, bank.question_store, np.arange(n), 120, seed=7)
+    questions = list(paper)
+    answers = {}
+    for i, q in enumerate(questions):
+        r = rng.random()
+        if r < 0.4:
+            answers[i] = set(q["Answer"])
+        elif r < 0.9:
+            labels = [lab for lab, _ in q["Choices"]]
+            answers[i] = set(rng.choice(labels, size=rng.integers(1, len(labels) + 1), replace=False))
+
+    old, old_correct = _old_grade(questions, answers)
+    store, rows = paper.store(), paper.rows
+    n_options, is_mc = store.has_option[rows].sum(axis=1), store.types[rows] == "MC"
+
+    # exam_system：Paper 陣列 + 以題目位置為 key（calculate_results 的做法）
+    g = grading.grade_paper(paper.answer_bits, answers, range(len(paper)), n_options, is_mc, "all_or_nothing")
+    assert g.total == old_correct
+    assert list(zip(g.your_letters, g.gold_letters, g.marks)) == old
+
+    # 單檔版：題目 dict + 以題目 ID 為 key
+    by_id = {questions[i]["ID"]: a for i, a in answers.items()}
+    ids = [q["ID"] for q in questions]
+    gq = grading.grade_questions(questions, by_id, ids, "all_or_nothing")
+    assert gq.total == old_correct
+    assert list(zip(gq.your_letters, gq.gold_letters, gq.marks)) == old
+
+    for policy in ("partial", "negative"):
+        gp = grading.grade_paper(paper.answer_bits, answers, range(len(paper)), n_options, is_mc, policy)
+        np.testing.assert_allclose(gp.score, grading.grade_questions(questions, by_id, ids, policy).score)
+        assert (gp.marks == grading.RESULT_CORRECT).sum() == old_correct
+    assert grading.grade_paper(paper.answer_bits, answers, range(len(paper)), n_options, is_mc,
+                               "partial").total >= old_correct
@@ -0,0 +1,98 @@
+from exam_system.services import ai_prompts, option_canon
+
+
+def _shuffled(q: dict, order: list) -> dict:
+    """模擬 paper_engine.materialize：order[p] 為顯示位置 p 的原始選項欄"""
+    letters = "ABCDEFGH"
+    texts = [txt for _, txt in q["Choices"]]
+    to_display = {letters[orig]: letters[p] for p, orig in enumerate(order)}
+    return {
+        **q,
+        "Choices": [(letters[p], texts[orig]) for p, orig in enumerate(order)],
+        "Answer": {to_display[a] for a in q["Answer"]},
+        "OptionOrder": order,
+    }
+
+
+PLAIN = {
+    "Question": "保險的基本原則為何？",
+    "Choices": [("A", "最大誠信"), ("B", "損害填補"), ("C", "代位求償"), ("D", "以上皆是")],
+    "Answer": {"D"},
+    "Explanation": "",
+}
+
+# 組合選項 + 題幹內以 A–D 標示的敘述（PA / FCI 題庫常見）
+COMBO = {
+    "Question": "下列何者正確？A.分散風險；B.彌補損失；C.保障生活；D.投資獲利。",
+    "Choices": [("A", "AB"), ("B", "BC"), ("C", "CD"), ("D", "ABD")],
+    "Answer": {"B"},
+    "Explanation": "",
+}
+
+
+def test_plain_question_shares_prompt_across_shuffles():
+    order = [3, 1, 0, 2]
+    q = _shuffled(PLAIN, order)
+    assert ai_prompts.build_explain_prompt(q) == ai_prompts.build_explain_prompt(PLAIN)
+    assert ai_prompts.build_hint_prompt(q) == ai_prompts.build_hint_prompt(PLAIN)
+    canon, answer, mapping = option_canon.canonical(q)
+    assert canon == PLAIN["Choices"]
+    assert answer == "D"
+    assert mapping == {"A": "C", "B": "B", "C": "D", "D": "A"}
+
+
+def test_plain_question_remaps_letters():
+    q = _shuffled(PLAIN, [3, 1, 0, 2])
+    assert option_canon.to_display("正解為 D，A 與 B 都只是其中之一", q) == "正解為 A，C 與 B 都只是其中之一"
+    assert option_canon.to_display("AC 皆錯", q) == "CD 皆錯"
+
+
+def test_combination_options_are_not_canonicalized():
+    q = _shuffled(COMBO, [3, 1, 0, 2])
+    assert option_canon.has_lettered_items(q)
+    canon, answer, mapping = option_canon.canonical(q)
+    assert canon == q["Choices"]
+    assert answer == "B"
+    assert all(k == v for k, v in mapping.items())
+
+
+def test_combination_options_text_is_untouched():
+    q = _shuffled(COMBO, [3, 1, 0, 2])
+    text = "正解為 B（BC）：B.彌補損失，C.保障生活。"
+    assert option_canon.to_display(text, q) == text
+    chunks = ["正解為 B（B", "C）：B", ".彌補損失，C.保障生活。"]
+    assert "".join(option_canon.stream_to_display(iter(chunks), q)) == text
+
+
+def test_combination_prompt_uses_displayed_layout():
+    q = _shuffled(COMBO, [3, 1, 0, 2])
+    _, _, user = ai_prompts.build_explain_prompt(q)
+    assert "A. ABD" in user and "正解: B" in user
+    # 版面不同，key 也不同（不能共用以另一種代號寫成的回應）
+    assert ai_prompts.build_explain_prompt(q)[0] != ai_prompts.build_explain_prompt(COMBO)[0]
+
+
+def test_lettered_stem_or_explanation_detected():
+    model_type = {**PLAIN, "Question": "萬能壽險B型保單之淨危險保額為？"}
+    assert option_canon.has_lettered_items(model_type)
+    expl = {**PLAIN, "Explanation": "典型的萬能壽險保單有兩種：A型與B型。"}
+    assert option_canon.has_lettered_items(expl)
+    assert not option_canon.has_lettered_items(PLAIN)
+    assert not option_canon.has_lettered_items({**PLAIN, "Explanation": float("nan")})
+
+
+def test_stream_to_display_matches_to_display():
+    q = _shuffled(PLAIN, [2, 0, 3, 1])
+    text = "答案是 D，不是 AB；Based on C."
+    chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+    assert "".join(option_canon.stream_to_display(iter(chunks), q)) == option_canon.to_display(text, q)
+
+
+def test_only_answer_references_are_remapped():
+    q = _shuffled(PLAIN, [3, 1, 0, 2])  # 原 A→C、B→B、C→D、D→A
+    text = "正解為 D。CD 定存、A股與C型基金都不是保險，(A) 才是；選項C、D 錯誤，AC 皆錯。"
+    want = "正解為 A。CD 定存、A股與C型基金都不是保險，(C) 才是；選項D、A 錯誤，CD 皆錯。"
+    assert option_canon.to_display(text, q) == want
+    for size in range(1, 8):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert "".join(option_canon.stream_to_display(iter(chunks), q)) == want
@@ -0,0 +1,76 @@
+import json
+import os
+import pytest
+from exam_system.services import storage
+from exam_system.services.bank_cache import blob_sha
+
+POINTER = "bank/_pointer.json"
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return storage.LocalBackend(str(tmp_path), POINTER)
+
+
+def test_round_trip_and_shas(backend):
+    backend.write("bank/人身/a.xlsx", b"v1")
+    backend.write("bank/人身/empty.xls", b"")
+    backend.write("bank/人身/notes.txt", b"x")
+    assert backend.read("bank/人身/a.xlsx") == b"v1"
+    assert backend.read("bank/人身/empty.xls") == b""
+    assert backend.read("bank/人身/missing.xlsx") is None
+    assert backend.list_files("bank/人身") == ["bank/人身/a.xlsx", "bank/人身/empty.xls"]
+    assert backend.file_shas(["bank/人身/a.xlsx", "bank/人身/empty.xls", "bank/人身/missing.xlsx"]) == [
+        blob_sha(b"v1"), blob_sha(b""), None]
+
+    # 檔案改寫後 (mtime, size) 改變，SHA 會重算
+    backend.write("bank/人身/a.xlsx", b"version 2")
+    assert backend.file_shas(["bank/人身/a.xlsx"]) == [blob_sha(b"version 2")]
+    assert not [n for n in os.listdir(backend.root / "bank/人身") if n.endswith(".tmp")]
+
+
+def test_paths_outside_root_are_rejected(backend):
+    assert backend.read("../outside.xlsx") is None
+    assert backend.file_shas(["../outside.xlsx"]) == [None]
+    with pytest.raises(ValueError):
+        backend.write("../outside.xlsx", b"x")
+
+
+def test_pointer_round_trip(backend):
+    assert backend.read_pointer() == {}
+    backend.write_pointer({"current": {"人身": "bank/人身/a.xlsx"}})
+    assert backend.read_pointer() == {"current": {"人身": "bank/人身/a.xlsx"}}
+    backend.write(POINTER, b"{broken")
+    assert backend.read_pointer() == {}
+
+
+def test_publish_writes_files_before_pointer(backend, monkeypatch):
+    backend.write("bank/外幣/old.xlsx", b"old")
+    backend.write_pointer({"current": {"外幣": "bank/外幣/old.xlsx"}})
+    order = []
+    write = backend.write
+
+    def recording_write(path, data, message=""):
+        if path == POINTER:
+            # 指標換過去時，它指向的檔案必須已經存在
+            for p in json.loads(data)["current"].values():
+                assert backend.read(p) is not None
+        order.append(path)
+        write(path, data, message)
+
+    monkeypatch.setattr(backend, "write", recording_write)
+    seen = []
+
+    def update(cur):
+        seen.append(json.loads(json.dumps(cur)))
+        cur.setdefault("current", {})["人身"] = "bank/人身/new.xlsx"
+        return cur
+
+    backend.publish({"bank/人身/new.xlsx": b"new", "bank/人身/extra.xlsx": b"extra"}, "msg", update)
+    assert order == ["bank/人身/new.xlsx", "bank/人身/extra.xlsx", POINTER]
+    assert seen == [{"current": {"外幣": "bank/外幣/old.xlsx"}}]
+    assert backend.read_pointer()["current"] == {"外幣": "bank/外幣/old.xlsx", "人身": "bank/人身/new.xlsx"}
+
+    order.clear()
+    backend.publish({"bank/人身/c.xlsx": b"c"}, "msg")
+    assert order == ["bank/人身/c.xlsx"]
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from exam_system.services.tag_index import TagIndex
+from exam_system.services.weak_sampler import MIN_WEIGHT, DynamicSampler, WeakAreaSampler
+
+
+def test_dynamic_sampler_frequencies_follow_weights():
+    s = DynamicSampler()
+    weights = {"a": 1.0, "b": 3.0, "c": 0.3, "d": 12.0}
+    for k, w in weights.items():
+        s.update(k, w)
+    s.update("b", 6.0)   # 換桶
+    s.update("e", 2.0)
+    s.update("e", 0.0)   # 移除
+    weights["b"] = 6.0
+    assert set(s.weights) == set(weights)
+    assert s.total == pytest.approx(sum(weights.values()))
+
+    rng = np.random.default_rng(0)
+    n = 40000
+    draws = [s.sample(rng) for _ in range(n)]
+    total = sum(weights.values())
+    for k, w in weights.items():
+        assert draws.count(k) / n == pytest.approx(w / total, abs=0.01)
+
+
+def test_dynamic_sampler_empty():
+    s = DynamicSampler()
+    s.update("a", MIN_WEIGHT / 2)
+    assert len(s) == 0 and s.total == 0
+    with pytest.raises(LookupError):
+        s.sample(np.random.default_rng(0))
+
+
+def test_record_boosts_wrong_and_decays_right():
+    w = WeakAreaSampler()
+    assert not w.has_history()
+    w.record([3, 4], [False, True], ["T1;T2", "T2"])
+    assert w.questions.get(3) > 0 and w.questions.get(4) == 0
+    assert w.tags.get("T1") > 0 and w.tags.get("T2") > 0
+    before = w.questions.get(3)
+    w.record([3], [True], ["T1"])
+    assert w.questions.get(3) < before
+
+
+def test_draw_unique_within_candidates_and_weighted():
+    n_rows = 200
+    idx = TagIndex(pd.Series([f"T{i % 10}" for i in range(n_rows)]))
+    w = WeakAreaSampler()
+    for _ in range(3):
+        w.record([4, 7], [False, False], ["T4", "T7"])
+    candidates = np.arange(0, n_rows, 2)   # 7 不在候選範圍
+    rng = np.random.default_rng(0)
+    hits4 = 0
+    for _ in range(300):
+        rows = w.draw(idx, candidates, 20, rng)
+        assert len(rows) == len(set(rows.tolist())) == 20
+        assert set(rows.tolist()) <= set(candidates.tolist())
+        hits4 += 4 in rows
+    # 均勻抽時約 20%，答錯三次的題目應明顯更常被抽到
+    assert hits4 / 300 > 0.4
+
+
+def test_draw_fills_when_weights_outside_candidates():
+    idx = TagIndex(pd.Series(["A"] * 10 + ["B"] * 10))
+    w = WeakAreaSampler()
+    w.record(range(10), [False] * 10, ["A"] * 10)
+    rows = w.draw(idx, np.arange(10, 20), 10, np.random.default_rng(0))
+    assert sorted(rows.tolist()) == list(range(10, 20))
@@ -0,0 +1,36 @@
+from pathlib import Path
+import pandas as pd
+import pytest
+from exam_system.services import xlsx_split
+from exam_system.services.bank_normalize import parse_sheets
+
+BANK = Path(__file__).resolve().parents[1] / "bank"
+
+
+@pytest.mark.parametrize("name", ["人身/PA_分章_20250731_LIB.xlsx", "外幣/題庫_FCI_分章_202411.xlsx", "投資型/IPA題庫.xlsx"])
+def test_subsets_parse_like_the_full_workbook(name):
+    path = BANK / name
+    data = path.read_bytes()
+    sheets = pd.ExcelFile(path).sheet_names
+    book = xlsx_split.open_workbook(data)
+    assert list(book.parts) == sheets
+    full = parse_sheets(data, path.name, sheets)
+    chunks = [sheets[i:i + 4] for i in range(0, len(sheets), 4)]
+    got = [df for ch in chunks for df in parse_sheets(book.subset(ch), path.name, ch)]
+    assert len(got) == len(full)
+    for a, b in zip(full, got):
+        pd.testing.assert_frame_equal(a, b)
+
+
+def test_subset_keeps_only_needed_shared_strings():
+    data = (BANK / "人身" / "PA_分章_20250731_LIB.xlsx").read_bytes()
+    book = xlsx_split.open_workbook(data)
+    first = next(iter(book.parts))
+    sub = xlsx_split.open_workbook(book.subset([first]))
+    assert list(sub.parts) == [first]
+    assert 0 < len(sub.sst_items) < len(book.sst_items)
+
+
+def test_non_xlsx_is_not_split():
+    assert xlsx_split.open_workbook((BANK / "投資型" / "IPA題庫_20250421_LIB.xls").read_bytes()) is None
+    assert xlsx_split.open_workbook(b"not a workbook") is None